@@ -4,15 +4,14 @@ from collections import OrderedDict
 
 import frappe
 from frappe import _
-from frappe.core.page.dashboard.dashboard import cache_source
 from frappe.utils import cint, flt, getdate, today
 
-from amf.amf.dashboard_chart_source.otif_by_semester.otif_by_semester import (
-    add_semesters,
-    get_semester,
-    get_semester_end,
+from amf.amf.utils.semester_aggregation import (
+    cache_semester_chart,
+    get_chart as _get_chart,
+    get_default_from_date,
+    get_semester_buckets,
     get_semester_label_from_parts,
-    get_semester_start,
 )
 
 
@@ -29,7 +28,7 @@ CHART_COLORS = ["blue", "red", "yellow", "green"]
 
 
 @frappe.whitelist()
-@cache_source
+@cache_semester_chart
 def get(chart_name=None, chart=None, no_cache=None):
     chart = _get_chart(chart_name, chart)
     filters = normalize_filters(frappe.parse_json(chart.filters_json or "{}"))
@@ -42,19 +41,6 @@ def get(chart_name=None, chart=None, no_cache=None):
     }
 
 
-def _get_chart(chart_name=None, chart=None):
-    if chart_name:
-        return frappe.get_doc("Dashboard Chart", chart_name)
-
-    if hasattr(chart, "doctype"):
-        return chart
-
-    if isinstance(chart, dict):
-        return frappe._dict(chart)
-
-    return frappe._dict(frappe.parse_json(chart))
-
-
 def normalize_filters(filters=None):
     filters = frappe._dict(filters or {})
     filters.semester_count = max(1, cint(filters.get("semester_count") or DEFAULT_SEMESTER_COUNT))
@@ -63,9 +49,7 @@ def normalize_filters(filters=None):
     if filters.get("from_date"):
         filters.from_date = getdate(filters.from_date)
     else:
-        year, semester = get_semester(filters.to_date)
-        start_year, start_semester = add_semesters(year, semester, -(filters.semester_count - 1))
-        filters.from_date = get_semester_start(start_year, start_semester)
+        filters.from_date = get_default_from_date(filters.to_date, filters.semester_count)
 
     if filters.from_date > filters.to_date:
         frappe.throw(_("From Date cannot be after To Date"))
@@ -93,24 +77,9 @@ def get_external_vs_internal_by_semester(filters=None):
 
 
 def get_empty_semester_buckets(from_date, to_date):
-    buckets = OrderedDict()
-    year, semester = get_semester(from_date)
-    end_year, end_semester = get_semester(to_date)
-    end_index = get_semester_index(end_year, end_semester)
-
-    while get_semester_index(year, semester) <= end_index:
-        label = get_semester_label_from_parts(year, semester)
-        buckets[label] = {
-            "label": label,
-            "year": year,
-            "semester": semester,
-            "from_date": get_semester_start(year, semester),
-            "to_date": get_semester_end(year, semester),
-            "families": get_empty_family_data(),
-        }
-        year, semester = add_semesters(year, semester, 1)
-
-    return buckets
+    return get_semester_buckets(from_date, to_date, lambda bucket: {
+        "families": get_empty_family_data(),
+    })
 
 
 def get_empty_family_data():
@@ -126,10 +95,6 @@ def get_empty_family_data():
     }
 
 
-def get_semester_index(year, semester):
-    return (cint(year) * 2) + (cint(semester) - 1)
-
-
 def get_internal_machining_rows(filters):
     return frappe.db.sql(
         """
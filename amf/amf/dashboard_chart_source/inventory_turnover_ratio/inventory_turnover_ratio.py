@@ -4,15 +4,16 @@ from collections import OrderedDict
 
 import frappe
 from frappe import _
-from frappe.core.page.dashboard.dashboard import cache_source
 from frappe.utils import add_days, cint, cstr, flt, getdate, today
 
-from amf.amf.dashboard_chart_source.otif_by_semester.otif_by_semester import (
-    add_semesters,
-    get_semester,
-    get_semester_end,
+from amf.amf.utils.semester_aggregation import (
+    COGS_FACT,
+    cache_semester_chart,
+    get_chart as _get_chart,
+    get_default_from_date,
+    get_semester_buckets,
+    get_semester_facts,
     get_semester_label_from_parts,
-    get_semester_start,
 )
 
 
@@ -33,7 +34,7 @@ RANGE_BY_ACCOUNT_NUMBER = {
 
 
 @frappe.whitelist()
-@cache_source
+@cache_semester_chart
 def get(chart_name=None, chart=None, no_cache=None):
     chart = _get_chart(chart_name, chart)
     filters = normalize_filters(frappe.parse_json(chart.filters_json or "{}"))
@@ -52,19 +53,6 @@ def get(chart_name=None, chart=None, no_cache=None):
     }
 
 
-def _get_chart(chart_name=None, chart=None):
-    if chart_name:
-        return frappe.get_doc("Dashboard Chart", chart_name)
-
-    if hasattr(chart, "doctype"):
-        return chart
-
-    if isinstance(chart, dict):
-        return frappe._dict(chart)
-
-    return frappe._dict(frappe.parse_json(chart))
-
-
 def normalize_filters(filters=None):
     filters = frappe._dict(filters or {})
     filters.semester_count = max(1, cint(filters.get("semester_count") or DEFAULT_SEMESTER_COUNT))
@@ -74,9 +62,7 @@ def normalize_filters(filters=None):
     if filters.get("from_date"):
         filters.from_date = getdate(filters.from_date)
     else:
-        year, semester = get_semester(filters.to_date)
-        start_year, start_semester = add_semesters(year, semester, -(filters.semester_count - 1))
-        filters.from_date = get_semester_start(start_year, start_semester)
+        filters.from_date = get_default_from_date(filters.to_date, filters.semester_count)
 
     if filters.from_date > filters.to_date:
         frappe.throw(_("From Date cannot be after To Date"))
@@ -98,11 +84,11 @@ def get_inventory_turnover_by_semester(filters=None):
             bucket["ranges"][product_range]["opening_inventory"] = snapshots[opening_date][product_range]
             bucket["ranges"][product_range]["closing_inventory"] = snapshots[period_to_date][product_range]
 
-    for row in get_cogs_rows(filters):
-        label = get_semester_label_from_parts(row.year, row.semester)
-        product_range = RANGE_BY_ACCOUNT_NUMBER.get(cstr(row.account_number))
+    for fact in get_semester_facts(COGS_FACT, filters.from_date, filters.to_date, filters.company):
+        label = get_semester_label_from_parts(fact.year, fact.semester)
+        product_range = RANGE_BY_ACCOUNT_NUMBER.get(cstr(fact.dimension))
         if label in buckets and product_range:
-            buckets[label]["ranges"][product_range]["cogs"] += flt(row.cogs)
+            buckets[label]["ranges"][product_range]["cogs"] += flt(fact.value)
 
     for bucket in buckets.values():
         calculate_turnover(bucket)
@@ -111,24 +97,9 @@ def get_inventory_turnover_by_semester(filters=None):
 
 
 def get_empty_semester_buckets(from_date, to_date):
-    buckets = OrderedDict()
-    year, semester = get_semester(from_date)
-    end_year, end_semester = get_semester(to_date)
-    end_index = get_semester_index(end_year, end_semester)
-
-    while get_semester_index(year, semester) <= end_index:
-        label = get_semester_label_from_parts(year, semester)
-        buckets[label] = {
-            "label": label,
-            "year": year,
-            "semester": semester,
-            "from_date": get_semester_start(year, semester),
-            "to_date": get_semester_end(year, semester),
-            "ranges": get_empty_range_data(),
-        }
-        year, semester = add_semesters(year, semester, 1)
-
-    return buckets
+    return get_semester_buckets(from_date, to_date, lambda bucket: {
+        "ranges": get_empty_range_data(),
+    })
 
 
 def get_empty_range_data():
@@ -144,8 +115,21 @@ def get_empty_range_data():
     }
 
 
-def get_semester_index(year, semester):
-    return (cint(year) * 2) + (cint(semester) - 1)
+def get_cogs_facts(from_date, to_date, company=None):
+    """Semester KPI Fact builder: COGS per product range account number."""
+    return [
+        {
+            "year": row.year,
+            "semester": row.semester,
+            "dimension": cstr(row.account_number),
+            "value": flt(row.cogs),
+        }
+        for row in get_cogs_rows(frappe._dict({
+            "from_date": from_date,
+            "to_date": to_date,
+            "company": company or DEFAULT_COMPANY,
+        }))
+    ]
 
 
 def get_cogs_rows(filters):
@@ -2,13 +2,12 @@ from __future__ import unicode_literals
 
 import frappe
 from frappe import _
-from frappe.core.page.dashboard.dashboard import cache_source
 from frappe.utils import cint, flt, getdate, today
 
-from amf.amf.dashboard_chart_source.otif_by_semester.otif_by_semester import (
-    add_semesters,
-    get_semester,
-    get_semester_start,
+from amf.amf.utils.semester_aggregation import (
+    cache_semester_chart,
+    get_chart as _get_chart,
+    get_default_from_date,
 )
 
 
@@ -18,7 +17,7 @@ CHART_COLORS = ["orange"]
 
 
 @frappe.whitelist()
-@cache_source
+@cache_semester_chart
 def get(chart_name=None, chart=None, no_cache=None):
     chart = _get_chart(chart_name, chart)
     filters = normalize_filters(frappe.parse_json(chart.filters_json or "{}"))
@@ -36,19 +35,6 @@ def get(chart_name=None, chart=None, no_cache=None):
     }
 
 
-def _get_chart(chart_name=None, chart=None):
-    if chart_name:
-        return frappe.get_doc("Dashboard Chart", chart_name)
-
-    if hasattr(chart, "doctype"):
-        return chart
-
-    if isinstance(chart, dict):
-        return frappe._dict(chart)
-
-    return frappe._dict(frappe.parse_json(chart))
-
-
 def normalize_filters(filters=None):
     filters = frappe._dict(filters or {})
     filters.semester_count = max(1, cint(filters.get("semester_count") or DEFAULT_SEMESTER_COUNT))
@@ -58,9 +44,7 @@ def normalize_filters(filters=None):
     if filters.get("from_date"):
         filters.from_date = getdate(filters.from_date)
     else:
-        year, semester = get_semester(filters.to_date)
-        start_year, start_semester = add_semesters(year, semester, -(filters.semester_count - 1))
-        filters.from_date = get_semester_start(start_year, start_semester)
+        filters.from_date = get_default_from_date(filters.to_date, filters.semester_count)
 
     if filters.from_date > filters.to_date:
         frappe.throw(_("From Date cannot be after To Date"))
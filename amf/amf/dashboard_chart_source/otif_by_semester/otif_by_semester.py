@@ -4,17 +4,28 @@ from collections import OrderedDict
 
 import frappe
 from frappe import _
-from frappe.core.page.dashboard.dashboard import cache_source
 from frappe.utils import cint, getdate, today
 
 from amf.amf.report.on_time_delivery_kpis.on_time_delivery_kpis import get_data as get_otd_rows
+from amf.amf.utils.semester_aggregation import (
+    OTIF_FACT,
+    cache_semester_chart,
+    get_chart as _get_chart,
+    get_default_from_date,
+    get_semester,
+    get_semester_buckets,
+    get_semester_facts,
+    get_semester_label_from_parts,
+)
 
 
 DEFAULT_SEMESTER_COUNT = 8
+RD_SCOPE = "R&D"
+RD_SALES_ORDER_TYPES = ("R&D", "Hybrid")
 
 
 @frappe.whitelist()
-@cache_source
+@cache_semester_chart
 def get(chart_name=None, chart=None, no_cache=None):
     chart = _get_chart(chart_name, chart)
     filters = normalize_filters(frappe.parse_json(chart.filters_json or "{}"))
@@ -31,19 +42,6 @@ def get(chart_name=None, chart=None, no_cache=None):
     }
 
 
-def _get_chart(chart_name=None, chart=None):
-    if chart_name:
-        return frappe.get_doc("Dashboard Chart", chart_name)
-
-    if hasattr(chart, "doctype"):
-        return chart
-
-    if isinstance(chart, dict):
-        return frappe._dict(chart)
-
-    return frappe._dict(frappe.parse_json(chart))
-
-
 def normalize_filters(filters=None):
     filters = frappe._dict(filters or {})
     filters.semester_count = max(1, cint(filters.get("semester_count") or DEFAULT_SEMESTER_COUNT))
@@ -52,9 +50,7 @@ def normalize_filters(filters=None):
     if filters.get("from_date"):
         filters.from_date = getdate(filters.from_date)
     else:
-        year, semester = get_semester(filters.to_date)
-        start_year, start_semester = add_semesters(year, semester, -(filters.semester_count - 1))
-        filters.from_date = get_semester_start(start_year, start_semester)
+        filters.from_date = get_default_from_date(filters.to_date, filters.semester_count)
 
     if filters.from_date > filters.to_date:
         frappe.throw(_("From Date cannot be after To Date"))
@@ -66,24 +62,19 @@ def normalize_filters(filters=None):
 def get_otif_by_semester(filters=None):
     filters = normalize_filters(filters)
     buckets = get_empty_semester_buckets(filters.from_date, filters.to_date)
-    report_rows = get_otd_rows(frappe._dict({
-        "from_date": filters.from_date,
-        "to_date": filters.to_date,
-        "item_group": filters.get("item_group"),
-        "include_rd": filters.include_rd,
-    }))
 
-    for row in report_rows:
-        planned_date = row.get("planned_date")
-        if not planned_date:
+    for fact in get_semester_facts(OTIF_FACT, filters.from_date, filters.to_date):
+        if filters.get("item_group") and fact.dimension != filters.item_group:
+            continue
+        if fact.scope == RD_SCOPE and not filters.include_rd:
             continue
 
-        label = get_semester_label(planned_date)
+        label = get_semester_label_from_parts(fact.year, fact.semester)
         if label not in buckets:
             continue
 
-        buckets[label]["total"] += 1
-        buckets[label]["on_time"] += cint(row.get("0d"))
+        buckets[label]["total"] += cint(fact.total)
+        buckets[label]["on_time"] += cint(fact.value)
 
     for bucket in buckets.values():
         bucket["otif"] = round(bucket["on_time"] * 100.0 / bucket["total"], 1) if bucket["total"] else 0
@@ -91,62 +82,40 @@ def get_otif_by_semester(filters=None):
     return list(buckets.values())
 
 
-def get_empty_semester_buckets(from_date, to_date):
-    buckets = OrderedDict()
+def get_otif_facts(from_date, to_date, company=None):
+    """Semester KPI Fact builder: deliveries and on-time deliveries per item group."""
+    facts = OrderedDict()
+    report_rows = get_otd_rows(frappe._dict({
+        "from_date": from_date,
+        "to_date": to_date,
+        "include_rd": 1,
+    }))
 
-    for year, semester in iter_semesters(from_date, to_date):
-        label = get_semester_label_from_parts(year, semester)
-        buckets[label] = {
-            "label": label,
+    for row in report_rows:
+        planned_date = row.get("planned_date")
+        if not planned_date:
+            continue
+
+        year, semester = get_semester(planned_date)
+        item_group = row.get("item_group") or ""
+        scope = RD_SCOPE if row.get("sales_order_type") in RD_SALES_ORDER_TYPES else ""
+        fact = facts.setdefault((year, semester, item_group, scope), {
             "year": year,
             "semester": semester,
-            "from_date": get_semester_start(year, semester),
-            "to_date": get_semester_end(year, semester),
-            "on_time": 0,
+            "dimension": item_group,
+            "scope": scope,
+            "value": 0,
             "total": 0,
-            "otif": 0,
-        }
-
-    return buckets
-
-
-def iter_semesters(from_date, to_date):
-    year, semester = get_semester(from_date)
-    end_year, end_semester = get_semester(to_date)
-    end_index = get_semester_index(end_year, end_semester)
-
-    while get_semester_index(year, semester) <= end_index:
-        yield year, semester
-        year, semester = add_semesters(year, semester, 1)
-
-
-def get_semester(date):
-    date = getdate(date)
-    return date.year, 1 if date.month <= 6 else 2
-
-
-def add_semesters(year, semester, offset):
-    index = get_semester_index(year, semester) + offset
-    return index // 2, (index % 2) + 1
+        })
+        fact["total"] += 1
+        fact["value"] += cint(row.get("0d"))
 
+    return list(facts.values())
 
-def get_semester_index(year, semester):
-    return (cint(year) * 2) + (cint(semester) - 1)
 
-
-def get_semester_start(year, semester):
-    month = 1 if cint(semester) == 1 else 7
-    return getdate("{0}-{1:02d}-01".format(cint(year), month))
-
-
-def get_semester_end(year, semester):
-    month_day = "06-30" if cint(semester) == 1 else "12-31"
-    return getdate("{0}-{1}".format(cint(year), month_day))
-
-
-def get_semester_label(date):
-    return get_semester_label_from_parts(*get_semester(date))
-
-
-def get_semester_label_from_parts(year, semester):
-    return "{0} S{1}".format(cint(year), cint(semester))
+def get_empty_semester_buckets(from_date, to_date):
+    return get_semester_buckets(from_date, to_date, lambda bucket: {
+        "on_time": 0,
+        "total": 0,
+        "otif": 0,
+    })
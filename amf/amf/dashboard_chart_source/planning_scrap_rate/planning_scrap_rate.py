@@ -1,18 +1,17 @@
 from __future__ import unicode_literals
 
-from collections import OrderedDict
-
 import frappe
 from frappe import _
-from frappe.core.page.dashboard.dashboard import cache_source
 from frappe.utils import cint, flt, getdate, today
 
-from amf.amf.dashboard_chart_source.otif_by_semester.otif_by_semester import (
-    add_semesters,
-    get_semester,
-    get_semester_end,
+from amf.amf.utils.semester_aggregation import (
+    PLANNING_SCRAP_FACT,
+    cache_semester_chart,
+    get_chart as _get_chart,
+    get_default_from_date,
+    get_semester_buckets,
+    get_semester_facts,
     get_semester_label_from_parts,
-    get_semester_start,
 )
 
 
@@ -24,7 +23,7 @@ CHART_COLORS = ["red"]
 
 
 @frappe.whitelist()
-@cache_source
+@cache_semester_chart
 def get(chart_name=None, chart=None, no_cache=None):
     chart = _get_chart(chart_name, chart)
     filters = normalize_filters(frappe.parse_json(chart.filters_json or "{}"))
@@ -48,19 +47,6 @@ def get(chart_name=None, chart=None, no_cache=None):
     }
 
 
-def _get_chart(chart_name=None, chart=None):
-    if chart_name:
-        return frappe.get_doc("Dashboard Chart", chart_name)
-
-    if hasattr(chart, "doctype"):
-        return chart
-
-    if isinstance(chart, dict):
-        return frappe._dict(chart)
-
-    return frappe._dict(frappe.parse_json(chart))
-
-
 def normalize_filters(filters=None):
     filters = frappe._dict(filters or {})
     filters.mode = filters.get("mode") or DEFAULT_MODE
@@ -71,9 +57,7 @@ def normalize_filters(filters=None):
     if filters.get("from_date"):
         filters.from_date = getdate(filters.from_date)
     else:
-        year, semester = get_semester(filters.to_date)
-        start_year, start_semester = add_semesters(year, semester, -(filters.semester_count - 1))
-        filters.from_date = get_semester_start(start_year, start_semester)
+        filters.from_date = get_default_from_date(filters.to_date, filters.semester_count)
 
     if filters.from_date > filters.to_date:
         frappe.throw(_("From Date cannot be after To Date"))
@@ -125,13 +109,13 @@ def get_scrap_rate_by_semester(filters=None):
     filters = normalize_filters(filters)
     buckets = get_empty_semester_buckets(filters.from_date, filters.to_date)
 
-    for row in get_scrap_semester_rows(filters):
-        label = get_semester_label_from_parts(row.year, row.semester)
+    for fact in get_semester_facts(PLANNING_SCRAP_FACT, filters.from_date, filters.to_date):
+        label = get_semester_label_from_parts(fact.year, fact.semester)
         if label not in buckets:
             continue
 
-        buckets[label]["valid_qty"] += flt(row.valid_qty)
-        buckets[label]["scrap_qty"] += flt(row.scrap_qty)
+        buckets[label]["valid_qty"] += flt(fact.total) - flt(fact.value)
+        buckets[label]["scrap_qty"] += flt(fact.value)
 
     for bucket in buckets.values():
         total_qty = bucket["valid_qty"] + bucket["scrap_qty"]
@@ -140,6 +124,19 @@ def get_scrap_rate_by_semester(filters=None):
     return list(buckets.values())
 
 
+def get_scrap_facts(from_date, to_date, company=None):
+    """Semester KPI Fact builder: scrap qty (value) and valid + scrap qty (total)."""
+    return [
+        {
+            "year": row.year,
+            "semester": row.semester,
+            "value": flt(row.scrap_qty),
+            "total": flt(row.valid_qty) + flt(row.scrap_qty),
+        }
+        for row in get_scrap_semester_rows(frappe._dict({"from_date": from_date, "to_date": to_date}))
+    ]
+
+
 def get_scrap_semester_rows(filters):
     return frappe.db.sql(
         """
@@ -163,30 +160,11 @@ def get_scrap_semester_rows(filters):
 
 
 def get_empty_semester_buckets(from_date, to_date):
-    buckets = OrderedDict()
-    year, semester = get_semester(from_date)
-    end_year, end_semester = get_semester(to_date)
-    end_index = get_semester_index(end_year, end_semester)
-
-    while get_semester_index(year, semester) <= end_index:
-        label = get_semester_label_from_parts(year, semester)
-        buckets[label] = {
-            "label": label,
-            "year": year,
-            "semester": semester,
-            "from_date": get_semester_start(year, semester),
-            "to_date": get_semester_end(year, semester),
-            "valid_qty": 0.0,
-            "scrap_qty": 0.0,
-            "scrap_rate": 0.0,
-        }
-        year, semester = add_semesters(year, semester, 1)
-
-    return buckets
-
-
-def get_semester_index(year, semester):
-    return (cint(year) * 2) + (cint(semester) - 1)
+    return get_semester_buckets(from_date, to_date, lambda bucket: {
+        "valid_qty": 0.0,
+        "scrap_qty": 0.0,
+        "scrap_rate": 0.0,
+    })
 
 
 def get_reference_label(row):
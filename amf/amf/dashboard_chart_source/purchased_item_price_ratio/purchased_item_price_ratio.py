@@ -1,19 +1,17 @@
 from __future__ import unicode_literals
 
 import math
-from collections import OrderedDict
-
 import frappe
 from frappe import _
-from frappe.core.page.dashboard.dashboard import cache_source
 from frappe.utils import cint, flt, getdate, today
 
-from amf.amf.dashboard_chart_source.otif_by_semester.otif_by_semester import (
-    add_semesters,
+from amf.amf.utils.semester_aggregation import (
+    cache_semester_chart,
+    get_chart as _get_chart,
+    get_default_from_date,
     get_semester,
-    get_semester_end,
+    get_semester_buckets,
     get_semester_label_from_parts,
-    get_semester_start,
 )
 
 
@@ -28,7 +26,7 @@ CHART_COLORS = ["orange"]
 
 
 @frappe.whitelist()
-@cache_source
+@cache_semester_chart
 def get(chart_name=None, chart=None, no_cache=None):
     chart = _get_chart(chart_name, chart)
     filters = normalize_filters(frappe.parse_json(chart.filters_json or "{}"))
@@ -46,19 +44,6 @@ def get(chart_name=None, chart=None, no_cache=None):
     }
 
 
-def _get_chart(chart_name=None, chart=None):
-    if chart_name:
-        return frappe.get_doc("Dashboard Chart", chart_name)
-
-    if hasattr(chart, "doctype"):
-        return chart
-
-    if isinstance(chart, dict):
-        return frappe._dict(chart)
-
-    return frappe._dict(frappe.parse_json(chart))
-
-
 def normalize_filters(filters=None):
     filters = frappe._dict(filters or {})
     filters.semester_count = max(1, cint(filters.get("semester_count") or DEFAULT_SEMESTER_COUNT))
@@ -67,9 +52,7 @@ def normalize_filters(filters=None):
     if filters.get("from_date"):
         filters.from_date = getdate(filters.from_date)
     else:
-        year, semester = get_semester(filters.to_date)
-        start_year, start_semester = add_semesters(year, semester, -(filters.semester_count - 1))
-        filters.from_date = get_semester_start(start_year, start_semester)
+        filters.from_date = get_default_from_date(filters.to_date, filters.semester_count)
 
     if filters.from_date > filters.to_date:
         frappe.throw(_("From Date cannot be after To Date"))
@@ -113,33 +96,14 @@ def get_purchased_item_price_ratio_by_semester(filters=None):
 
 
 def get_empty_semester_buckets(from_date, to_date):
-    buckets = OrderedDict()
-    year, semester = get_semester(from_date)
-    end_year, end_semester = get_semester(to_date)
-    end_index = get_semester_index(end_year, end_semester)
-
-    while get_semester_index(year, semester) <= end_index:
-        label = get_semester_label_from_parts(year, semester)
-        buckets[label] = {
-            "label": label,
-            "year": year,
-            "semester": semester,
-            "from_date": get_semester_start(year, semester),
-            "to_date": get_semester_end(year, semester),
-            "item_ratios": {},
-            "item_count": 0,
-            "anomaly_count": 0,
-            "included_item_count": 0,
-            "ratio": 0.0,
-            "ratio_percent": 0.0,
-        }
-        year, semester = add_semesters(year, semester, 1)
-
-    return buckets
-
-
-def get_semester_index(year, semester):
-    return (cint(year) * 2) + (cint(semester) - 1)
+    return get_semester_buckets(from_date, to_date, lambda bucket: {
+        "item_ratios": {},
+        "item_count": 0,
+        "anomaly_count": 0,
+        "included_item_count": 0,
+        "ratio": 0.0,
+        "ratio_percent": 0.0,
+    })
 
 
 def get_purchase_rows(filters):
@@ -1,18 +1,17 @@
 from __future__ import unicode_literals
 
-from collections import OrderedDict
-
 import frappe
 from frappe import _
-from frappe.core.page.dashboard.dashboard import cache_source
 from frappe.utils import cint, flt, getdate, today
 
-from amf.amf.dashboard_chart_source.otif_by_semester.otif_by_semester import (
-    add_semesters,
-    get_semester,
-    get_semester_end,
+from amf.amf.utils.semester_aggregation import (
+    PURCHASE_AMOUNT_FACT,
+    cache_semester_chart,
+    get_chart as _get_chart,
+    get_default_from_date,
+    get_semester_buckets,
+    get_semester_facts,
     get_semester_label_from_parts,
-    get_semester_start,
 )
 
 
@@ -25,7 +24,7 @@ CHART_COLORS = ["green", "blue", "red"]
 
 
 @frappe.whitelist()
-@cache_source
+@cache_semester_chart
 def get(chart_name=None, chart=None, no_cache=None):
     chart = _get_chart(chart_name, chart)
     filters = normalize_filters(frappe.parse_json(chart.filters_json or "{}"))
@@ -38,19 +37,6 @@ def get(chart_name=None, chart=None, no_cache=None):
     }
 
 
-def _get_chart(chart_name=None, chart=None):
-    if chart_name:
-        return frappe.get_doc("Dashboard Chart", chart_name)
-
-    if hasattr(chart, "doctype"):
-        return chart
-
-    if isinstance(chart, dict):
-        return frappe._dict(chart)
-
-    return frappe._dict(frappe.parse_json(chart))
-
-
 def normalize_filters(filters=None):
     filters = frappe._dict(filters or {})
     filters.semester_count = max(1, cint(filters.get("semester_count") or DEFAULT_SEMESTER_COUNT))
@@ -63,9 +49,7 @@ def normalize_filters(filters=None):
     if filters.get("from_date"):
         filters.from_date = getdate(filters.from_date)
     else:
-        year, semester = get_semester(filters.to_date)
-        start_year, start_semester = add_semesters(year, semester, -(filters.semester_count - 1))
-        filters.from_date = get_semester_start(start_year, start_semester)
+        filters.from_date = get_default_from_date(filters.to_date, filters.semester_count)
 
     if filters.from_date > filters.to_date:
         frappe.throw(_("From Date cannot be after To Date"))
@@ -77,12 +61,13 @@ def get_purchasing_amount_by_currency(filters=None):
     filters = normalize_filters(filters)
     buckets = get_empty_semester_buckets(filters.from_date, filters.to_date)
 
-    for row in get_purchase_invoice_amount_rows(filters):
-        label = get_semester_label_from_parts(row.year, row.semester)
-        if label not in buckets or row.currency not in CURRENCIES:
+    facts = get_semester_facts(PURCHASE_AMOUNT_FACT, filters.from_date, filters.to_date, filters.company)
+    for fact in facts:
+        label = get_semester_label_from_parts(fact.year, fact.semester)
+        if label not in buckets or fact.scope != filters.item_scope or fact.dimension not in CURRENCIES:
             continue
 
-        buckets[label]["amounts"][row.currency] += flt(row.amount)
+        buckets[label]["amounts"][fact.dimension] += flt(fact.value)
 
     for bucket in buckets.values():
         for currency in CURRENCIES:
@@ -102,43 +87,41 @@ def get_datasets(rows):
 
 
 def get_empty_semester_buckets(from_date, to_date):
-    buckets = OrderedDict()
-    year, semester = get_semester(from_date)
-    end_year, end_semester = get_semester(to_date)
-    end_index = get_semester_index(end_year, end_semester)
-
-    while get_semester_index(year, semester) <= end_index:
-        label = get_semester_label_from_parts(year, semester)
-        buckets[label] = {
-            "label": label,
-            "year": year,
-            "semester": semester,
-            "from_date": get_semester_start(year, semester),
-            "to_date": get_semester_end(year, semester),
-            "amounts": get_empty_currency_amounts(),
-        }
-        year, semester = add_semesters(year, semester, 1)
-
-    return buckets
+    return get_semester_buckets(from_date, to_date, lambda bucket: {
+        "amounts": get_empty_currency_amounts(),
+    })
 
 
 def get_empty_currency_amounts():
     return {currency: 0.0 for currency in CURRENCIES}
 
 
-def get_semester_index(year, semester):
-    return (cint(year) * 2) + (cint(semester) - 1)
+def get_purchase_amount_facts(from_date, to_date, company=None):
+    """Semester KPI Fact builder: purchase invoice amounts per currency and item scope."""
+    return [
+        {
+            "year": row.year,
+            "semester": row.semester,
+            "dimension": row.currency,
+            "scope": STOCK_ITEM_SCOPE if cint(row.is_stock_item) else NON_STOCK_ITEM_SCOPE,
+            "value": flt(row.amount),
+        }
+        for row in get_purchase_invoice_amount_rows(frappe._dict({
+            "from_date": from_date,
+            "to_date": to_date,
+            "company": company or DEFAULT_COMPANY,
+        }))
+    ]
 
 
 def get_purchase_invoice_amount_rows(filters):
-    is_stock_item = 1 if filters.item_scope == STOCK_ITEM_SCOPE else 0
-
     return frappe.db.sql(
         """
         SELECT
             YEAR(pi.posting_date) AS year,
             CASE WHEN MONTH(pi.posting_date) <= 6 THEN 1 ELSE 2 END AS semester,
             pi.currency,
+            IFNULL(item.is_stock_item, 0) AS is_stock_item,
             SUM(
                 COALESCE(
                     NULLIF(pii.net_amount, 0),
@@ -154,16 +137,14 @@ def get_purchase_invoice_amount_rows(filters):
             AND pi.posting_date BETWEEN %(from_date)s AND %(to_date)s
             AND pi.company = %(company)s
             AND pi.currency IN %(currencies)s
-            AND IFNULL(item.is_stock_item, 0) = %(is_stock_item)s
             AND IFNULL(pii.item_code, '') != ''
-        GROUP BY year, semester, pi.currency
+        GROUP BY year, semester, pi.currency, is_stock_item
         """,
         {
             "from_date": filters.from_date,
             "to_date": filters.to_date,
             "company": filters.company,
             "currencies": CURRENCIES,
-            "is_stock_item": is_stock_item,
         },
         as_dict=True,
     )
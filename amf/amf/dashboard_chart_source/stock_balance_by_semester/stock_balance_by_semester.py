@@ -1,18 +1,19 @@
 from __future__ import unicode_literals
 
-from collections import OrderedDict
-
 import frappe
 from frappe import _
-from frappe.core.page.dashboard.dashboard import cache_source
 from frappe.utils import cint, flt, getdate, today
 
-from amf.amf.dashboard_chart_source.otif_by_semester.otif_by_semester import (
-    add_semesters,
-    get_semester,
-    get_semester_end,
-    get_semester_label_from_parts,
-    get_semester_start,
+from amf.amf.doctype.stock_balance_semester_snapshot.stock_balance_semester_snapshot import (
+    get_semester_snapshots,
+    get_snapshot_balances,
+    save_semester_snapshot,
+)
+from amf.amf.utils.semester_aggregation import (
+    cache_semester_chart,
+    get_chart as _get_chart,
+    get_default_from_date,
+    get_semester_buckets,
 )
 
 
@@ -26,11 +27,14 @@ STOCK_QTY_COLOR = "blue"
 
 
 @frappe.whitelist()
-@cache_source
+@cache_semester_chart
 def get(chart_name=None, chart=None, no_cache=None):
     chart = _get_chart(chart_name, chart)
     filters = normalize_filters(frappe.parse_json(chart.filters_json or "{}"))
     rows = get_stock_balance_by_semester(filters)
+    # Chart sources are fetched with GET, which does not commit: keep the
+    # semester snapshots stored during this refresh.
+    frappe.db.commit()
 
     return {
         "labels": [row["label"] for row in rows],
@@ -39,19 +43,6 @@ def get(chart_name=None, chart=None, no_cache=None):
     }
 
 
-def _get_chart(chart_name=None, chart=None):
-    if chart_name:
-        return frappe.get_doc("Dashboard Chart", chart_name)
-
-    if hasattr(chart, "doctype"):
-        return chart
-
-    if isinstance(chart, dict):
-        return frappe._dict(chart)
-
-    return frappe._dict(frappe.parse_json(chart))
-
-
 def normalize_filters(filters=None):
     filters = frappe._dict(filters or {})
     filters.mode = filters.get("mode") or COMBINED_MODE
@@ -65,9 +56,7 @@ def normalize_filters(filters=None):
     if filters.get("from_date"):
         filters.from_date = getdate(filters.from_date)
     else:
-        year, semester = get_semester(filters.to_date)
-        start_year, start_semester = add_semesters(year, semester, -(filters.semester_count - 1))
-        filters.from_date = get_semester_start(start_year, start_semester)
+        filters.from_date = get_default_from_date(filters.to_date, filters.semester_count)
 
     if filters.from_date > filters.to_date:
         frappe.throw(_("From Date cannot be after To Date"))
@@ -103,56 +92,75 @@ def get_colors(mode):
 
 
 def get_stock_balance_by_semester(filters=None):
+    """
+    Return the stock balance at the end of each semester in the filter range.
+
+    Closed semesters are read from Stock Balance Semester Snapshot. The ledger is
+    only replayed from the last stored snapshot on, and every semester closed
+    during that replay is stored for the next refresh.
+    """
     filters = normalize_filters(filters)
     buckets = get_empty_semester_buckets(filters.from_date, filters.to_date)
     snapshots = list(buckets.values())
-    balances = {}
+    stored = get_semester_snapshots(filters.company, filters.get("warehouse"), filters.to_date)
     snapshot_index = 0
 
-    for row in get_stock_ledger_entries(filters):
-        posting_date = getdate(row.posting_date)
-        while snapshot_index < len(snapshots) and posting_date > snapshots[snapshot_index]["snapshot_date"]:
-            update_snapshot(snapshots[snapshot_index], balances)
-            snapshot_index += 1
+    while snapshot_index < len(snapshots) and snapshots[snapshot_index]["snapshot_date"] in stored:
+        row = stored[snapshots[snapshot_index]["snapshot_date"]]
+        snapshots[snapshot_index]["balance_qty"] = round(flt(row.balance_qty), 3)
+        snapshots[snapshot_index]["balance_value"] = round(flt(row.balance_value), 2)
+        snapshot_index += 1
+
+    # Resume from the latest stored snapshot before the first missing bucket.
+    resume_before = snapshots[snapshot_index]["snapshot_date"] if snapshot_index < len(snapshots) else None
+    base_dates = [date for date in stored if resume_before and date < resume_before]
+    after_date = max(base_dates) if base_dates else None
+    balances = {}
+    if after_date:
+        balances = get_snapshot_balances(filters.company, filters.get("warehouse"), after_date)
+    totals = {
+        "qty": sum(balance["qty"] for balance in balances.values()),
+        "value": sum(balance["value"] for balance in balances.values()),
+    }
 
-        apply_stock_ledger_entry(balances, row)
+    if snapshot_index < len(snapshots):
+        for row in get_stock_ledger_entries(filters, after_date=after_date):
+            posting_date = getdate(row.posting_date)
+            while snapshot_index < len(snapshots) and posting_date > snapshots[snapshot_index]["snapshot_date"]:
+                close_snapshot(snapshots[snapshot_index], balances, totals, filters)
+                snapshot_index += 1
 
-    while snapshot_index < len(snapshots):
-        update_snapshot(snapshots[snapshot_index], balances)
-        snapshot_index += 1
+            apply_stock_ledger_entry(balances, row, totals)
 
-    return snapshots
+        while snapshot_index < len(snapshots):
+            close_snapshot(snapshots[snapshot_index], balances, totals, filters)
+            snapshot_index += 1
 
+    return snapshots
 
-def get_empty_semester_buckets(from_date, to_date):
-    buckets = OrderedDict()
-    year, semester = get_semester(from_date)
-    end_year, end_semester = get_semester(to_date)
-    end_index = get_semester_index(end_year, end_semester)
-
-    while get_semester_index(year, semester) <= end_index:
-        label = get_semester_label_from_parts(year, semester)
-        semester_end = get_semester_end(year, semester)
-        buckets[label] = {
-            "label": label,
-            "year": year,
-            "semester": semester,
-            "from_date": get_semester_start(year, semester),
-            "to_date": semester_end,
-            "snapshot_date": min(semester_end, to_date),
-            "balance_qty": 0.0,
-            "balance_value": 0.0,
-        }
-        year, semester = add_semesters(year, semester, 1)
 
-    return buckets
+def close_snapshot(bucket, balances, totals, filters):
+    update_snapshot(bucket, balances, totals)
+    if bucket["snapshot_date"] == bucket["to_date"] and bucket["to_date"] < getdate(today()):
+        save_semester_snapshot(
+            filters.company,
+            filters.get("warehouse"),
+            bucket["snapshot_date"],
+            bucket["balance_qty"],
+            bucket["balance_value"],
+            balances,
+        )
 
 
-def get_semester_index(year, semester):
-    return (cint(year) * 2) + (cint(semester) - 1)
+def get_empty_semester_buckets(from_date, to_date):
+    return get_semester_buckets(from_date, to_date, lambda bucket: {
+        "snapshot_date": min(bucket["to_date"], to_date),
+        "balance_qty": 0.0,
+        "balance_value": 0.0,
+    })
 
 
-def get_stock_ledger_entries(filters):
+def get_stock_ledger_entries(filters, after_date=None):
     conditions = [
         "sle.docstatus < 2",
         "sle.posting_date <= %(to_date)s",
@@ -162,6 +170,9 @@ def get_stock_ledger_entries(filters):
         "to_date": filters.to_date,
         "company": filters.company,
     }
+    if after_date:
+        conditions.append("sle.posting_date > %(after_date)s")
+        values["after_date"] = after_date
 
     if filters.get("warehouse"):
         warehouse_details = frappe.db.get_value(
@@ -213,7 +224,7 @@ def get_stock_ledger_entries(filters):
     )
 
 
-def apply_stock_ledger_entry(balances, row):
+def apply_stock_ledger_entry(balances, row, totals=None):
     key = (row.item_code, row.warehouse)
     if key not in balances:
         balances[key] = {"qty": 0.0, "value": 0.0}
@@ -223,10 +234,20 @@ def apply_stock_ledger_entry(balances, row):
     else:
         qty_diff = flt(row.actual_qty)
 
+    value_diff = flt(row.stock_value_difference)
     balances[key]["qty"] += qty_diff
-    balances[key]["value"] += flt(row.stock_value_difference)
+    balances[key]["value"] += value_diff
+    if totals is not None:
+        totals["qty"] += qty_diff
+        totals["value"] += value_diff
+
 
+def update_snapshot(bucket, balances, totals=None):
+    if totals is None:
+        totals = {
+            "qty": sum(balance["qty"] for balance in balances.values()),
+            "value": sum(balance["value"] for balance in balances.values()),
+        }
 
-def update_snapshot(bucket, balances):
-    bucket["balance_qty"] = round(sum(balance["qty"] for balance in balances.values()), 3)
-    bucket["balance_value"] = round(sum(balance["value"] for balance in balances.values()), 2)
+    bucket["balance_qty"] = round(totals["qty"], 3)
+    bucket["balance_value"] = round(totals["value"], 2)
@@ -3,8 +3,143 @@
 # See license.txt
 from __future__ import unicode_literals
 
-# import frappe
+import json
+import threading
 import unittest
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import MagicMock, patch
+
+import frappe
+
+from amf.www import tracking
+
+
+class _StubDHLHandler(BaseHTTPRequestHandler):
+	protocol_version = "HTTP/1.1"
+	requests = []
+	clients = set()
+
+	def do_GET(self):
+		self.requests.append(self.path)
+		self.clients.add(self.client_address)
+		tracking_number = self.path.rsplit("=", 1)[-1]
+		if tracking_number == "0000000000":
+			self._send(404, {"title": "No shipment with given tracking number found."})
+		else:
+			self._send(200, {"shipments": [{
+				"id": tracking_number,
+				"status": {"statusCode": "transit", "description": "In transit", "timestamp": "2026-10-17T08:00:00"},
+			}]})
+
+	def _send(self, status, payload):
+		body = json.dumps(payload).encode("utf-8")
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, *args):
+		pass
+
 
 class TestDHLTrackingInformation(unittest.TestCase):
-	pass
+	def test_poller_reuses_one_connection_against_a_stub_server(self):
+		server = HTTPServer(("127.0.0.1", 0), _StubDHLHandler)
+		thread = threading.Thread(target=server.serve_forever, daemon=True)
+		thread.start()
+		_StubDHLHandler.requests = []
+		_StubDHLHandler.clients = set()
+		limiter = tracking.TokenBucket(rate=1000, capacity=10)
+
+		try:
+			shipments = tracking.poll_tracking_numbers(
+				["1234567890", "0000000000", "1234567891"],
+				"KEY",
+				workers=1,
+				client_factory=lambda: tracking.DHLTrackingClient(
+					"KEY", limiter=limiter, host="127.0.0.1", port=server.server_port, use_ssl=False
+				),
+			)
+		finally:
+			server.shutdown()
+			server.server_close()
+
+		self.assertEqual(shipments["1234567890"]["status"]["statusCode"], "transit")
+		self.assertEqual(shipments["0000000000"], {})
+		self.assertEqual(len(_StubDHLHandler.requests), 3)
+		self.assertEqual(len(_StubDHLHandler.clients), 1)
+
+	def test_token_bucket_waits_for_the_next_token(self):
+		clock = [0.0]
+		sleeps = []
+
+		def sleep(seconds):
+			sleeps.append(seconds)
+			clock[0] += seconds
+
+		limiter = tracking.TokenBucket(rate=0.2, capacity=1, clock=lambda: clock[0], sleep=sleep)
+		limiter.acquire()
+		limiter.acquire()
+		limiter.defer(10)
+		limiter.acquire()
+
+		self.assertEqual(sleeps, [5.0, 15.0])
+
+	def test_delivered_and_recently_checked_shipments_are_skipped(self):
+		infos = [
+			{"name": "DN-1", "tracking_no": "1000000001", "customer": "C", "date": None},
+			{"name": "DN-2", "tracking_no": "1000000002", "customer": "C", "date": None},
+			{"name": "DN-3", "tracking_no": "1000000003", "customer": "C", "date": None},
+			{"name": "DN-4", "tracking_no": "1000000004", "customer": "C", "date": None},
+			{"name": "DN-5", "tracking_no": "1000000004", "customer": "C", "date": None},
+			{"name": "DN-6", "tracking_no": "1000000006", "customer": "C", "date": None},
+		]
+		existing = {
+			"1000000001": frappe._dict(status="Delivered", status_code=None, checked_on=None),
+			"1000000002": frappe._dict(status="In transit", status_code="transit", checked_on=datetime(2026, 10, 18, 6)),
+			"1000000004": frappe._dict(status="In transit", status_code="transit", checked_on=datetime(2026, 10, 16, 6)),
+		}
+
+		to_poll, skipped = tracking.select_tracking_infos_to_poll(infos, existing, now=datetime(2026, 10, 18, 8))
+
+		self.assertEqual([info["name"] for info in to_poll], ["DN-3", "DN-6", "DN-4"])
+		self.assertEqual(skipped, {"delivered": 1, "recent": 1, "duplicate": 1})
+
+	def test_reconciliation_writes_only_new_and_changed_shipments(self):
+		checked_on = datetime(2026, 10, 18, 8)
+		existing = {
+			"1000000001": frappe._dict(name="TRK-1", status="In transit", status_code="transit", last_update="T1"),
+			"1000000002": frappe._dict(name="TRK-2", status="In transit", status_code="transit", last_update="T1"),
+			"1000000003": frappe._dict(name="TRK-3", status="In transit", status_code="transit", last_update="T1"),
+		}
+		results = [
+			{"name": "DN-1", "tracking_number": "1000000001", "customer": "C", "date": None, "checked_on": checked_on,
+				"status": "Delivered", "status_code": "delivered", "last_update": "T2"},
+			{"name": "DN-2", "tracking_number": "1000000002", "customer": "C", "date": None, "checked_on": checked_on,
+				"status": "In transit", "status_code": "transit", "last_update": "T1"},
+			{"name": "DN-3", "tracking_number": "1000000003", "customer": "C", "date": None, "checked_on": None},
+			{"name": "DN-4", "tracking_number": "1000000004", "customer": "C", "date": None, "checked_on": checked_on,
+				"status": "In transit", "status_code": "transit", "last_update": "T1"},
+		]
+		new_doc = MagicMock()
+		new_doc.insert.return_value.as_dict.return_value = {"name": "TRK-4", "tracking_number": "1000000004"}
+
+		with patch.object(tracking.frappe, "get_doc", return_value=new_doc) as get_doc, patch.object(
+			tracking.frappe.db, "set_value"
+		) as set_value, patch.object(tracking.frappe.db, "sql") as sql, patch.object(
+			tracking.frappe.db, "commit"
+		) as commit:
+			summary = tracking.save_tracking_results(None, results, existing)
+
+		self.assertEqual(summary, {"new": 1, "updated": 1, "unchanged": 1, "failed": 1})
+		self.assertEqual(get_doc.call_args.args[0]["tracking_number"], "1000000004")
+		set_value.assert_called_once_with("DHL Tracking Information", "TRK-1", {
+			"status": "Delivered",
+			"status_code": "delivered",
+			"last_update": "T2",
+			"checked_on": checked_on,
+		})
+		self.assertEqual(sql.call_args.args[1]["names"], ("TRK-2",))
+		commit.assert_called_once_with()
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, libracore AG and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+
+from datetime import timedelta
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import cstr, flt, getdate, now, nowdate
+
+
+DEMAND_VOUCHER_TYPES = ("Delivery Note", "Sales Invoice")
+DEMAND_STOCK_ENTRY_PURPOSES = (
+	"Manufacture",
+	"Material Consumption for Manufacture",
+	"Material Issue",
+	"Repack",
+)
+COVERED_FROM_KEY = "amf_item_daily_outflow_covered_from"
+DEFAULT_RECONCILE_DAYS = 365
+RECONCILE_WINDOW_DAYS = 31
+WRITE_CHUNK_SIZE = 500
+
+
+class ItemDailyOutflow(Document):
+	def autoname(self):
+		self.name = make_outflow_name(self.item_code, self.posting_date)
+
+
+def make_outflow_name(item_code, posting_date):
+	return "{0}::{1}".format(item_code, getdate(posting_date).isoformat())
+
+
+def get_outflow_delta(sle, stock_entry_purpose=None):
+	"""
+	Return the change a Stock Ledger Entry makes to its item's daily demand outflow.
+
+	Only issues from demand vouchers count, mirroring the SLE aggregation used by
+	the safety stock check. Cancellation reversals (is_cancelled = "Yes" with a
+	positive qty) remove the outflow the original entry added.
+	"""
+	actual_qty = flt(sle.get("actual_qty"))
+	cancelled = cstr(sle.get("is_cancelled")) == "Yes"
+	if (cancelled and actual_qty <= 0) or (not cancelled and actual_qty >= 0):
+		return 0.0
+
+	voucher_type = sle.get("voucher_type")
+	if voucher_type == "Stock Entry":
+		if stock_entry_purpose not in DEMAND_STOCK_ENTRY_PURPOSES:
+			return 0.0
+	elif voucher_type not in DEMAND_VOUCHER_TYPES:
+		return 0.0
+
+	return -actual_qty
+
+
+def update_item_daily_outflow(doc, method=None):
+	"""Stock Ledger Entry on_submit: fold the entry into the persisted daily outflow."""
+	if not doc.get("item_code") or not doc.get("posting_date"):
+		return
+
+	stock_entry_purpose = None
+	if doc.get("voucher_type") == "Stock Entry":
+		stock_entry_purpose = frappe.db.get_value("Stock Entry", doc.voucher_no, "purpose")
+
+	delta = get_outflow_delta(doc, stock_entry_purpose=stock_entry_purpose)
+	if delta:
+		_write_outflows([(doc.item_code, getdate(doc.posting_date), delta)], accumulate=True)
+
+
+def get_sle_daily_outflow_rows(item_codes, start_date, end_date):
+	"""Aggregate daily demand outflow straight from the Stock Ledger (all items when item_codes is None)."""
+	if item_codes is not None and not item_codes:
+		return []
+
+	conditions = []
+	args = []
+	if item_codes is not None:
+		conditions.append("sle.item_code IN ({0})".format(",".join(["%s"] * len(item_codes))))
+		args.extend(item_codes)
+
+	voucher_placeholders = ",".join(["%s"] * len(DEMAND_VOUCHER_TYPES))
+	stock_entry_purpose_placeholders = ",".join(["%s"] * len(DEMAND_STOCK_ENTRY_PURPOSES))
+	conditions.append("""
+		sle.actual_qty < 0
+		AND IFNULL(sle.is_cancelled, 'No') = 'No'
+		AND sle.posting_date >= %s
+		AND sle.posting_date <= %s
+		AND (
+			sle.voucher_type IN ({0})
+			OR (
+				sle.voucher_type = 'Stock Entry'
+				AND se.purpose IN ({1})
+			)
+		)
+	""".format(voucher_placeholders, stock_entry_purpose_placeholders))
+	args.extend([start_date, end_date])
+	args.extend(DEMAND_VOUCHER_TYPES)
+	args.extend(DEMAND_STOCK_ENTRY_PURPOSES)
+
+	return frappe.db.sql(
+		"""
+		SELECT
+			sle.item_code,
+			sle.posting_date,
+			COALESCE(-SUM(sle.actual_qty), 0) AS qty
+		FROM `tabStock Ledger Entry` sle
+		LEFT JOIN `tabStock Entry` se
+			ON se.name = sle.voucher_no
+			AND sle.voucher_type = 'Stock Entry'
+		WHERE {0}
+		GROUP BY sle.item_code, sle.posting_date
+		""".format(" AND ".join(conditions)),
+		tuple(args),
+		as_dict=True,
+	)
+
+
+def get_stored_daily_outflow_rows(item_codes, start_date, end_date):
+	if not item_codes:
+		return []
+
+	return frappe.db.sql(
+		"""
+		SELECT item_code, posting_date, qty
+		FROM `tabItem Daily Outflow`
+		WHERE item_code IN ({0})
+			AND posting_date >= %s
+			AND posting_date <= %s
+			AND qty != 0
+		""".format(",".join(["%s"] * len(item_codes))),
+		tuple(list(item_codes) + [start_date, end_date]),
+		as_dict=True,
+	)
+
+
+def store_covers(start_date):
+	"""True when a full reconcile has back-filled the store from start_date onwards."""
+	covered_from = frappe.db.get_global(COVERED_FROM_KEY)
+	return bool(covered_from) and getdate(covered_from) <= getdate(start_date)
+
+
+@frappe.whitelist()
+def reconcile_item_daily_outflows(item_code=None, from_date=None, to_date=None):
+	"""
+	Rebuild the stored daily outflows from the Stock Ledger.
+
+	Back-fills the store on first use and repairs drift afterwards. Without an
+	item_code every item is rebuilt and the covered range is recorded, which
+	switches the safety stock check over to the store.
+	"""
+	to_date = getdate(to_date or nowdate())
+	from_date = getdate(from_date) if from_date else to_date - timedelta(days=DEFAULT_RECONCILE_DAYS - 1)
+	item_codes = [item_code] if item_code else None
+	result = {
+		"item_code": item_code,
+		"from_date": from_date.isoformat(),
+		"to_date": to_date.isoformat(),
+		"rows_written": 0,
+	}
+
+	window_start = from_date
+	while window_start <= to_date:
+		window_end = min(to_date, window_start + timedelta(days=RECONCILE_WINDOW_DAYS - 1))
+		_delete_outflows(item_codes, window_start, window_end)
+		rows = get_sle_daily_outflow_rows(item_codes, window_start, window_end)
+		_write_outflows(
+			[(row.item_code, getdate(row.posting_date), flt(row.qty)) for row in rows],
+			accumulate=False,
+		)
+		result["rows_written"] += len(rows)
+		frappe.db.commit()
+		window_start = window_end + timedelta(days=1)
+
+	if not item_code and to_date >= getdate(nowdate()) and not store_covers(from_date):
+		frappe.db.set_global(COVERED_FROM_KEY, from_date.isoformat())
+		frappe.db.commit()
+
+	return result
+
+
+@frappe.whitelist()
+def enqueue_reconcile_item_daily_outflows(item_code=None, from_date=None, to_date=None):
+	frappe.enqueue(
+		"amf.amf.doctype.item_daily_outflow.item_daily_outflow.reconcile_item_daily_outflows",
+		queue="long",
+		timeout=3600,
+		item_code=item_code,
+		from_date=from_date,
+		to_date=to_date,
+	)
+	return {"status": "queued"}
+
+
+def _delete_outflows(item_codes, start_date, end_date):
+	conditions = "posting_date >= %s AND posting_date <= %s"
+	args = [start_date, end_date]
+	if item_codes is not None:
+		conditions += " AND item_code IN ({0})".format(",".join(["%s"] * len(item_codes)))
+		args.extend(item_codes)
+
+	frappe.db.sql("DELETE FROM `tabItem Daily Outflow` WHERE {0}".format(conditions), tuple(args))
+
+
+def _write_outflows(outflows, accumulate):
+	"""Upsert (item_code, posting_date, qty) rows; accumulate adds qty to an existing day."""
+	if not outflows:
+		return
+
+	timestamp = now()
+	user = frappe.session.user
+	update_clause = "qty = qty + VALUES(qty)" if accumulate else "qty = VALUES(qty)"
+
+	for start in range(0, len(outflows), WRITE_CHUNK_SIZE):
+		chunk = outflows[start:start + WRITE_CHUNK_SIZE]
+		values = []
+		for item_code, posting_date, qty in chunk:
+			values.extend([
+				make_outflow_name(item_code, posting_date),
+				timestamp,
+				timestamp,
+				user,
+				user,
+				item_code,
+				posting_date,
+				qty,
+			])
+
+		frappe.db.sql(
+			"""
+			INSERT INTO `tabItem Daily Outflow`
+				(name, creation, modified, modified_by, owner, docstatus, item_code, posting_date, qty)
+			VALUES {0}
+			ON DUPLICATE KEY UPDATE {1}, modified = VALUES(modified)
+			""".format(
+				",".join(["(%s, %s, %s, %s, %s, 0, %s, %s, %s)"] * len(chunk)),
+				update_clause,
+			),
+			tuple(values),
+		)
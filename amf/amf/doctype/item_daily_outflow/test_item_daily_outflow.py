@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, libracore AG and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import unittest
+
+import frappe
+
+from amf.amf.doctype.item_daily_outflow.item_daily_outflow import get_outflow_delta
+
+
+class TestItemDailyOutflow(unittest.TestCase):
+	def _sle(self, **values):
+		sle = frappe._dict({
+			"item_code": "ITEM-001",
+			"posting_date": "2026-06-30",
+			"voucher_type": "Delivery Note",
+			"voucher_no": "DN-001",
+			"actual_qty": -5,
+			"is_cancelled": "No",
+		})
+		sle.update(values)
+		return sle
+
+	def test_issue_from_demand_voucher_adds_outflow(self):
+		self.assertEqual(get_outflow_delta(self._sle()), 5.0)
+
+	def test_receipt_is_not_demand(self):
+		self.assertEqual(get_outflow_delta(self._sle(actual_qty=5)), 0.0)
+
+	def test_cancellation_reversal_removes_outflow(self):
+		self.assertEqual(get_outflow_delta(self._sle(actual_qty=5, is_cancelled="Yes")), -5.0)
+
+	def test_stock_entry_outflow_depends_on_purpose(self):
+		manufacture = self._sle(voucher_type="Stock Entry", voucher_no="SE-001")
+		transfer = self._sle(voucher_type="Stock Entry", voucher_no="SE-002")
+
+		self.assertEqual(get_outflow_delta(manufacture, stock_entry_purpose="Manufacture"), 5.0)
+		self.assertEqual(get_outflow_delta(transfer, stock_entry_purpose="Material Transfer"), 0.0)
+
+	def test_other_voucher_types_are_ignored(self):
+		self.assertEqual(get_outflow_delta(self._sle(voucher_type="Stock Reconciliation")), 0.0)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, libracore AG and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+
+import json
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import getdate
+
+
+SNAPSHOT_DOCTYPE = "Operations KPI Period Snapshot"
+
+
+class OperationsKPIPeriodSnapshot(Document):
+    def autoname(self):
+        self.name = make_period_snapshot_name(
+            self.company,
+            self.period_type,
+            self.period_label,
+        )
+
+
+def make_period_snapshot_name(company, period_type, period_label):
+    return "{0}::{1}::{2}".format(company, period_type, period_label)
+
+
+def get_period_snapshot(company, period_type, period_label, period_end):
+    """Return the stored snapshot dict of a closed period, or None."""
+    snapshot = frappe.db.get_value(
+        SNAPSHOT_DOCTYPE,
+        make_period_snapshot_name(company, period_type, period_label),
+        ["period_end", "snapshot_json"],
+        as_dict=True,
+    )
+    if not snapshot or getdate(snapshot.period_end) != getdate(period_end):
+        return None
+    return json.loads(snapshot.snapshot_json or "{}")
+
+
+def save_period_snapshot(company, period_type, period_label, period_start, period_end, values):
+    """Store the KPI values of a closed period; an existing snapshot for the same key wins."""
+    name = make_period_snapshot_name(company, period_type, period_label)
+    if frappe.db.exists(SNAPSHOT_DOCTYPE, name):
+        return name
+
+    snapshot = frappe.get_doc({
+        "doctype": SNAPSHOT_DOCTYPE,
+        "company": company,
+        "period_type": period_type,
+        "period_label": period_label,
+        "period_start": period_start,
+        "period_end": period_end,
+        "snapshot_json": json.dumps(values, sort_keys=True),
+    })
+    try:
+        snapshot.insert(ignore_permissions=True)
+    except frappe.DuplicateEntryError:
+        # A concurrent report generation stored the same period first.
+        pass
+    return name
+
+
+def invalidate_period_snapshots(from_date):
+    """Drop every snapshot of a period ending on or after from_date."""
+    if not from_date:
+        return
+
+    frappe.db.sql(
+        """
+        DELETE FROM `tabOperations KPI Period Snapshot`
+        WHERE period_end >= %s
+        """,
+        (getdate(from_date),),
+    )
+
+
+def invalidate_period_snapshots_for_delivery_note(doc, method=None):
+    """Delivery Note on_submit/on_cancel: OTIF periods follow the Sales Order Item delivery date."""
+    so_details = [row.so_detail for row in doc.get("items") or [] if row.get("so_detail")]
+    if not so_details:
+        return
+
+    invalidate_period_snapshots(frappe.db.sql(
+        """
+        SELECT MIN(delivery_date)
+        FROM `tabSales Order Item`
+        WHERE name IN %(so_details)s
+        """,
+        {"so_details": tuple(so_details)},
+    )[0][0])
+
+
+def invalidate_period_snapshots_for_sales_order(doc, method=None):
+    """Sales Order on_cancel/on_update_after_submit: delivery dates or OTIF flags may have changed."""
+    rows = list(doc.get("items") or [])
+    previous = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+    if previous:
+        rows.extend(previous.get("items") or [])
+
+    delivery_dates = [getdate(row.delivery_date) for row in rows if row.get("delivery_date")]
+    if doc.get("delivery_date"):
+        delivery_dates.append(getdate(doc.delivery_date))
+    if delivery_dates:
+        invalidate_period_snapshots(min(delivery_dates))
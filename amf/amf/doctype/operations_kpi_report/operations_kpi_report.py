@@ -88,7 +88,7 @@ def enqueue_generation(name, force=0):
     doc = frappe.get_doc("Operations KPI Report", name)
     doc.check_permission("write")
 
-    if doc.status in ("Queued", "Generating") and not int(force):
+    if doc.status in ("Queued", "Generating", "Rendering") and not int(force):
         return {"name": doc.name, "status": doc.status}
 
     doc.db_set("source", "Manual", update_modified=False)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, libracore AG and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import cint, cstr, flt
+
+
+class SemesterKPIFact(Document):
+	pass
+
+
+def get_stored_facts(fact_type, company, from_index, to_index):
+	"""Return the stored facts of one fact type, keyed by (year, semester).
+
+	Semesters are given as indexes (year * 2 + semester - 1), see
+	amf.amf.utils.semester_aggregation.get_semester_index.
+	"""
+	rows = frappe.db.sql(
+		"""
+		SELECT year, semester, dimension, scope, value, total
+		FROM `tabSemester KPI Fact`
+		WHERE fact_type = %s
+			AND IFNULL(company, '') = %s
+			AND (year * 2 + semester - 1) BETWEEN %s AND %s
+		""",
+		(fact_type, cstr(company), from_index, to_index),
+		as_dict=True,
+	)
+	facts = OrderedDict()
+	for row in rows:
+		facts.setdefault((cint(row.year), cint(row.semester)), []).append(row)
+	return facts
+
+
+def replace_semester_facts(fact_type, company, year, semester, facts):
+	"""Replace the stored facts of one semester with the given rows."""
+	frappe.db.sql(
+		"""
+		DELETE FROM `tabSemester KPI Fact`
+		WHERE fact_type = %s
+			AND IFNULL(company, '') = %s
+			AND year = %s
+			AND semester = %s
+		""",
+		(fact_type, cstr(company), cint(year), cint(semester)),
+	)
+
+	for fact in facts:
+		frappe.get_doc({
+			"doctype": "Semester KPI Fact",
+			"fact_type": fact_type,
+			"company": company or None,
+			"year": cint(year),
+			"semester": cint(semester),
+			"dimension": fact.get("dimension") or "",
+			"scope": fact.get("scope") or "",
+			"value": flt(fact.get("value")),
+			"total": flt(fact.get("total")),
+		}).insert(ignore_permissions=True)
+
+	return len(facts)
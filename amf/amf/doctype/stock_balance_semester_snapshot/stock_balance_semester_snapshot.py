@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, libracore AG and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+
+import json
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import cstr, flt, getdate, today
+
+from amf.amf.utils.semester_aggregation import add_semesters, get_semester, get_semester_end
+
+
+class StockBalanceSemesterSnapshot(Document):
+	def autoname(self):
+		self.name = make_snapshot_name(self.company, self.warehouse, self.snapshot_date)
+
+
+def on_doctype_update():
+	frappe.db.add_index("Stock Balance Semester Snapshot", ["company", "snapshot_date"])
+
+
+def make_snapshot_name(company, warehouse, snapshot_date):
+	return "{0}::{1}::{2}".format(company, warehouse or "*", getdate(snapshot_date).isoformat())
+
+
+def get_semester_snapshots(company, warehouse, to_date):
+	"""Return the stored snapshot totals for one chart filter, keyed by snapshot date."""
+	rows = frappe.db.sql(
+		"""
+		SELECT snapshot_date, balance_qty, balance_value
+		FROM `tabStock Balance Semester Snapshot`
+		WHERE company = %s
+			AND IFNULL(warehouse, '') = %s
+			AND snapshot_date <= %s
+		""",
+		(company, cstr(warehouse), to_date),
+		as_dict=True,
+	)
+	return {getdate(row.snapshot_date): row for row in rows}
+
+
+def get_snapshot_balances(company, warehouse, snapshot_date):
+	"""Return the per (item_code, warehouse) balances stored with one snapshot."""
+	balances_json = frappe.db.get_value(
+		"Stock Balance Semester Snapshot",
+		make_snapshot_name(company, warehouse, snapshot_date),
+		"balances",
+	)
+	balances = {}
+	for item_code, item_warehouse, qty, value in json.loads(balances_json or "[]"):
+		balances[(item_code, item_warehouse)] = {"qty": flt(qty), "value": flt(value)}
+	return balances
+
+
+def save_semester_snapshot(company, warehouse, snapshot_date, balance_qty, balance_value, balances):
+	"""Store a closed-semester snapshot; an existing snapshot for the same key wins."""
+	name = make_snapshot_name(company, warehouse, snapshot_date)
+	if frappe.db.exists("Stock Balance Semester Snapshot", name):
+		return name
+
+	snapshot = frappe.get_doc({
+		"doctype": "Stock Balance Semester Snapshot",
+		"company": company,
+		"warehouse": warehouse or None,
+		"snapshot_date": snapshot_date,
+		"balance_qty": balance_qty,
+		"balance_value": balance_value,
+		"balances": json.dumps([
+			[item_code, item_warehouse, balance["qty"], balance["value"]]
+			for (item_code, item_warehouse), balance in sorted(balances.items())
+			if balance["qty"] or balance["value"]
+		]),
+	})
+	try:
+		snapshot.insert(ignore_permissions=True)
+	except frappe.DuplicateEntryError:
+		# A concurrent chart refresh stored the same semester first.
+		pass
+	return name
+
+
+def invalidate_stock_balance_snapshots(doc, method=None):
+	"""Stock Ledger Entry on_submit: drop snapshots a back-dated entry has made stale."""
+	if not doc.get("company") or not doc.get("posting_date"):
+		return
+
+	# Snapshots are only stored for closed semesters: entries posted in the
+	# open semester (nearly all of them) cannot make one stale.
+	posting_date = getdate(doc.posting_date)
+	if posting_date > get_semester_end(*add_semesters(*get_semester(today()), -1)):
+		return
+
+	filters = {"company": doc.company, "snapshot_date": (">=", posting_date)}
+	if not frappe.db.exists("Stock Balance Semester Snapshot", filters):
+		return
+
+	frappe.db.sql(
+		"""
+		DELETE FROM `tabStock Balance Semester Snapshot`
+		WHERE company = %s
+			AND snapshot_date >= %s
+		""",
+		(doc.company, posting_date),
+	)
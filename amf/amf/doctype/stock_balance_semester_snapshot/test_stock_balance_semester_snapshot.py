@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, libracore AG and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+import frappe
+
+from amf.amf.dashboard_chart_source.stock_balance_by_semester import stock_balance_by_semester as chart
+from amf.amf.doctype.stock_balance_semester_snapshot import stock_balance_semester_snapshot as snapshot
+
+
+class TestStockBalanceSemesterSnapshot(unittest.TestCase):
+	def test_chart_replays_only_entries_after_the_last_stored_semester(self):
+		stored = {
+			date(2025, 6, 30): frappe._dict(balance_qty=10, balance_value=100),
+			date(2025, 12, 31): frappe._dict(balance_qty=12, balance_value=130),
+		}
+		entries = [
+			frappe._dict(
+				item_code="ITEM-A",
+				warehouse="Main Stock - AMF21",
+				posting_date="2026-03-01",
+				actual_qty=-2,
+				qty_after_transaction=0,
+				stock_value_difference=-20,
+				voucher_type="Delivery Note",
+			),
+			frappe._dict(
+				item_code="ITEM-B",
+				warehouse="Main Stock - AMF21",
+				posting_date="2026-04-01",
+				actual_qty=0,
+				qty_after_transaction=9,
+				stock_value_difference=15,
+				voucher_type="Stock Reconciliation",
+			),
+		]
+		base_balances = {
+			("ITEM-A", "Main Stock - AMF21"): {"qty": 7.0, "value": 70.0},
+			("ITEM-B", "Main Stock - AMF21"): {"qty": 5.0, "value": 60.0},
+		}
+
+		with patch.object(chart, "get_semester_snapshots", return_value=stored), patch.object(
+			chart, "get_snapshot_balances", return_value=base_balances
+		) as snapshot_balances, patch.object(
+			chart, "get_stock_ledger_entries", return_value=entries
+		) as ledger_entries, patch.object(chart, "save_semester_snapshot") as save_snapshot, patch.object(
+			chart, "today", return_value="2026-10-18"
+		):
+			rows = chart.get_stock_balance_by_semester({
+				"company": "Advanced Microfluidics SA",
+				"from_date": "2025-01-01",
+				"to_date": "2026-10-18",
+			})
+
+		snapshot_balances.assert_called_once_with("Advanced Microfluidics SA", None, date(2025, 12, 31))
+		self.assertEqual(ledger_entries.call_args.kwargs["after_date"], date(2025, 12, 31))
+		self.assertEqual(
+			[(row["label"], row["balance_qty"], row["balance_value"]) for row in rows],
+			[
+				(rows[0]["label"], 10.0, 100.0),
+				(rows[1]["label"], 12.0, 130.0),
+				(rows[2]["label"], 14.0, 125.0),
+				(rows[3]["label"], 14.0, 125.0),
+			],
+		)
+		save_snapshot.assert_called_once()
+		self.assertEqual(save_snapshot.call_args.args[2], date(2026, 6, 30))
+
+	def test_open_semester_entries_do_not_touch_snapshots(self):
+		entry = frappe._dict(company="Advanced Microfluidics SA", posting_date="2026-10-18")
+
+		with patch.object(snapshot, "today", return_value="2026-10-18"), patch.object(
+			snapshot.frappe.db, "exists"
+		) as exists, patch.object(snapshot.frappe.db, "sql") as sql:
+			snapshot.invalidate_stock_balance_snapshots(entry)
+
+		exists.assert_not_called()
+		sql.assert_not_called()
+
+	def test_back_dated_entry_drops_later_snapshots(self):
+		entry = frappe._dict(company="Advanced Microfluidics SA", posting_date="2026-05-02")
+
+		with patch.object(snapshot, "today", return_value="2026-10-18"), patch.object(
+			snapshot.frappe.db, "exists", return_value=True
+		), patch.object(snapshot.frappe.db, "sql") as sql:
+			snapshot.invalidate_stock_balance_snapshots(entry)
+
+		self.assertEqual(sql.call_args.args[1], ("Advanced Microfluidics SA", date(2026, 5, 2)))
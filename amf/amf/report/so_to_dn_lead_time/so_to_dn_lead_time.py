@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
-import json
 from collections import defaultdict, OrderedDict
 from datetime import datetime, date
 import frappe
 
+from amf.amf.utils.sales_order_submit_time import (
+    SUBMITTED_AT_FIELD,
+    get_submit_timestamps_from_versions,
+    has_submitted_at_field,
+)
+
 def execute(filters=None):
     filters = filters or {}
     from_date, to_date = _get_date_range(filters)
@@ -20,8 +25,8 @@ def execute(filters=None):
 
     so_names = [x["name"] for x in sales_orders]
 
-    # 2) Map: Sales Order -> real submit timestamp (from tabVersion docstatus transition)
-    so_submit_ts_map = _get_submit_timestamps(so_names)
+    # 2) Map: Sales Order -> real submit timestamp (stored on submit / backfilled from tabVersion)
+    so_submit_ts_map = _get_submit_timestamps(sales_orders)
 
     # 3) Per-SO Delivery Note aggregates (first/last DN creation, DN count)
     dn_agg = _get_dn_aggregates(so_names)
@@ -143,6 +148,10 @@ def _get_sales_orders(from_date, to_date, company, customer):
         conditions.append("so.customer = %s")
         params.append(customer)
 
+    submitted_at_column = (
+        ", so.{0} AS submitted_at".format(SUBMITTED_AT_FIELD)
+        if has_submitted_at_field() else ""
+    )
     sql = f"""
         SELECT
             so.name,
@@ -150,57 +159,34 @@ def _get_sales_orders(from_date, to_date, company, customer):
             so.customer,
             so.transaction_date,
             so.creation
+            {submitted_at_column}
         FROM `tabSales Order` so
         WHERE {" AND ".join(conditions)}
     """
     return frappe.db.sql(sql, params, as_dict=True)
 
 
-def _get_submit_timestamps(so_names):
+def _get_submit_timestamps(sales_orders):
     """
-    Find the exact submit timestamp per SO by parsing Version rows
-    where docstatus transitioned to 1.
-    Version.data JSON in v12 contains a "changed" array like:
-      [["docstatus", 0, 1], ["status", "Draft", "To Deliver"] ...]
-    Returns: dict {so_name: datetime_of_submit}
+    Return {so_name: datetime_of_submit} from the Sales Order submitted_at
+    field. Before the field is installed, parse the Version log instead.
     """
-    if not so_names:
+    if not sales_orders:
         return {}
 
+    if has_submitted_at_field():
+        return {
+            so["name"]: _as_datetime(so.get("submitted_at"))
+            for so in sales_orders
+            if so.get("submitted_at")
+        }
+
     # break into chunks for large IN clauses
     chunk_size = 500
+    so_names = [so["name"] for so in sales_orders]
     out = {}
     for i in range(0, len(so_names), chunk_size):
-        chunk = so_names[i:i+chunk_size]
-        placeholders = ", ".join(["%s"] * len(chunk))
-        version_rows = frappe.db.sql(f"""
-            SELECT docname, creation, data
-            FROM `tabVersion`
-            WHERE ref_doctype = 'Sales Order'
-              AND docname IN ({placeholders})
-            ORDER BY creation ASC
-        """, chunk, as_dict=True)
-
-        for v in version_rows:
-            try:
-                payload = json.loads(v.get("data") or "{}")
-            except Exception:
-                payload = {}
-
-            changed = payload.get("changed") or []
-            # Detect a transition to docstatus=1
-            # changed entries are [fieldname, old_value, new_value]
-            for entry in changed:
-                if isinstance(entry, list) and len(entry) >= 3:
-                    if entry[0] == "docstatus" and str(entry[2]) == "1":
-                        so = v["docname"]
-                        # keep the earliest creation that shows docstatus->1
-                        if so not in out:
-                            out[so] = v["creation"]
-                        break
-
-    # Convert to python datetimes
-    out = {k: _as_datetime(v) for k, v in out.items() if v}
+        out.update(get_submit_timestamps_from_versions(so_names[i:i+chunk_size]))
     return out
 
 
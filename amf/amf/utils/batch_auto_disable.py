@@ -7,9 +7,16 @@ from __future__ import unicode_literals
 import frappe
 from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
 
+from amf.amf.utils.submit_scope import close_submit_scope, get_submit_scope, open_submit_scope
+
 
 AUTO_DISABLED_FIELD = "amf_auto_disabled_no_stock"
 QTY_PRECISION = 6
+BATCH_QUERY_CHUNK_SIZE = 500
+DIRTY_BATCHES_CACHE_KEY = "amf_batch_auto_disable_dirty"
+DIRTY_BATCHES_LOCK_KEY = "amf_batch_auto_disable_lock"
+DIRTY_BATCHES_LOCK_SECONDS = 600
+DIRTY_BATCH_COLLECTION_KEY = "amf_dirty_batch_collection"
 
 
 def sync_batch_auto_disable_custom_fields():
@@ -34,20 +41,98 @@ def sync_batch_auto_disable_custom_fields():
 
 
 def queue_batch_disabled_state_sync(doc, method=None):
-	"""Queue a post-commit sync for the batch touched by a Stock Ledger Entry."""
+	"""
+	Mark the batch touched by a Stock Ledger Entry as dirty.
+
+	While a voucher is being submitted or cancelled the batch is only collected;
+	the voucher's on_submit/on_cancel queues one post-commit job for all of its
+	batches. Outside a voucher the batch is queued right away.
+	"""
 	batch_no = (doc.get("batch_no") or "").strip()
 	if not batch_no:
 		return
 
+	collection = get_submit_scope(DIRTY_BATCH_COLLECTION_KEY, _queue_stale_collection)
+	if collection:
+		collection["batches"].add(batch_no)
+		return
+
+	_enqueue_dirty_batch_sync([batch_no])
+
+
+def begin_dirty_batch_collection(doc, method=None):
+	"""doc_events before_submit/before_cancel: collect dirty batches per voucher."""
+	open_submit_scope(DIRTY_BATCH_COLLECTION_KEY, doc, on_stale=_queue_stale_collection, batches=set())
+
+
+def queue_dirty_batches(doc, method=None):
+	"""doc_events on_submit/on_cancel: queue one job for the collected batches."""
+	collection = close_submit_scope(DIRTY_BATCH_COLLECTION_KEY, doc, _queue_stale_collection)
+	if not collection:
+		return
+
+	batch_nos = collection["batches"]
+	collection["batches"] = set()
+	if batch_nos:
+		_enqueue_dirty_batch_sync(sorted(batch_nos))
+
+
+def _queue_stale_collection(collection):
+	if collection["batches"]:
+		_enqueue_dirty_batch_sync(sorted(collection["batches"]))
+
+
+def _enqueue_dirty_batch_sync(batch_nos):
 	frappe.enqueue(
-		"amf.amf.utils.batch_auto_disable.sync_batch_disabled_state",
+		"amf.amf.utils.batch_auto_disable.sync_dirty_batch_disabled_states",
 		queue="short",
 		timeout=300,
 		enqueue_after_commit=True,
-		batch_no=batch_no,
+		batch_nos=batch_nos,
 	)
 
 
+def sync_dirty_batch_disabled_states(batch_nos):
+	"""
+	Add the batches to the shared dirty set and drain it, unless another job is
+	already draining.
+
+	The dirty set lives in redis, so batches touched by several transactions are
+	synced once by whichever job holds the lock. The holder re-checks the set
+	after releasing the lock, so batches added while it was busy are not lost.
+	"""
+	cache = frappe.cache()
+	batch_nos = [batch_no for batch_no in (batch_nos or []) if batch_no]
+	if batch_nos:
+		cache.sadd(DIRTY_BATCHES_CACHE_KEY, *batch_nos)
+
+	results = {"enabled": [], "disabled": [], "skipped_pending": [], "batch_count": 0}
+	while cache.set(cache.make_key(DIRTY_BATCHES_LOCK_KEY), 1, nx=True, ex=DIRTY_BATCHES_LOCK_SECONDS):
+		try:
+			while True:
+				dirty = [frappe.safe_decode(batch_no) for batch_no in (cache.smembers(DIRTY_BATCHES_CACHE_KEY) or [])]
+				if not dirty:
+					break
+				cache.srem(DIRTY_BATCHES_CACHE_KEY, *dirty)
+				try:
+					batch_results = _sync_batch_disabled_states(batch_nos=dirty)
+					frappe.db.commit()
+				except Exception:
+					frappe.db.rollback()
+					cache.sadd(DIRTY_BATCHES_CACHE_KEY, *dirty)
+					raise
+				for key in ("enabled", "disabled", "skipped_pending"):
+					results[key].extend(batch_results[key])
+				results["batch_count"] += len(dirty)
+		finally:
+			cache.delete_value(DIRTY_BATCHES_LOCK_KEY)
+
+		if not cache.smembers(DIRTY_BATCHES_CACHE_KEY):
+			break
+
+	return results
+
+
 @frappe.whitelist()
 def sync_batch_disabled_state(batch_no):
 	"""
@@ -101,21 +186,107 @@ def sync_all_batch_disabled_states(limit=None):
 	This is intended for the scheduler and for the existing manual button. It keeps
 	user-disabled batches disabled unless they carry the AMF auto-disabled marker.
 	"""
-	limit = int(limit or 0)
+	results = _sync_batch_disabled_states(limit=int(limit or 0))
+	frappe.db.commit()
+	return results
+
+
+def _sync_batch_disabled_states(batch_nos=None, limit=None):
+	"""
+	Apply the auto-disable rules to many batches at once (all batches when
+	`batch_nos` is None).
+
+	Stock and pending-document status come from two grouped queries, and the
+	state changes are written with one UPDATE per target state and chunk.
+	`limit` caps how many batches are disabled, like the former sweep.
+	"""
 	has_marker = _has_auto_disabled_marker()
-	enabled = _enable_auto_disabled_batches_with_stock(has_marker=has_marker)
-	disabled, skipped_pending = _disable_batches_without_stock(
-		has_marker=has_marker,
-		limit=limit,
-	)
+	batches = _get_batch_states(batch_nos, has_marker=has_marker)
+	with_stock = _get_batches_with_positive_stock(batch_nos)
+
+	to_enable = []
+	to_clear_marker = []
+	disable_candidates = []
+	for batch in batches:
+		disabled = bool(batch.disabled)
+		auto_disabled = bool(batch.get("auto_disabled"))
+		if batch.name in with_stock:
+			if disabled and auto_disabled:
+				to_enable.append(batch.name)
+			elif not disabled and auto_disabled:
+				to_clear_marker.append(batch.name)
+		elif not disabled:
+			disable_candidates.append(batch.name)
+
+	if limit:
+		disable_candidates = disable_candidates[:limit]
+	pending_refs = set()
+	if disable_candidates:
+		# The full sweep reads all draft references at once instead of listing
+		# every candidate batch in IN clauses.
+		pending_refs = _get_pending_stock_batch_refs(disable_candidates if batch_nos is not None else None)
+	to_disable = [batch_no for batch_no in disable_candidates if batch_no not in pending_refs]
+
+	_set_batch_states(to_enable, disabled=0, auto_disabled=0, has_marker=has_marker)
+	_set_batch_states(to_disable, disabled=1, auto_disabled=1, has_marker=has_marker)
+	if has_marker:
+		_set_batch_states(to_clear_marker, disabled=None, auto_disabled=0, has_marker=has_marker)
 
 	return {
-		"enabled": enabled,
-		"disabled": disabled,
-		"skipped_pending": skipped_pending,
+		"enabled": to_enable,
+		"disabled": to_disable,
+		"skipped_pending": sorted(set(disable_candidates) & pending_refs),
 	}
 
 
+def _get_batch_states(batch_nos=None, has_marker=None):
+	marker_column = ", IFNULL(`{0}`, 0) AS auto_disabled".format(AUTO_DISABLED_FIELD) if has_marker else ""
+	query = "SELECT name, IFNULL(disabled, 0) AS disabled{0} FROM `tabBatch`".format(marker_column)
+	if batch_nos is None:
+		return frappe.db.sql(query + " ORDER BY name", as_dict=True)
+
+	rows = []
+	for chunk in _chunks(sorted(set(batch_nos)), BATCH_QUERY_CHUNK_SIZE):
+		rows.extend(
+			frappe.db.sql(
+				query + " WHERE name IN ({0}) ORDER BY name".format(", ".join(["%s"] * len(chunk))),
+				tuple(chunk),
+				as_dict=True,
+			)
+		)
+	return rows
+
+
+def _get_batches_with_positive_stock(batch_nos=None):
+	"""Return the batches with positive stock in at least one warehouse."""
+	query = """
+		SELECT DISTINCT batch_no
+		FROM (
+			SELECT batch_no
+			FROM `tabStock Ledger Entry`
+			WHERE IFNULL(batch_no, '') != ''
+			{batch_condition}
+			GROUP BY batch_no, warehouse
+			HAVING ROUND(SUM(actual_qty), {precision}) > 0
+		) stock
+	"""
+	if batch_nos is None:
+		rows = frappe.db.sql(query.format(batch_condition="", precision=QTY_PRECISION))
+		return set(row[0] for row in rows)
+
+	batches = set()
+	for chunk in _chunks(sorted(set(batch_nos)), BATCH_QUERY_CHUNK_SIZE):
+		rows = frappe.db.sql(
+			query.format(
+				batch_condition="AND batch_no IN ({0})".format(", ".join(["%s"] * len(chunk))),
+				precision=QTY_PRECISION,
+			),
+			tuple(chunk),
+		)
+		batches.update(row[0] for row in rows)
+	return batches
+
+
 def _has_auto_disabled_marker():
 	try:
 		return frappe.db.has_column("Batch", AUTO_DISABLED_FIELD)
@@ -143,85 +314,41 @@ def _batch_has_pending_stock_reference(batch_no):
 	return batch_no in _get_pending_stock_batch_refs([batch_no])
 
 
-def _enable_auto_disabled_batches_with_stock(has_marker=None):
+def _set_batch_state(batch_no, disabled, auto_disabled, has_marker=None):
+	values = {"disabled": int(disabled)}
 	if has_marker is None:
 		has_marker = _has_auto_disabled_marker()
-	if not has_marker:
-		return []
-
-	batches = frappe.db.sql(
-		"""
-		SELECT DISTINCT b.name
-		FROM `tabBatch` b
-		INNER JOIN (
-			SELECT batch_no
-			FROM `tabStock Ledger Entry`
-			WHERE IFNULL(batch_no, '') != ''
-			GROUP BY batch_no, warehouse
-			HAVING ROUND(SUM(actual_qty), {precision}) > 0
-		) stock ON stock.batch_no = b.name
-		WHERE IFNULL(b.disabled, 0) = 1
-		  AND IFNULL(b.`{marker}`, 0) = 1
-		""".format(precision=QTY_PRECISION, marker=AUTO_DISABLED_FIELD),
-		as_dict=True,
-	)
-
-	enabled = []
-	for row in batches:
-		_set_batch_state(row.name, disabled=0, auto_disabled=0, has_marker=has_marker)
-		enabled.append(row.name)
+	if has_marker:
+		values[AUTO_DISABLED_FIELD] = int(auto_disabled)
 
-	return enabled
+	frappe.db.set_value("Batch", batch_no, values, update_modified=False)
 
 
-def _disable_batches_without_stock(has_marker=None, limit=None):
+def _set_batch_states(batch_nos, disabled, auto_disabled, has_marker=None):
+	"""Bulk variant of _set_batch_state; `disabled=None` leaves the flag as is."""
+	if not batch_nos:
+		return
 	if has_marker is None:
 		has_marker = _has_auto_disabled_marker()
 
-	limit_clause = ""
-	if limit:
-		limit_clause = " LIMIT {0}".format(int(limit))
-
-	candidates = frappe.db.sql(
-		"""
-		SELECT b.name
-		FROM `tabBatch` b
-		LEFT JOIN (
-			SELECT batch_no
-			FROM `tabStock Ledger Entry`
-			WHERE IFNULL(batch_no, '') != ''
-			GROUP BY batch_no, warehouse
-			HAVING ROUND(SUM(actual_qty), {precision}) > 0
-		) stock ON stock.batch_no = b.name
-		WHERE IFNULL(b.disabled, 0) = 0
-		  AND stock.batch_no IS NULL
-		GROUP BY b.name
-		{limit_clause}
-		""".format(precision=QTY_PRECISION, limit_clause=limit_clause),
-		as_dict=True,
-	)
-	batch_nos = [row.name for row in candidates]
-	pending_refs = _get_pending_stock_batch_refs(batch_nos)
-
-	disabled = []
-	for batch_no in batch_nos:
-		if batch_no in pending_refs:
-			continue
-
-		_set_batch_state(batch_no, disabled=1, auto_disabled=1, has_marker=has_marker)
-		disabled.append(batch_no)
-
-	return disabled, sorted(pending_refs)
-
-
-def _set_batch_state(batch_no, disabled, auto_disabled, has_marker=None):
-	values = {"disabled": int(disabled)}
-	if has_marker is None:
-		has_marker = _has_auto_disabled_marker()
+	assignments = []
+	values = []
+	if disabled is not None:
+		assignments.append("`disabled` = %s")
+		values.append(int(disabled))
 	if has_marker:
-		values[AUTO_DISABLED_FIELD] = int(auto_disabled)
+		assignments.append("`{0}` = %s".format(AUTO_DISABLED_FIELD))
+		values.append(int(auto_disabled))
+	if not assignments:
+		return
 
-	frappe.db.set_value("Batch", batch_no, values, update_modified=False)
+	for chunk in _chunks(list(batch_nos), BATCH_QUERY_CHUNK_SIZE):
+		frappe.db.sql(
+			"UPDATE `tabBatch` SET {0} WHERE name IN ({1})".format(
+				", ".join(assignments), ", ".join(["%s"] * len(chunk))
+			),
+			tuple(values + list(chunk)),
+		)
 
 
 def _set_batch_auto_marker(batch_no, auto_disabled):
@@ -237,13 +364,22 @@ def _set_batch_auto_marker(batch_no, auto_disabled):
 
 
 def _get_pending_stock_batch_refs(batch_nos):
-	batch_nos = sorted(set([batch_no for batch_no in (batch_nos or []) if batch_no]))
-	if not batch_nos:
-		return set()
+	"""
+	Return the batches referenced by draft stock documents.
+
+	`batch_nos=None` reads the references of all drafts in one query (used by the
+	full sweep); otherwise only the given batches are looked up, in chunks.
+	"""
+	if batch_nos is None:
+		chunks = [None]
+	else:
+		batch_nos = sorted(set([batch_no for batch_no in batch_nos if batch_no]))
+		if not batch_nos:
+			return set()
+		chunks = _chunks(batch_nos, BATCH_QUERY_CHUNK_SIZE)
 
 	pending_refs = set()
-	for chunk in _chunks(batch_nos, 500):
-		placeholders = ", ".join(["%s"] * len(chunk))
+	for chunk in chunks:
 		query = """
 			SELECT DISTINCT batch_no
 			FROM (
@@ -252,7 +388,7 @@ def _get_pending_stock_batch_refs(batch_nos):
 				INNER JOIN `tabStock Entry` se ON se.name = sed.parent
 				WHERE se.docstatus = 0
 				  AND IFNULL(sed.batch_no, '') != ''
-				  AND sed.batch_no IN ({placeholders})
+				  {sed_condition}
 
 				UNION
 
@@ -261,7 +397,7 @@ def _get_pending_stock_batch_refs(batch_nos):
 				INNER JOIN `tabPurchase Receipt` pr ON pr.name = pri.parent
 				WHERE pr.docstatus = 0
 				  AND IFNULL(pri.batch_no, '') != ''
-				  AND pri.batch_no IN ({placeholders})
+				  {pri_condition}
 
 				UNION
 
@@ -270,7 +406,7 @@ def _get_pending_stock_batch_refs(batch_nos):
 				INNER JOIN `tabDelivery Note` dn ON dn.name = dni.parent
 				WHERE dn.docstatus = 0
 				  AND IFNULL(dni.batch_no, '') != ''
-				  AND dni.batch_no IN ({placeholders})
+				  {dni_condition}
 
 				UNION
 
@@ -279,7 +415,7 @@ def _get_pending_stock_batch_refs(batch_nos):
 				INNER JOIN `tabStock Reconciliation` sr ON sr.name = sri.parent
 				WHERE sr.docstatus = 0
 				  AND IFNULL(sri.batch_no, '') != ''
-				  AND sri.batch_no IN ({placeholders})
+				  {sri_condition}
 
 				UNION
 
@@ -289,7 +425,7 @@ def _get_pending_stock_batch_refs(batch_nos):
 				WHERE si.docstatus = 0
 				  AND IFNULL(si.update_stock, 0) = 1
 				  AND IFNULL(sii.batch_no, '') != ''
-				  AND sii.batch_no IN ({placeholders})
+				  {sii_condition}
 
 				UNION
 
@@ -299,11 +435,19 @@ def _get_pending_stock_batch_refs(batch_nos):
 				WHERE pi.docstatus = 0
 				  AND IFNULL(pi.update_stock, 0) = 1
 				  AND IFNULL(pii.batch_no, '') != ''
-				  AND pii.batch_no IN ({placeholders})
+				  {pii_condition}
 			) pending
-		""".format(placeholders=placeholders)
-		values = tuple(chunk) * 6
-		rows = frappe.db.sql(query, values, as_dict=True)
+		"""
+		conditions = {}
+		values = ()
+		for alias in ("sed", "pri", "dni", "sri", "sii", "pii"):
+			conditions["{0}_condition".format(alias)] = ""
+			if chunk is not None:
+				conditions["{0}_condition".format(alias)] = "AND {0}.batch_no IN ({1})".format(
+					alias, ", ".join(["%s"] * len(chunk))
+				)
+				values += tuple(chunk)
+		rows = frappe.db.sql(query.format(**conditions), values, as_dict=True)
 		pending_refs.update([row.batch_no for row in rows if row.batch_no])
 
 	return pending_refs
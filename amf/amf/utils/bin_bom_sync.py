@@ -3,7 +3,12 @@ from __future__ import unicode_literals
 import frappe
 from frappe.utils import flt, now
 
+from amf.amf.utils.submit_scope import close_submit_scope, get_submit_scope, open_submit_scope
+
 _BIN_UPDATE_STOCK_PATCHED = False
+COALESCE_BIN_BOM_SYNC = True
+BOM_STOCK_QTY_SYNC_CHUNK_SIZE = 500
+SYNC_SCOPE_KEY = "amf_bom_stock_qty_sync_scope"
 
 
 def install_update_stock_patch():
@@ -35,7 +40,7 @@ def install_update_stock_patch():
         )
 
         try:
-            sync_item_bom_stock_qty(self.item_code, self.warehouse)
+            queue_item_bom_stock_qty_sync(self.item_code, self.warehouse)
         except Exception:
             frappe.log_error(frappe.get_traceback(), "AMF BOM stock_qty sync failed after Bin.update_stock")
 
@@ -54,7 +59,100 @@ def sync_item_bom_stock_qty_on_bin_update(doc, method=None):
     if not doc or getattr(doc, "doctype", None) != "Bin":
         return
 
-    sync_item_bom_stock_qty(doc.item_code, doc.warehouse, actual_qty=doc.actual_qty)
+    queue_item_bom_stock_qty_sync(doc.item_code, doc.warehouse, actual_qty=doc.actual_qty)
+
+
+def queue_item_bom_stock_qty_sync(item_code, warehouse, actual_qty=None):
+    """
+    Sync Item.bom_table.stock_qty for one Bin, deferred while a document is
+    being submitted or cancelled.
+
+    Inside that scope the (item_code, warehouse) pair is only recorded, so a
+    Stock Entry with many rows (and both the update_stock patch and the Bin
+    on_update hook firing) costs one batched UPDATE in its on_submit/on_cancel
+    instead of one or two UPDATEs per row. Outside the scope the pair is
+    synced immediately. Returns True when the pair was deferred.
+    """
+    if not item_code or not warehouse:
+        return False
+
+    scope = get_submit_scope(SYNC_SCOPE_KEY, _flush_stale_scope)
+    if not COALESCE_BIN_BOM_SYNC or not scope:
+        sync_item_bom_stock_qty(item_code, warehouse, actual_qty=actual_qty)
+        return False
+
+    scope["pairs"].add((item_code, warehouse))
+    return True
+
+
+def begin_bom_stock_qty_sync_scope(doc, method=None):
+    """doc_events before_submit/before_cancel: start collecting touched Bins."""
+    if not COALESCE_BIN_BOM_SYNC:
+        return
+
+    open_submit_scope(SYNC_SCOPE_KEY, doc, on_stale=_flush_stale_scope, pairs=set())
+
+
+def flush_bom_stock_qty_sync_scope(doc, method=None):
+    """doc_events on_submit/on_cancel: write all collected Bins at once."""
+    scope = close_submit_scope(SYNC_SCOPE_KEY, doc, _flush_stale_scope)
+    if not scope:
+        return
+
+    pairs = scope["pairs"]
+    scope["pairs"] = set()
+    _sync_pairs(pairs)
+
+
+def _flush_stale_scope(scope):
+    _sync_pairs(scope["pairs"])
+
+
+def _sync_pairs(pairs):
+    try:
+        sync_item_bom_stock_qty_for_pairs(pairs)
+    except Exception:
+        frappe.log_error(frappe.get_traceback(), "AMF BOM stock_qty batched sync failed")
+
+
+def sync_item_bom_stock_qty_for_pairs(pairs):
+    """
+    Refresh Item.bom_table.stock_qty for many (item_code, warehouse) pairs from
+    the current Bin quantities, one UPDATE per chunk of pairs.
+    """
+    pairs = sorted(set((item_code, warehouse) for item_code, warehouse in pairs if item_code and warehouse))
+    if not pairs:
+        return 0
+
+    timestamp = now()
+    user = frappe.session.user if getattr(frappe.session, "user", None) else "Administrator"
+
+    for start in range(0, len(pairs), BOM_STOCK_QTY_SYNC_CHUNK_SIZE):
+        chunk = pairs[start:start + BOM_STOCK_QTY_SYNC_CHUNK_SIZE]
+        pair_conditions = " OR ".join(
+            ["(child.item_code = %s AND IFNULL(child.source_warehouse, '') = %s)"] * len(chunk)
+        )
+        values = [timestamp, user]
+        for item_code, warehouse in chunk:
+            values.extend([item_code, warehouse])
+
+        frappe.db.sql(
+            """
+            UPDATE `tabBOM Item Child` child
+            LEFT JOIN `tabBin` bin
+                ON bin.item_code = child.item_code
+                AND bin.warehouse = child.source_warehouse
+            SET child.stock_qty = IFNULL(bin.actual_qty, 0),
+                child.modified = %s,
+                child.modified_by = %s
+            WHERE child.parenttype = 'Item'
+              AND child.parentfield = 'bom_table'
+              AND ({0})
+            """.format(pair_conditions),
+            tuple(values),
+        )
+
+    return len(pairs)
 
 
 def sync_item_bom_stock_qty(item_code, warehouse, actual_qty=None):
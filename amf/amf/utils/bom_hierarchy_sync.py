@@ -1,6 +1,15 @@
+import json
+
 import frappe
 from frappe import _
-from frappe.utils import cint, flt, now_datetime
+from frappe.utils import add_days, add_to_date, cint, flt, get_datetime, now_datetime
+
+BOM_GRAPH_CHUNK_SIZE = 500
+BOM_SYNC_RUN_DOCTYPE = "BOM Hierarchy Sync Run"
+BOM_SYNC_SHARD_DOCTYPE = "BOM Hierarchy Sync Shard"
+BOM_SYNC_SHARD_SIZE = 200
+BOM_SYNC_SHARD_TIMEOUT = 7200
+BOM_SYNC_RESUME_DAYS = 7
 
 
 @frappe.whitelist()
@@ -99,108 +108,318 @@ def sync_latest_bom_hierarchy_for_all_items(dry_run=0, verbose=0):
 	active submitted BOM.
 
 	Important behavior:
-	1. Items are collected once from the BOM table, so we only consider
-	   manufactured items that currently have a usable BOM.
-	2. If an item's latest BOM was already processed while syncing an earlier root
-	   hierarchy, that item is skipped to avoid redundant work.
-	3. Errors are isolated per root item so one broken hierarchy does not stop the
-	   full batch run.
+	1. The BOM graph (latest BOM per item and its child items) is loaded once with
+	   bulk queries, and one bottom-up order is planned across all roots, so each
+	   BOM is recalculated exactly once per run.
+	2. BOM loops are detected while planning. Every item whose hierarchy contains a
+	   loop is reported as an error and left untouched.
+	3. Errors are isolated per BOM. When a BOM fails, the BOMs above it are skipped
+	   so they never roll up a half-refreshed child cost.
+
+	This runs everything in the current process. The scheduler uses
+	`enqueue_sync_latest_bom_hierarchy_for_all_items`, which splits the same plan
+	into resumable shards.
 	"""
 	dry_run = cint(dry_run)
 	verbose = cint(verbose)
 
 	root_items = _get_all_sync_candidate_items(verbose=verbose)
-	processed_boms = set()
-	results = {
+	graph = _build_bom_graph(verbose=verbose)
+	plan = _plan_bom_order(graph, root_items)
+	results = _get_planning_results(graph, plan, root_items)
+	results["dry_run"] = bool(dry_run)
+	results["total_candidates"] = len(root_items)
+
+	_trace(
+		verbose,
+		(
+			"Starting full-item BOM hierarchy sync for {0} candidate item(s) "
+			"(dry_run={1}). {2} BOM(s) planned, {3} item(s) blocked by BOM loops."
+		).format(
+			len(root_items),
+			dry_run,
+			len(plan["boms_bottom_up"]),
+			len(plan["blocked_items"]),
+		),
+	)
+
+	_sync_planned_boms(
+		plan["boms_bottom_up"],
+		graph,
+		set(root_items),
+		results,
+		dry_run=bool(dry_run),
+		verbose=verbose,
+	)
+	results.pop("failed_boms", None)
+
+	_trace(
+		verbose,
+		(
+			"Full-item BOM hierarchy sync finished. processed_roots={0}, "
+			"skipped_roots={1}, errors={2}, bom_count={3}."
+		).format(
+			len(results["processed_roots"]),
+			len(results["skipped_roots"]),
+			len(results["errors"]),
+			results["bom_count"],
+		),
+	)
+
+	return results
+
+
+@frappe.whitelist()
+def enqueue_sync_latest_bom_hierarchy_for_all_items(dry_run=0, verbose=0, resume=1):
+	"""
+	Queue the all-items BOM hierarchy synchronization on the long workers.
+
+	The planned BOM order is split into shards made of whole connected components
+	of the BOM graph, so shards never share a BOM and can run in parallel. Every
+	shard is its own long-queue job and checkpoints each BOM it finishes on its
+	row of a `BOM Hierarchy Sync Run` document, which also aggregates the results
+	of all shards.
+
+	With `resume=1` (default) the latest unfinished run of the last
+	BOM_SYNC_RESUME_DAYS days is picked up again: only shards that are not
+	completed and no longer active are re-queued, and they skip the BOMs they
+	already checkpointed.
+	"""
+	dry_run = cint(dry_run)
+	verbose = cint(verbose)
+
+	run_name = _get_resumable_sync_run(dry_run) if cint(resume) else None
+	resumed = bool(run_name)
+	if not run_name:
+		run_name = _create_sync_run(dry_run, verbose=verbose)
+
+	job_ids = _enqueue_pending_sync_shards(run_name, verbose=verbose)
+	if not job_ids:
+		# Nothing left to queue (e.g. an empty plan); make sure the run is closed.
+		_update_sync_run_summary(run_name)
+		frappe.db.commit()
+
+	_trace(
+		verbose,
+		"BOM hierarchy sync run {0} {1}: {2} shard job(s) enqueued.".format(
+			run_name, "resumed" if resumed else "created", len(job_ids)
+		),
+	)
+	return {
+		"status": "queued" if job_ids else frappe.db.get_value(BOM_SYNC_RUN_DOCTYPE, run_name, "status"),
+		"run": run_name,
+		"resumed": resumed,
+		"job_ids": job_ids,
 		"dry_run": bool(dry_run),
-		"total_candidates": len(root_items),
-		"processed_roots": [],
-		"skipped_roots": [],
-		"errors": [],
+		"verbose": bool(verbose),
 	}
 
+
+def run_bom_hierarchy_sync_shard(run_name, shard_name, verbose=0):
+	"""
+	Long-queue job: synchronize the BOMs of one shard of a sync run.
+
+	BOMs already listed in the shard checkpoint are skipped, so a re-queued shard
+	continues where the previous job stopped.
+	"""
+	verbose = cint(verbose)
+	shard = frappe.db.get_value(
+		BOM_SYNC_SHARD_DOCTYPE,
+		shard_name,
+		["status", "boms", "completed_boms", "result"],
+		as_dict=True,
+	)
+	if not shard or shard.status == "Completed":
+		return
+
+	dry_run = bool(cint(frappe.db.get_value(BOM_SYNC_RUN_DOCTYPE, run_name, "dry_run")))
+	boms = json.loads(shard.boms or "[]")
+	completed_boms = json.loads(shard.completed_boms or "[]")
+	results = json.loads(shard.result or "null") or _get_empty_sync_results()
+	_set_sync_shard_values(shard_name, {"status": "Running"})
+	_set_sync_run_running(run_name)
+	frappe.db.commit()
+
+	completed = set(completed_boms)
+	pending_boms = [bom_name for bom_name in boms if bom_name not in completed]
 	_trace(
 		verbose,
-		"Starting full-item BOM hierarchy sync for {0} candidate item(s) (dry_run={1}).".format(
-			len(root_items), dry_run
+		"Shard {0} of run {1}: {2} BOM(s) pending, {3} already checkpointed.".format(
+			shard_name, run_name, len(pending_boms), len(completed)
 		),
 	)
 
-	for index, item_code in enumerate(root_items, start=1):
-		latest_bom = _get_latest_active_submitted_bom(item_code, verbose=False)
-		if not latest_bom:
+	def checkpoint(bom_name):
+		completed_boms.append(bom_name)
+		if not dry_run:
+			_set_sync_shard_values(
+				shard_name,
+				{
+					"completed_boms": json.dumps(completed_boms),
+					"completed_bom_count": len(completed_boms),
+					"result": json.dumps(results),
+				},
+			)
+
+	try:
+		graph = _build_bom_graph(verbose=verbose)
+		_sync_planned_boms(
+			pending_boms,
+			graph,
+			set(_get_all_sync_candidate_items(verbose=verbose)),
+			results,
+			dry_run=dry_run,
+			verbose=verbose,
+			checkpoint=checkpoint,
+		)
+	except Exception:
+		frappe.db.rollback()
+		frappe.log_error(
+			frappe.get_traceback(),
+			"BOM Hierarchy Sync Shard Error for {0}".format(shard_name),
+		)
+		_set_sync_shard_values(shard_name, {"status": "Failed"})
+		_update_sync_run_summary(run_name)
+		frappe.db.commit()
+		raise
+
+	_set_sync_shard_values(
+		shard_name,
+		{
+			"status": "Completed",
+			"completed_boms": json.dumps(completed_boms),
+			"completed_bom_count": len(completed_boms),
+			"result": json.dumps(results),
+		},
+	)
+	_update_sync_run_summary(run_name)
+	frappe.db.commit()
+
+
+def _get_empty_sync_results():
+	return {
+		"processed_roots": [],
+		"skipped_roots": [],
+		"errors": [],
+		"bom_count": 0,
+		"default_update_count": 0,
+		"failed_boms": [],
+	}
+
+
+def _get_planning_results(graph, plan, root_items):
+	"""Report roots without a BOM and roots blocked by BOM loops before syncing."""
+	results = _get_empty_sync_results()
+	for item_code in root_items:
+		if not graph["item_to_bom"].get(item_code):
 			results["skipped_roots"].append(
 				{
 					"item_code": item_code,
 					"reason": "no_active_submitted_bom",
 				}
 			)
-			_trace(
-				verbose,
-				"[{0}/{1}] Skipping item {2}: no active submitted BOM.".format(
-					index, len(root_items), item_code
-				),
+		elif item_code in plan["blocked_items"]:
+			results["errors"].append(
+				{
+					"item_code": item_code,
+					"latest_bom": graph["item_to_bom"][item_code],
+					"error": _("BOM recursion detected while processing item {0}").format(item_code),
+				}
 			)
-			continue
+	return results
+
 
-		if latest_bom in processed_boms:
+def _sync_planned_boms(boms_bottom_up, graph, root_item_set, results, dry_run=False, verbose=False, checkpoint=None):
+	"""
+	Align and recalculate planned BOMs in order, committing after each BOM.
+
+	`results` is updated in place. BOMs whose child BOM failed (now or in an
+	earlier job, see `results["failed_boms"]`) are skipped. `checkpoint(bom_name)`
+	is called before each commit so progress is stored in the same transaction
+	as the BOM itself.
+	"""
+	failed_boms = set(results.setdefault("failed_boms", []))
+
+	def mark_failed(bom_name):
+		failed_boms.add(bom_name)
+		results["failed_boms"].append(bom_name)
+
+	for index, bom_name in enumerate(boms_bottom_up, start=1):
+		item_code = graph["bom_to_item"].get(bom_name)
+		if not item_code:
+			# The BOM was deactivated or superseded after the run was planned.
 			results["skipped_roots"].append(
 				{
-					"item_code": item_code,
-					"reason": "already_processed_in_previous_hierarchy",
-					"latest_bom": latest_bom,
+					"item_code": None,
+					"reason": "bom_no_longer_latest",
+					"latest_bom": bom_name,
 				}
 			)
+			if checkpoint:
+				checkpoint(bom_name)
+			if not dry_run:
+				frappe.db.commit()
+			continue
+
+		failed_child = next(
+			(
+				graph["item_to_bom"][child]
+				for child in graph["children"].get(bom_name, [])
+				if graph["item_to_bom"].get(child) in failed_boms
+			),
+			None,
+		)
+		if failed_child:
+			mark_failed(bom_name)
+			if item_code in root_item_set:
+				results["skipped_roots"].append(
+					{
+						"item_code": item_code,
+						"reason": "child_bom_failed",
+						"latest_bom": bom_name,
+						"failed_child_bom": failed_child,
+					}
+				)
 			_trace(
 				verbose,
-				"[{0}/{1}] Skipping item {2}: latest BOM {3} was already processed in a previous hierarchy.".format(
-					index, len(root_items), item_code, latest_bom
+				"[{0}/{1}] Skipping BOM {2}: child BOM {3} failed.".format(
+					index, len(boms_bottom_up), bom_name, failed_child
 				),
 			)
+			if checkpoint:
+				checkpoint(bom_name)
+			if not dry_run:
+				frappe.db.commit()
 			continue
 
 		_trace(
 			verbose,
-			"[{0}/{1}] Processing root item {2} with latest BOM {3}.".format(
-				index, len(root_items), item_code, latest_bom
+			"[{0}/{1}] Processing item {2} with latest BOM {3}.".format(
+				index, len(boms_bottom_up), item_code, bom_name
 			),
 		)
 
 		try:
-			root_result = sync_latest_bom_hierarchy(
-				root_item_code=item_code,
+			default_update = _align_default_bom(
+				item_code,
+				bom_name,
 				dry_run=dry_run,
 				verbose=verbose,
 			)
-			results["processed_roots"].append(
-				{
-					"item_code": item_code,
-					"root_bom": root_result.get("root_bom"),
-					"bom_count": len(root_result.get("bom_updates", [])),
-					"default_update_count": len(root_result.get("default_updates", [])),
-				}
-			)
-			processed_boms.update(
-				update.get("bom")
-				for update in root_result.get("bom_updates", [])
-				if update.get("bom")
-			)
-			_trace(
-				verbose,
-				"[{0}/{1}] Root item {2} completed. Hierarchy BOM count={3}.".format(
-					index,
-					len(root_items),
-					item_code,
-					len(root_result.get("bom_updates", [])),
-				),
+			bom_update = _sync_bom_to_latest_children(
+				bom_name,
+				graph["item_to_bom"],
+				dry_run=dry_run,
+				verbose=verbose,
 			)
 		except Exception as exc:
 			frappe.db.rollback()
+			mark_failed(bom_name)
 			error_message = str(exc)
 			results["errors"].append(
 				{
 					"item_code": item_code,
-					"latest_bom": latest_bom,
+					"latest_bom": bom_name,
 					"error": error_message,
 				}
 			)
@@ -210,72 +429,241 @@ def sync_latest_bom_hierarchy_for_all_items(dry_run=0, verbose=0):
 			)
 			_trace(
 				verbose,
-				"[{0}/{1}] ERROR while processing root item {2}: {3}".format(
-					index, len(root_items), item_code, error_message
+				"[{0}/{1}] ERROR while processing BOM {2} of item {3}: {4}".format(
+					index, len(boms_bottom_up), bom_name, item_code, error_message
 				),
 			)
+			if checkpoint:
+				checkpoint(bom_name)
+			if not dry_run:
+				frappe.db.commit()
+			continue
 
-	_trace(
-		verbose,
-		(
-			"Full-item BOM hierarchy sync finished. processed_roots={0}, "
-			"skipped_roots={1}, errors={2}."
-		).format(
-			len(results["processed_roots"]),
-			len(results["skipped_roots"]),
-			len(results["errors"]),
-		),
-	)
+		results["bom_count"] += 1
+		if default_update:
+			results["default_update_count"] += 1
+		if item_code in root_item_set:
+			results["processed_roots"].append(
+				{
+					"item_code": item_code,
+					"root_bom": bom_name,
+					"row_change_count": len(bom_update.get("row_changes", [])),
+					"default_updated": bool(default_update),
+				}
+			)
+		if checkpoint:
+			checkpoint(bom_name)
+		if not dry_run:
+			frappe.db.commit()
 
 	return results
 
 
-@frappe.whitelist()
-def enqueue_sync_latest_bom_hierarchy_for_all_items(dry_run=0, verbose=0):
+def _split_bom_plan_into_shards(graph, boms_bottom_up, shard_size=None):
 	"""
-	Queue the all-items BOM hierarchy synchronization on the long worker.
+	Group planned BOMs by connected component of the BOM graph and pack whole
+	components into shards of about `shard_size` BOMs.
 
-	Use this entry point when the batch is too large for a foreground terminal
-	run or when you want the worker to handle the full pass asynchronously.
+	Two shards never share a BOM or a parent/child link, so they can run in
+	parallel. Each shard keeps the global bottom-up order.
 	"""
-	dry_run = cint(dry_run)
-	verbose = cint(verbose)
+	shard_size = shard_size or BOM_SYNC_SHARD_SIZE
+	planned = set(boms_bottom_up)
+	component_of = {bom_name: bom_name for bom_name in boms_bottom_up}
+
+	def find(bom_name):
+		while component_of[bom_name] != bom_name:
+			component_of[bom_name] = component_of[component_of[bom_name]]
+			bom_name = component_of[bom_name]
+		return bom_name
+
+	for bom_name in boms_bottom_up:
+		for child_item in graph["children"].get(bom_name, []):
+			child_bom = graph["item_to_bom"].get(child_item)
+			if child_bom in planned:
+				component_of[find(child_bom)] = find(bom_name)
+
+	components = {}
+	for bom_name in boms_bottom_up:
+		components.setdefault(find(bom_name), []).append(bom_name)
+
+	shards = []
+	current_shard = []
+	for component in components.values():
+		if current_shard and len(current_shard) + len(component) > shard_size:
+			shards.append(current_shard)
+			current_shard = []
+		current_shard.extend(component)
+	if current_shard:
+		shards.append(current_shard)
+	return shards
+
+
+def _create_sync_run(dry_run, verbose=False):
+	"""Plan a new sharded run and store it with one checkpoint row per shard."""
+	root_items = _get_all_sync_candidate_items(verbose=verbose)
+	graph = _build_bom_graph(verbose=verbose)
+	plan = _plan_bom_order(graph, root_items)
+	shards = _split_bom_plan_into_shards(graph, plan["boms_bottom_up"])
+	planning_results = _get_planning_results(graph, plan, root_items)
+
+	run = frappe.get_doc(
+		{
+			"doctype": BOM_SYNC_RUN_DOCTYPE,
+			"status": "Queued",
+			"dry_run": dry_run,
+			"started_on": now_datetime(),
+			"total_candidates": len(root_items),
+			"planned_bom_count": len(plan["boms_bottom_up"]),
+			"shard_count": len(shards),
+			"planning_result": json.dumps(planning_results),
+			"shards": [
+				{
+					"shard_index": index,
+					"status": "Queued",
+					"bom_count": len(boms),
+					"boms": json.dumps(boms),
+				}
+				for index, boms in enumerate(shards, start=1)
+			],
+		}
+	).insert(ignore_permissions=True)
+	frappe.db.commit()
 
 	_trace(
 		verbose,
-		"Queueing full-item BOM hierarchy sync (dry_run={0}, verbose={1}) on the long worker.".format(
-			dry_run, verbose
+		"Planned BOM hierarchy sync run {0}: {1} BOM(s) in {2} shard(s), {3} item(s) blocked by BOM loops.".format(
+			run.name, len(plan["boms_bottom_up"]), len(shards), len(plan["blocked_items"])
 		),
 	)
-	job = frappe.enqueue(
-		"amf.amf.utils.bom_hierarchy_sync.sync_latest_bom_hierarchy_for_all_items",
-		queue="long",
-		timeout=15000,
-		dry_run=dry_run,
-		verbose=verbose,
+	return run.name
+
+
+def _get_resumable_sync_run(dry_run):
+	runs = frappe.get_all(
+		BOM_SYNC_RUN_DOCTYPE,
+		filters={
+			"status": ["in", ["Queued", "Running", "Failed"]],
+			"dry_run": cint(dry_run),
+			"creation": [">=", add_days(now_datetime(), -BOM_SYNC_RESUME_DAYS)],
+		},
+		fields=["name"],
+		order_by="creation desc",
+		limit_page_length=1,
 	)
+	return runs[0].name if runs else None
 
-	job_id = None
-	if hasattr(job, "id"):
-		job_id = job.id
-	elif hasattr(job, "name"):
-		job_id = job.name
 
-	_trace(
-		verbose,
-		"Full-item BOM hierarchy sync enqueued successfully. job_id={0}".format(
-			job_id or "unknown"
-		),
+def _enqueue_pending_sync_shards(run_name, verbose=False):
+	"""
+	Queue every shard that is neither completed nor still active.
+
+	A queued or running shard counts as active until it has not been touched for
+	BOM_SYNC_SHARD_TIMEOUT seconds; after that its worker is assumed dead.
+	"""
+	stale_before = add_to_date(now_datetime(), seconds=-BOM_SYNC_SHARD_TIMEOUT)
+	shards = frappe.get_all(
+		BOM_SYNC_SHARD_DOCTYPE,
+		filters={"parent": run_name, "parenttype": BOM_SYNC_RUN_DOCTYPE},
+		fields=["name", "status", "job_id", "modified"],
+		order_by="idx asc",
 	)
-	return {
-		"status": "queued",
-		"job_id": job_id,
-		"dry_run": bool(dry_run),
-		"verbose": bool(verbose),
+	job_ids = []
+	for shard in shards:
+		if shard.status == "Completed":
+			continue
+		is_active = shard.status == "Running" or (shard.status == "Queued" and shard.job_id)
+		if is_active and get_datetime(shard.modified) > stale_before:
+			continue
+
+		job = frappe.enqueue(
+			"amf.amf.utils.bom_hierarchy_sync.run_bom_hierarchy_sync_shard",
+			queue="long",
+			timeout=BOM_SYNC_SHARD_TIMEOUT,
+			run_name=run_name,
+			shard_name=shard.name,
+			verbose=verbose,
+		)
+		job_id = getattr(job, "id", None) or getattr(job, "name", None) or ""
+		_set_sync_shard_values(shard.name, {"status": "Queued", "job_id": job_id})
+		job_ids.append(job_id)
+
+	if job_ids:
+		frappe.db.set_value(BOM_SYNC_RUN_DOCTYPE, run_name, "status", "Queued")
+	frappe.db.commit()
+	return job_ids
+
+
+def _set_sync_shard_values(shard_name, values):
+	frappe.db.set_value(BOM_SYNC_SHARD_DOCTYPE, shard_name, values)
+
+
+def _set_sync_run_running(run_name):
+	frappe.db.sql(
+		"""
+		UPDATE `tabBOM Hierarchy Sync Run`
+		SET `status` = 'Running', `modified` = %s
+		WHERE `name` = %s
+			AND `status` = 'Queued'
+		""",
+		(now_datetime(), run_name),
+	)
+
+
+def _update_sync_run_summary(run_name):
+	"""
+	Aggregate planning and shard results into the run document.
+
+	The run row is locked first so two shards finishing together cannot both
+	compute the final status from a stale view.
+	"""
+	frappe.db.sql(
+		"SELECT `name` FROM `tabBOM Hierarchy Sync Run` WHERE `name` = %s FOR UPDATE",
+		(run_name,),
+	)
+	summary = json.loads(
+		frappe.db.get_value(BOM_SYNC_RUN_DOCTYPE, run_name, "planning_result") or "null"
+	) or _get_empty_sync_results()
+	shards = frappe.get_all(
+		BOM_SYNC_SHARD_DOCTYPE,
+		filters={"parent": run_name, "parenttype": BOM_SYNC_RUN_DOCTYPE},
+		fields=["status", "result"],
+	)
+	for shard in shards:
+		shard_results = json.loads(shard.result or "null") or {}
+		for key in ("processed_roots", "skipped_roots", "errors"):
+			summary[key].extend(shard_results.get(key, []))
+		for key in ("bom_count", "default_update_count"):
+			summary[key] += cint(shard_results.get(key))
+
+	statuses = [shard.status for shard in shards]
+	completed_shards = statuses.count("Completed")
+	if completed_shards == len(statuses):
+		status = "Completed with Errors" if summary["errors"] else "Completed"
+	elif any(status in ("Queued", "Running") for status in statuses):
+		status = "Running"
+	else:
+		status = "Failed"
+
+	values = {
+		"status": status,
+		"completed_shards": completed_shards,
+		"bom_count": summary["bom_count"],
+		"default_update_count": summary["default_update_count"],
+		"processed_root_count": len(summary["processed_roots"]),
+		"skipped_root_count": len(summary["skipped_roots"]),
+		"error_count": len(summary["errors"]),
+		"processed_roots": json.dumps(summary["processed_roots"], indent=1),
+		"skipped_roots": json.dumps(summary["skipped_roots"], indent=1),
+		"errors": json.dumps(summary["errors"], indent=1),
 	}
+	if status != "Running":
+		values["finished_on"] = now_datetime()
+	frappe.db.set_value(BOM_SYNC_RUN_DOCTYPE, run_name, values)
+	return values
 
 
-def _collect_latest_bom_hierarchy(root_item_code, verbose=False):
+def _collect_latest_bom_hierarchy(root_item_code, verbose=False, graph=None):
 	"""
 	Discover the BOM tree from the root item down to the deepest manufactured
 	children.
@@ -283,71 +671,33 @@ def _collect_latest_bom_hierarchy(root_item_code, verbose=False):
 	The output is intentionally prepared in bottom-up order, because parent BOMs
 	must only be recalculated after their child BOM costs are already refreshed.
 	"""
-	item_to_bom = {}
-	boms_bottom_up = []
-	visiting = set()
+	if graph is None:
+		graph = _build_bom_graph(verbose=verbose)
 
-	def visit_item(item_code):
-		_trace(verbose, "Inspecting item {0} for its latest active submitted BOM.".format(item_code))
-		latest_bom = _get_latest_active_submitted_bom(item_code, verbose=verbose)
-		if not latest_bom:
-			_trace(
-				verbose,
-				"Item {0} has no active submitted BOM. It will be treated as a purchased/raw-material line.".format(
-					item_code
-				),
-			)
-			return None
+	plan = _plan_bom_order(graph, [root_item_code])
+	if root_item_code in plan["blocked_items"]:
+		frappe.throw(_("BOM recursion detected while processing item {0}").format(root_item_code))
 
-		existing_bom = item_to_bom.get(item_code)
-		if existing_bom:
-			_trace(
-				verbose,
-				"Item {0} was already visited earlier. Reusing discovered BOM {1}.".format(
-					item_code, existing_bom
-				),
-			)
-			return existing_bom
-
-		if item_code in visiting:
-			frappe.throw(_("BOM recursion detected while processing item {0}").format(item_code))
-
-		# Mark the item as "currently being traversed" so recursive BOM loops can be
-		# detected immediately instead of silently corrupting the hierarchy walk.
-		visiting.add(item_code)
-		item_to_bom[item_code] = latest_bom
+	root_bom = graph["item_to_bom"].get(root_item_code)
+	if not root_bom:
 		_trace(
 			verbose,
-			"Item {0} will use BOM {1} as the latest BOM in the hierarchy.".format(
-				item_code, latest_bom
-			),
+			"Item {0} has no active submitted BOM.".format(root_item_code),
 		)
 
-		bom_doc = frappe.get_doc("BOM", latest_bom)
-		for row in bom_doc.items:
-			if row.item_code and row.item_code != bom_doc.item:
-				_trace(
-					verbose,
-					"Following BOM {0} row {1}: item_code={2}, current bom_no={3}".format(
-						latest_bom,
-						row.idx,
-						row.item_code,
-						row.bom_no or "",
-					),
-				)
-				visit_item(row.item_code)
-
-		visiting.remove(item_code)
-		boms_bottom_up.append(latest_bom)
+	boms_bottom_up = plan["boms_bottom_up"]
+	item_to_bom = {graph["bom_to_item"][bom_name]: bom_name for bom_name in boms_bottom_up}
+	for position, bom_name in enumerate(boms_bottom_up, start=1):
 		_trace(
 			verbose,
-			"BOM {0} added to bottom-up processing list position {1}.".format(
-				latest_bom, len(boms_bottom_up)
+			"BOM {0} of item {1} added to bottom-up processing list position {2}. Child items: {3}".format(
+				bom_name,
+				graph["bom_to_item"][bom_name],
+				position,
+				graph["children"].get(bom_name, []),
 			),
 		)
-		return latest_bom
 
-	root_bom = visit_item(root_item_code)
 	return {
 		"root_bom": root_bom,
 		"item_to_bom": item_to_bom,
@@ -355,6 +705,121 @@ def _collect_latest_bom_hierarchy(root_item_code, verbose=False):
 	}
 
 
+def _build_bom_graph(verbose=False):
+	"""
+	Load the whole BOM graph with bulk queries instead of walking documents.
+
+	Returns:
+	- item_to_bom: most recently created active submitted BOM per item. We follow
+	  the latest BOM version at every hierarchy level, not whatever BOM is
+	  currently marked as default.
+	- bom_to_item: reverse lookup of item_to_bom
+	- children: for each latest BOM, the child items (in row order) that have a
+	  latest BOM themselves; purchased/raw lines and self references are left out
+	"""
+	bom_rows = frappe.db.sql(
+		"""
+		SELECT name, item
+		FROM `tabBOM`
+		WHERE is_active = 1
+			AND docstatus = 1
+		ORDER BY item, creation DESC, name DESC
+		""",
+		as_dict=True,
+	)
+	item_to_bom = {}
+	for row in bom_rows:
+		if row.item and row.item not in item_to_bom:
+			item_to_bom[row.item] = row.name
+	bom_to_item = {bom_name: item_code for item_code, bom_name in item_to_bom.items()}
+
+	children = {}
+	bom_names = list(bom_to_item.keys())
+	for start in range(0, len(bom_names), BOM_GRAPH_CHUNK_SIZE):
+		rows = frappe.db.sql(
+			"""
+			SELECT parent, item_code
+			FROM `tabBOM Item`
+			WHERE parenttype = 'BOM'
+				AND parent IN %(boms)s
+			ORDER BY parent, idx
+			""",
+			{"boms": bom_names[start:start + BOM_GRAPH_CHUNK_SIZE]},
+			as_dict=True,
+		)
+		for row in rows:
+			if (
+				row.item_code
+				and row.item_code != bom_to_item[row.parent]
+				and row.item_code in item_to_bom
+			):
+				child_items = children.setdefault(row.parent, [])
+				if row.item_code not in child_items:
+					child_items.append(row.item_code)
+
+	_trace(
+		verbose,
+		"Loaded BOM graph: {0} item(s) with a latest BOM, {1} parent-child link(s).".format(
+			len(item_to_bom), sum(len(child_items) for child_items in children.values())
+		),
+	)
+	return {
+		"item_to_bom": item_to_bom,
+		"bom_to_item": bom_to_item,
+		"children": children,
+	}
+
+
+def _plan_bom_order(graph, root_items):
+	"""
+	Return one bottom-up (topological) BOM order covering every root.
+
+	Each BOM appears once, after all of its child BOMs. Items that sit on a BOM
+	loop, or whose hierarchy reaches one, are returned in `blocked_items` and
+	their BOMs are left out of the order.
+	"""
+	item_to_bom = graph["item_to_bom"]
+	children = graph["children"]
+	state = {}
+	boms_bottom_up = []
+	blocked_items = set()
+
+	def visit_item(item_code):
+		bom_name = item_to_bom.get(item_code)
+		if not bom_name:
+			return True
+
+		status = state.get(item_code)
+		if status == "done":
+			return True
+		if status:
+			# "visiting" means we just closed a loop; "blocked" means this item
+			# already reaches one. Either way the parent cannot be processed.
+			return False
+
+		state[item_code] = "visiting"
+		is_clean = True
+		for child_item in children.get(bom_name, []):
+			if not visit_item(child_item):
+				is_clean = False
+
+		if is_clean:
+			state[item_code] = "done"
+			boms_bottom_up.append(bom_name)
+		else:
+			state[item_code] = "blocked"
+			blocked_items.add(item_code)
+		return is_clean
+
+	for item_code in root_items:
+		visit_item(item_code)
+
+	return {
+		"boms_bottom_up": boms_bottom_up,
+		"blocked_items": blocked_items,
+	}
+
+
 def _get_all_sync_candidate_items(verbose=False):
 	"""
 	Return every enabled item that currently has an active submitted BOM.
@@ -384,40 +849,6 @@ def _get_all_sync_candidate_items(verbose=False):
 	return items
 
 
-def _get_latest_active_submitted_bom(item_code, verbose=False):
-	"""
-	Return the most recently created active submitted BOM for one item.
-
-	We use creation order here because the pilot requirement is to follow the
-	latest BOM version at every hierarchy level, not simply whatever BOM is
-	currently marked as default.
-	"""
-	boms = frappe.get_all(
-		"BOM",
-		filters={"item": item_code, "is_active": 1, "docstatus": 1},
-		fields=["name", "creation", "modified", "is_default", "total_cost"],
-		order_by="creation desc, name desc",
-		limit_page_length=1,
-	)
-	if not boms:
-		_trace(verbose, "No candidate BOM found for item {0}.".format(item_code))
-		return None
-
-	latest_bom = boms[0]
-	_trace(
-		verbose,
-		"Latest BOM for item {0} is {1} (created {2}, modified {3}, is_default={4}, total_cost={5}).".format(
-			item_code,
-			latest_bom.name,
-			latest_bom.creation,
-			latest_bom.modified,
-			latest_bom.is_default,
-			flt(latest_bom.total_cost),
-		),
-	)
-	return latest_bom.name
-
-
 def _align_default_bom(item_code, latest_bom, dry_run=False, verbose=False):
 	"""
 	Make sure the Item master and BOM flags point to the latest BOM selected for
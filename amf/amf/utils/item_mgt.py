@@ -4,6 +4,7 @@ from amf.amf.utils.stock_entry import (
     _set_batch_disabled_state,
     update_log_entry,
 )
+from amf.amf.utils.log_buffer import log_buffer
 
 import frappe
 from frappe.utils import cint, cstr, flt, now_datetime, nowdate, nowtime
@@ -14,6 +15,7 @@ DEFAULT_BATCH_VALUATION_RATE = 20.0
 DEFAULT_BATCH_VALUATION_CODE_LENGTH = 6
 DEFAULT_RECONCILIATION_ROWS = 100
 VALUATION_RATE_TOLERANCE = 0.000001
+VALUATION_RATE_UPDATE_CHUNK_SIZE = 500
 DEFAULT_SCRAP_DEVALUATION_STOCK_ENTRY_FROM_DATE = "2025-01-01"
 DEFAULT_SCRAP_DEVALUATION_TARGETS = (
     {"code_prefix": "10", "target_rate": 0.01},
@@ -42,78 +44,82 @@ def update_all_item_valuation_rates_enq():
 
 
 @frappe.whitelist()
-def update_all_item_valuation_rates():
+def update_all_item_valuation_rates(full_save=0, full_save_items=None):
     """
     Update Item.valuation_rate from the default BOM cost first and the latest
     purchase invoice rate as a fallback.
+
+    Rates of all enabled items are resolved with two queries and changed rates
+    are written to valuation_rate only, with batched UPDATEs. Items that need
+    their document hooks are saved as documents instead: all changed items
+    with full_save=1, or the item codes listed in full_save_items.
     """
-    log_context = frappe._dict(
-        {
-            "doctype": "Item",
-            "name": "Valuation Rate Process Run on {0}".format(now_datetime()),
-        }
-    )
-    log_id = _get_or_create_log(log_context)
+    with log_buffer():
+        log_context = frappe._dict(
+            {
+                "doctype": "Item",
+                "name": "Valuation Rate Process Run on {0}".format(now_datetime()),
+            }
+        )
+        log_id = _get_or_create_log(log_context)
 
-    items = frappe.get_all(
-        "Item",
-        fields=["name", "item_name", "valuation_rate"],
-        filters={"disabled": 0},
-    )
-    updated_items = []
-    skipped_items = []
+        items = frappe.get_all(
+            "Item",
+            fields=["name", "item_name", "valuation_rate"],
+            filters={"disabled": 0},
+        )
+        rates = _resolve_item_valuation_rates([item_data.name for item_data in items])
+        full_save = cint(full_save)
+        full_save_items = set(_parse_item_codes(full_save_items))
+        sql_updates = []
+        doc_updates = []
+        skipped_count = 0
+
+        for item_data in items:
+            new_rate, source = rates.get(item_data.name, (0.0, None))
+            if new_rate <= 0 or flt(item_data.valuation_rate) == flt(new_rate):
+                skipped_count += 1
+                continue
 
-    for item_data in items:
-        new_rate, source = _resolve_item_valuation_rate(item_data.name)
-        update_log_entry(
-            log_id,
-            (
-                "[{0}] Item {1}: source={2}, candidate_rate={3}<br>".format(
-                    now_datetime(), item_data.name, source or "none", new_rate
+            update = {"item": item_data.name, "rate": new_rate, "source": source}
+            if full_save or item_data.name in full_save_items:
+                doc_updates.append(update)
+            else:
+                sql_updates.append(update)
+
+        _write_item_valuation_rates(sql_updates)
+        updated_items = list(sql_updates)
+
+        for update in doc_updates:
+            try:
+                item_doc = frappe.get_doc("Item", update["item"])
+                item_doc.valuation_rate = update["rate"]
+                item_doc.save(ignore_permissions=True)
+                updated_items.append(update)
+            except Exception as exc:
+                frappe.log_error(
+                    "Error saving item {0}: {1}".format(update["item"], exc),
+                    "Valuation Rate Update Error",
                 )
-            ),
-        )
 
-        if new_rate <= 0 or flt(item_data.valuation_rate) == flt(new_rate):
-            skipped_items.append(
-                {
-                    "item": item_data.name,
-                    "reason": (
-                        "No source rate found or valuation rate is already up to date."
-                    ),
-                }
-            )
-            continue
+        frappe.db.commit()
 
-        try:
-            item_doc = frappe.get_doc("Item", item_data.name)
-            item_doc.valuation_rate = new_rate
-            item_doc.save(ignore_permissions=True)
-            updated_items.append(
-                {"item": item_doc.name, "rate": new_rate, "source": source}
-            )
+        for update in updated_items:
             update_log_entry(
                 log_id,
-                "[{0}] Item {1}: valuation_rate updated to {2}<br>".format(
-                    now_datetime(), item_doc.name, new_rate
+                "[{0}] Item {1}: valuation_rate updated to {2} (source={3})<br>".format(
+                    now_datetime(), update["item"], update["rate"], update["source"]
                 ),
             )
-        except Exception as exc:
-            frappe.log_error(
-                "Error saving item {0}: {1}".format(item_data.name, exc),
-                "Valuation Rate Update Error",
-            )
-
-    frappe.db.commit()
 
-    update_log_entry(
-        log_id,
-        (
-            "[{0}] Valuation Rate Update Complete.<br>"
-            "Updated {1} items.<br>"
-            "Skipped {2} items.<br>"
-        ).format(now_datetime(), len(updated_items), len(skipped_items)),
-    )
+        update_log_entry(
+            log_id,
+            (
+                "[{0}] Valuation Rate Update Complete.<br>"
+                "Updated {1} items.<br>"
+                "Skipped {2} items.<br>"
+            ).format(now_datetime(), len(updated_items), skipped_count),
+        )
 
 
 @frappe.whitelist()
@@ -493,57 +499,111 @@ def _validate_target_rate(target_rate):
 
 
 def _resolve_item_valuation_rate(item_code):
+    """Resolve the Item master valuation rate of one item, see _resolve_item_valuation_rates."""
+    return _resolve_item_valuation_rates([item_code]).get(item_code, (0.0, None))
+
+
+def _resolve_item_valuation_rates(item_codes):
     """
-    Resolve an Item master valuation rate from the supported source priority.
+    Resolve Item master valuation rates from the supported source priority.
 
+    Returns {item_code: (rate, source)} for the items that have a rate.
     Order:
     1. Default BOM total cost
     2. Latest submitted Purchase Invoice Item rate
     """
-    bom_cost = _get_default_bom_cost(item_code)
-    if bom_cost:
-        return bom_cost, "default_bom"
+    if not item_codes:
+        return {}
 
-    last_purchase_rate = _get_last_purchase_rate(item_code)
-    if last_purchase_rate:
-        return last_purchase_rate, "last_purchase_invoice"
+    rates = {}
+    for item_code, rate in _get_last_purchase_rates(item_codes).items():
+        if rate:
+            rates[item_code] = (rate, "last_purchase_invoice")
+    for item_code, bom_cost in _get_default_bom_costs(item_codes).items():
+        if bom_cost:
+            rates[item_code] = (bom_cost, "default_bom")
+    return rates
 
-    return 0.0, None
 
+def _get_default_bom_costs(item_codes):
+    """Return {item_code: total cost of its default BOM} with one query."""
+    costs = {}
+    for row in frappe.db.sql(
+        """
+        SELECT item, total_cost
+        FROM `tabBOM`
+        WHERE is_default = 1
+            AND item IN %(item_codes)s
+        ORDER BY item, modified DESC
+        """,
+        {"item_codes": tuple(item_codes)},
+        as_dict=True,
+    ):
+        costs.setdefault(row.item, flt(row.total_cost))
+    return costs
 
-def _get_default_bom_cost(item_code):
-    """Return the total cost of the default BOM for one item, if it exists."""
-    default_bom = frappe.db.get_value(
-        "BOM", {"item": item_code, "is_default": 1}, "name"
-    )
-    if not default_bom:
-        return 0.0
 
-    try:
-        return flt(
-            frappe.db.get_value("BOM", {"name": default_bom}, "total_cost") or 0.0
-        )
-    except Exception as exc:
-        frappe.log_error(
-            "Error calculating BOM cost for {0}: {1}".format(item_code, exc),
-            "Valuation Rate Update Error",
+def _get_last_purchase_rates(item_codes):
+    """Return {item_code: rate of its latest submitted Purchase Invoice Item} with one query."""
+    rates = {}
+    for row in frappe.db.sql(
+        """
+        SELECT pii.item_code, pii.rate
+        FROM `tabPurchase Invoice Item` pii
+        INNER JOIN (
+            SELECT item_code, MAX(creation) AS creation
+            FROM `tabPurchase Invoice Item`
+            WHERE docstatus = 1
+                AND item_code IN %(item_codes)s
+            GROUP BY item_code
+        ) latest ON latest.item_code = pii.item_code
+            AND latest.creation = pii.creation
+        WHERE pii.docstatus = 1
+        ORDER BY pii.item_code, pii.idx
+        """,
+        {"item_codes": tuple(item_codes)},
+        as_dict=True,
+    ):
+        rates.setdefault(row.item_code, flt(row.rate))
+    return rates
+
+
+def _write_item_valuation_rates(updates, chunk_size=VALUATION_RATE_UPDATE_CHUNK_SIZE):
+    """Write Item.valuation_rate with one UPDATE ... CASE per chunk, without document hooks."""
+    timestamp = now_datetime()
+    for index in range(0, len(updates), chunk_size):
+        chunk = updates[index:index + chunk_size]
+        args = []
+        for update in chunk:
+            args.extend([update["item"], update["rate"]])
+        args.extend([timestamp, frappe.session.user])
+        args.extend([update["item"] for update in chunk])
+        frappe.db.sql(
+            """
+            UPDATE `tabItem`
+            SET `valuation_rate` = CASE `name` {cases} END,
+                `modified` = %s,
+                `modified_by` = %s
+            WHERE `name` IN ({placeholders})
+            """.format(
+                cases=" ".join(["WHEN %s THEN %s"] * len(chunk)),
+                placeholders=", ".join(["%s"] * len(chunk)),
+            ),
+            tuple(args),
         )
-        return 0.0
+    return len(updates)
 
 
-def _get_last_purchase_rate(item_code):
-    """Return the latest submitted purchase rate for one item."""
-    last_purchase_rate = frappe.db.get_all(
-        "Purchase Invoice Item",
-        filters={"item_code": item_code, "docstatus": 1},
-        fields=["rate"],
-        order_by="creation desc",
-        limit=1,
-    )
-    if not last_purchase_rate:
-        return 0.0
-
-    return flt(last_purchase_rate[0].rate)
+def _parse_item_codes(item_codes):
+    """Accept a list, a JSON list or a comma separated string of item codes."""
+    if not item_codes:
+        return []
+    if isinstance(item_codes, str):
+        if item_codes.strip().startswith("["):
+            item_codes = frappe.parse_json(item_codes)
+        else:
+            item_codes = item_codes.split(",")
+    return [cstr(item_code).strip() for item_code in item_codes if cstr(item_code).strip()]
 
 
 def _create_direct_scrap_valuation_log(
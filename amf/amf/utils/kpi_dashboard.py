@@ -5,6 +5,8 @@ import json
 import frappe
 from frappe.modules.import_file import import_file_by_path
 
+from amf.amf.utils.semester_aggregation import clear_semester_chart_cache
+
 
 DASHBOARD_NAME = "Supply Chain and Manufacturing"
 OTIF_SOURCE_NAME = "OTIF by Semester"
@@ -304,7 +306,7 @@ def ensure_dashboard_chart(
         })
         frappe.get_doc(values).insert(ignore_permissions=True)
 
-    frappe.cache().delete_key("chart-data:{0}".format(chart_name))
+    clear_semester_chart_cache(chart_name)
 
 
 def ensure_dashboard():
@@ -387,7 +389,7 @@ def remove_legacy_packaging_shipping_issues():
     for chart_name in LEGACY_PACKAGING_SHIPPING_ISSUES_CHARTS:
         if frappe.db.exists("Dashboard Chart", chart_name):
             frappe.delete_doc("Dashboard Chart", chart_name, ignore_permissions=True, force=True)
-            frappe.cache().delete_key("chart-data:{0}".format(chart_name))
+            clear_semester_chart_cache(chart_name)
 
     if frappe.db.exists("Dashboard Chart Source", LEGACY_PACKAGING_SHIPPING_ISSUES_SOURCE_NAME):
         frappe.delete_doc(
@@ -402,18 +404,18 @@ def remove_legacy_purchasing_amount_by_currency():
     for chart_name in LEGACY_PURCHASING_AMOUNT_BY_CURRENCY_CHARTS:
         if frappe.db.exists("Dashboard Chart", chart_name):
             frappe.delete_doc("Dashboard Chart", chart_name, ignore_permissions=True, force=True)
-            frappe.cache().delete_key("chart-data:{0}".format(chart_name))
+            clear_semester_chart_cache(chart_name)
 
 
 def remove_legacy_stock_balance_charts():
     for chart_name in LEGACY_STOCK_BALANCE_CHARTS:
         if frappe.db.exists("Dashboard Chart", chart_name):
             frappe.delete_doc("Dashboard Chart", chart_name, ignore_permissions=True, force=True)
-            frappe.cache().delete_key("chart-data:{0}".format(chart_name))
+            clear_semester_chart_cache(chart_name)
 
 
 def remove_legacy_inventory_turnover_charts():
     for chart_name in LEGACY_INVENTORY_TURNOVER_CHARTS:
         if frappe.db.exists("Dashboard Chart", chart_name):
             frappe.delete_doc("Dashboard Chart", chart_name, ignore_permissions=True, force=True)
-            frappe.cache().delete_key("chart-data:{0}".format(chart_name))
+            clear_semester_chart_cache(chart_name)
@@ -0,0 +1,126 @@
+"""
+Buffered appends to Log Entry messages.
+
+Log lines used to cost a frappe.get_doc + save() each, which is quadratic in the
+message size and one full document write per line. Lines are now appended with
+a single SQL UPDATE. Inside a log_buffer() block (or a @buffered_log hook) they
+are held per log id in frappe.local and flushed once when the outermost block
+exits, or earlier every LOG_FLUSH_LINES lines.
+
+Size caps: a single line is cut at LOG_MAX_LINE_CHARS, and a Log Entry keeps
+only its last LOG_MAX_MESSAGE_CHARS characters (oldest lines rotate out first).
+Age-based rotation stays with amf.amf.utils.cleaning.
+"""
+
+from contextlib import contextmanager
+from functools import wraps
+
+import frappe
+from frappe.utils import now_datetime
+
+LOG_FLUSH_LINES = 50
+LOG_MAX_LINE_CHARS = 4000
+LOG_MAX_MESSAGE_CHARS = 1000000
+LOG_TRUNCATED_SUFFIX = " [...]"
+
+
+def append_log_message(log_id, message):
+    """Append one line to a Log Entry, buffered when a log_buffer() is active."""
+    if not log_id:
+        return
+
+    line = _cap_line(message)
+    buffers = _get_buffers()
+    if buffers is None:
+        _write_lines(log_id, [line])
+        return
+
+    lines = buffers.setdefault(log_id, [])
+    lines.append(line)
+    if len(lines) >= getattr(frappe.local, "amf_log_flush_lines", LOG_FLUSH_LINES):
+        flush_log_entries(log_id)
+
+
+def flush_log_entries(log_id=None):
+    """Write buffered lines (for one log id, or all) with one UPDATE per Log Entry."""
+    buffers = _get_buffers()
+    if not buffers:
+        return
+
+    log_ids = [log_id] if log_id else list(buffers.keys())
+    for current_log_id in log_ids:
+        lines = buffers.pop(current_log_id, None)
+        if lines:
+            _write_lines(current_log_id, lines)
+
+
+@contextmanager
+def log_buffer(flush_lines=LOG_FLUSH_LINES):
+    """Hold Log Entry lines in memory until the outermost block exits."""
+    depth = getattr(frappe.local, "amf_log_buffer_depth", 0)
+    if not depth:
+        frappe.local.amf_log_buffer = {}
+        frappe.local.amf_log_flush_lines = flush_lines
+
+    frappe.local.amf_log_buffer_depth = depth + 1
+    try:
+        yield
+    finally:
+        try:
+            if not depth:
+                flush_log_entries()
+        finally:
+            frappe.local.amf_log_buffer_depth = depth
+            if not depth:
+                frappe.local.amf_log_buffer = None
+
+
+def buffered_log(fn):
+    """
+    Decorator for doc event hooks: flush the hook's log lines once when it returns.
+
+    Not for whitelisted methods: frappe.call reads the arguments of the
+    *args/**kwargs wrapper and would pass `cmd` and every form key through.
+    Use `with log_buffer():` in their body instead.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with log_buffer():
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def _get_buffers():
+    if not getattr(frappe.local, "amf_log_buffer_depth", 0):
+        return None
+    return getattr(frappe.local, "amf_log_buffer", None)
+
+
+def _cap_line(message):
+    line = message or ""
+    if not isinstance(line, str):
+        line = str(line)
+    if len(line) > LOG_MAX_LINE_CHARS:
+        line = line[:LOG_MAX_LINE_CHARS - len(LOG_TRUNCATED_SUFFIX)] + LOG_TRUNCATED_SUFFIX
+    return line
+
+
+def _write_lines(log_id, lines):
+    try:
+        frappe.db.sql(
+            """
+            UPDATE `tabLog Entry`
+            SET `message` = RIGHT(CONCAT(IFNULL(`message`, ''), %s), %s),
+                `modified` = %s
+            WHERE `name` = %s
+            """,
+            (
+                "".join("\n" + line for line in lines),
+                LOG_MAX_MESSAGE_CHARS,
+                now_datetime(),
+                log_id,
+            ),
+        )
+    except Exception:
+        frappe.log_error(frappe.get_traceback(), "Unable to update Log Entry")
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import hashlib
 import json
 import re
 import statistics
+import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime
 
 import frappe
@@ -30,6 +33,10 @@ from amf.amf.dashboard_chart_source.purchased_item_price_ratio.purchased_item_pr
     EXCLUDED_SUPPLIER,
     get_anomaly_decisions,
 )
+from amf.amf.doctype.operations_kpi_period_snapshot.operations_kpi_period_snapshot import (
+    get_period_snapshot,
+    save_period_snapshot,
+)
 from amf.amf.report.on_time_delivery_kpis.on_time_delivery_kpis import (
     get_data as get_otd_rows,
 )
@@ -46,6 +53,20 @@ SCRAP_TARGET = 8.0
 ISSUE_AGE_TARGET_DAYS = 30
 PRICE_REVIEW_PERCENT = 10.0
 PRICE_REVIEW_IMPACT = 500.0
+COLLECTOR_WORKERS = 4
+AI_FALLBACK_WARNING = (
+    "AI insight generation failed; the deterministic report was "
+    "completed without AI content."
+)
+REPORT_LANGUAGES = ("english", "french")
+PDF_OPTIONS = {
+    "page-size": "A4",
+    "margin-top": "15mm",
+    "margin-right": "12mm",
+    "margin-bottom": "15mm",
+    "margin-left": "12mm",
+    "encoding": "UTF-8",
+}
 
 
 def generate_previous_month_report(force=False, source="Scheduled"):
@@ -181,32 +202,40 @@ def generate_report(report_name, force=False):
 
         doc.db_set("status", "Generating", update_modified=True)
         settings = get_settings()
+        collector_timings = {}
         data = collect_report_data(
             company=doc.company,
             period_start=getdate(doc.period_start),
             period_end=getdate(doc.period_end),
             period_type=doc.period_type,
+            timings=collector_timings,
         )
 
         ai_result = None
         ai_error = ""
         ai_insights_for_report = None
+        ai_in_background = False
         if cint(doc.generate_ai_insights):
-            doc.db_set("ai_status", "Generating", update_modified=False)
-            try:
-                from amf.amf.utils.operations_ai_insights import generate_ai_insights
+            from amf.amf.utils.operations_ai_insights import (
+                generate_ai_insights,
+                get_cached_ai_insights,
+            )
 
-                ai_result = generate_ai_insights(data, settings)
-                if not cint(settings.get("require_human_approval", 1)):
-                    ai_insights_for_report = ai_result["insights"]
-            except Exception:
-                ai_error = frappe.get_traceback()
-                if not cint(settings.get("fallback_to_rule_based_report", 1)):
-                    raise
-                warnings.append(
-                    "AI insight generation failed; the deterministic report was "
-                    "completed without AI content."
-                )
+            ai_result = get_cached_ai_insights(data, settings)
+            ai_in_background = not ai_result and cint(
+                settings.get("generate_ai_in_background", 1)
+            )
+            if not ai_result and not ai_in_background:
+                doc.db_set("ai_status", "Generating", update_modified=False)
+                try:
+                    ai_result = generate_ai_insights(data, settings)
+                except Exception:
+                    ai_error = frappe.get_traceback()
+                    if not cint(settings.get("fallback_to_rule_based_report", 1)):
+                        raise
+                    warnings.append(AI_FALLBACK_WARNING)
+            if ai_result and not cint(settings.get("require_human_approval", 1)):
+                ai_insights_for_report = ai_result["insights"]
 
         english_markdown = (
             render_report(data, "en", ai_insights_for_report)
@@ -227,6 +256,7 @@ def generate_report(report_name, force=False):
             ai_enabled=cint(doc.generate_ai_insights),
             ai_result=ai_result,
             ai_error=ai_error,
+            ai_pending=ai_in_background,
         )
         doc.english_markdown = english_markdown
         doc.french_markdown = french_markdown
@@ -236,46 +266,43 @@ def generate_report(report_name, force=False):
             sort_keys=True,
             default=json_default,
         )
+        doc.collection_duration = collector_timings.get("total")
+        doc.collector_timings_json = json.dumps(
+            collector_timings,
+            indent=2,
+            sort_keys=True,
+        )
         doc.generated_on = now_datetime()
         doc.generated_by = frappe.session.user
         doc.generation_log = ""
         doc.save(ignore_permissions=True)
 
-        remove_generated_files(doc)
-        file_updates = create_report_files(
-            doc,
-            english_markdown,
-            french_markdown,
-            settings,
-            warnings,
-        )
-        for fieldname, file_url in file_updates.items():
-            doc.db_set(fieldname, file_url, update_modified=False)
-
         approval_required = (
             cint(doc.generate_ai_insights)
             and cint(settings.get("require_human_approval", 1))
             and doc.ai_status == "Approval Required"
         )
-        if cint(doc.send_email) and not approval_required:
-            try:
-                email_report(doc.name)
-            except Exception:
-                warnings.append(
-                    "Email distribution failed: {0}".format(frappe.get_traceback())
-                )
-
-        final_status = "Completed with Warnings" if warnings else "Completed"
         frappe.db.set_value(
             REPORT_DOCTYPE,
             doc.name,
             {
-                "status": final_status,
+                "status": "Rendering",
                 "generation_log": "\n\n".join(warnings),
             },
             update_modified=True,
         )
-        return {"name": doc.name, "status": final_status, "warnings": warnings}
+        # With background AI the email goes out once the insights are in.
+        enqueue_report_rendering(
+            doc.name,
+            warnings=warnings,
+            send_email_after=(
+                cint(doc.send_email)
+                and not approval_required
+                and not ai_in_background
+            ),
+            generate_ai_after=ai_in_background,
+        )
+        return {"name": doc.name, "status": "Rendering", "warnings": warnings}
     except Exception:
         error = frappe.get_traceback()
         frappe.db.rollback()
@@ -293,23 +320,81 @@ def generate_report(report_name, force=False):
         raise
 
 
-def collect_report_data(company, period_start, period_end, period_type="Monthly"):
+def collect_report_data(
+    company,
+    period_start,
+    period_end,
+    period_type="Monthly",
+    timings=None,
+    workers=COLLECTOR_WORKERS,
+):
+    """
+    Collect the KPI data of one report period.
+
+    The collectors are independent read-only queries, so they run in a thread
+    pool with one database connection per thread; the report is ready after
+    the slowest collector instead of the sum of all. Pass a dict as timings
+    to receive the seconds spent per collector and in total.
+
+    The previous period is read from its Operations KPI Period Snapshot when
+    one is stored; closed periods computed here are stored for later reports.
+    """
+    started = time.monotonic()
     period_start = getdate(period_start)
     period_end = getdate(period_end)
     if period_type == "Semester":
         previous_start = add_months(period_start, -6)
         previous_end = add_days(period_start, -1)
-        period_label = "{0}-{1}".format(
-            period_start.year,
-            "H1" if period_start.month == 1 else "H2",
-        )
     else:
         previous_start = get_first_day(add_months(period_start, -1))
         previous_end = get_last_day(previous_start)
-        period_label = period_start.strftime("%Y-%m")
+    period_label = format_period_label(period_start, period_type)
+    previous_label = format_period_label(previous_start, period_type)
     semester_start = date(period_start.year, 1 if period_start.month <= 6 else 7, 1)
+    previous_snapshot = get_period_snapshot(company, period_type, previous_label, previous_end)
+
+    collectors = [
+        ("otif_current_rows", get_otif_rows, (period_start, period_end)),
+        ("otif_semester_rows", get_otif_rows, (semester_start, period_end)),
+        ("otif_strict", get_strict_otif, (period_start, period_end)),
+        ("machining", collect_machining, (period_start, period_end, semester_start)),
+        ("shipping", collect_shipping_issues, (period_start, period_end)),
+        ("procurement", collect_procurement_prices, (period_start, period_end)),
+    ]
+    if previous_snapshot is None:
+        collectors.insert(
+            1,
+            ("otif_previous_rows", get_otif_rows, (previous_start, previous_end)),
+        )
+    results = run_collectors(collectors, timings=timings, workers=workers)
+
+    otif = build_otif(
+        results["otif_current_rows"],
+        results.get("otif_previous_rows") or [],
+        results["otif_semester_rows"],
+        results["otif_strict"],
+        previous_summary=(previous_snapshot or {}).get("otif"),
+    )
+    if previous_snapshot is None and is_closed_period(previous_end, period_type):
+        save_period_snapshot(
+            company,
+            period_type,
+            previous_label,
+            previous_start,
+            previous_end,
+            {"otif": otif["previous"]},
+        )
+    if is_closed_period(period_end, period_type):
+        save_period_snapshot(
+            company,
+            period_type,
+            period_label,
+            period_start,
+            period_end,
+            {"otif": otif["current"]},
+        )
 
-    return {
+    data = {
         "scope": {
             "company": company,
             "currency": frappe.db.get_value("Company", company, "default_currency") or "CHF",
@@ -322,28 +407,94 @@ def collect_report_data(company, period_start, period_end, period_type="Monthly"
             "semester_start": semester_start,
             "generated_on": now_datetime(),
         },
-        "otif": collect_otif(
-            period_start,
-            period_end,
-            previous_start,
-            previous_end,
-            semester_start,
-        ),
-        "machining": collect_machining(period_start, period_end, semester_start),
-        "shipping": collect_shipping_issues(period_start, period_end),
-        "procurement": collect_procurement_prices(period_start, period_end),
+        "otif": otif,
+        "machining": results["machining"],
+        "shipping": results["shipping"],
+        "procurement": results["procurement"],
     }
+    if timings is not None:
+        timings["total"] = round(time.monotonic() - started, 3)
+    return data
+
+
+def format_period_label(period_start, period_type="Monthly"):
+    period_start = getdate(period_start)
+    if period_type == "Semester":
+        return "{0}-{1}".format(
+            period_start.year,
+            "H1" if period_start.month == 1 else "H2",
+        )
+    return period_start.strftime("%Y-%m")
+
+
+def is_closed_period(period_end, period_type="Monthly"):
+    """A period is closed once it has fully elapsed (semester reports stop at today)."""
+    period_end = getdate(period_end)
+    if period_type == "Semester" and (period_end.month, period_end.day) not in ((6, 30), (12, 31)):
+        return False
+    return period_end < getdate(today())
+
+
+def run_collectors(collectors, timings=None, workers=COLLECTOR_WORKERS):
+    """
+    Run (name, method, args) collectors and return {name: result}.
+
+    With more than one worker each collector runs in its own thread with its
+    own site connection; exceptions are re-raised in the calling thread.
+    """
+    if cint(workers) <= 1 or len(collectors) <= 1 or not getattr(frappe.local, "site", None):
+        results = {}
+        for name, method, args in collectors:
+            results[name], seconds = _run_timed_collector(method, args)
+            if timings is not None:
+                timings[name] = seconds
+        return results
+
+    site = frappe.local.site
+    sites_path = frappe.local.sites_path
+    user = frappe.session.user
+    with ThreadPoolExecutor(max_workers=min(cint(workers), len(collectors))) as executor:
+        futures = [
+            (name, executor.submit(_run_collector_in_thread, site, sites_path, user, method, args))
+            for name, method, args in collectors
+        ]
+        results = {}
+        for name, future in futures:
+            results[name], seconds = future.result()
+            if timings is not None:
+                timings[name] = seconds
+    return results
+
+
+def _run_collector_in_thread(site, sites_path, user, method, args):
+    frappe.init(site=site, sites_path=sites_path)
+    try:
+        frappe.connect()
+        frappe.set_user(user)
+        return _run_timed_collector(method, args)
+    finally:
+        frappe.destroy()
+
+
+def _run_timed_collector(method, args):
+    started = time.monotonic()
+    result = method(*args)
+    return result, round(time.monotonic() - started, 3)
 
 
 def collect_otif(period_start, period_end, previous_start, previous_end, semester_start):
-    current_rows = get_otif_rows(period_start, period_end)
-    previous_rows = get_otif_rows(previous_start, previous_end)
-    semester_rows = get_otif_rows(semester_start, period_end)
+    return build_otif(
+        get_otif_rows(period_start, period_end),
+        get_otif_rows(previous_start, previous_end),
+        get_otif_rows(semester_start, period_end),
+        get_strict_otif(period_start, period_end),
+    )
+
 
+def build_otif(current_rows, previous_rows, semester_rows, strict, previous_summary=None):
     current = summarize_delivered_rows(current_rows)
-    previous = summarize_delivered_rows(previous_rows)
+    previous = previous_summary or summarize_delivered_rows(previous_rows)
     semester = summarize_delivered_rows(semester_rows)
-    strict = get_strict_otif(period_start, period_end)
 
     customers = defaultdict(lambda: {"lines": 0, "on_time": 0, "late_days": []})
     item_groups = defaultdict(lambda: {"lines": 0, "on_time": 0, "late_days": []})
@@ -2225,14 +2376,15 @@ def set_ai_fields(
     ai_enabled=False,
     ai_result=None,
     ai_error="",
+    ai_pending=False,
 ):
     doc.ai_approved = 0
     doc.ai_approved_by = None
     doc.ai_approved_on = None
     doc.ai_rejection_reason = ""
 
-    if not cint(ai_enabled):
-        doc.ai_status = "Disabled"
+    if not cint(ai_enabled) or ai_pending:
+        doc.ai_status = "Pending" if cint(ai_enabled) else "Disabled"
         doc.ai_model = ""
         doc.ai_response_id = ""
         doc.ai_prompt_version = ""
@@ -2291,8 +2443,12 @@ def set_ai_fields(
     doc.ai_error = ""
 
 
-def rebuild_report_outputs(report_name, include_ai=False, send_email_after=False):
-    warnings = []
+def rebuild_report_outputs(
+    report_name,
+    include_ai=False,
+    send_email_after=False,
+    force_email=True,
+):
     doc = frappe.get_doc(REPORT_DOCTYPE, report_name)
     settings = get_settings()
     if not doc.kpi_data_json:
@@ -2319,54 +2475,264 @@ def rebuild_report_outputs(report_name, include_ai=False, send_email_after=False
     doc.french_markdown = french_markdown
     doc.save(ignore_permissions=True)
 
-    remove_generated_files(doc)
-    file_updates = create_report_files(
-        doc,
-        english_markdown,
-        french_markdown,
-        settings,
-        warnings,
+    enqueue_report_rendering(
+        doc.name,
+        send_email_after=send_email_after and cint(doc.send_email),
+        force_email=force_email,
     )
-    for fieldname, file_url in file_updates.items():
-        doc.db_set(fieldname, file_url, update_modified=False)
-
-    if send_email_after and cint(doc.send_email):
-        doc.reload()
-        email_report(doc.name, force=True)
-
-    if warnings:
-        frappe.db.set_value(
-            REPORT_DOCTYPE,
-            doc.name,
-            {
-                "status": "Completed with Warnings",
-                "generation_log": "\n\n".join(warnings),
-            },
-            update_modified=True,
-        )
     return {
         "name": doc.name,
         "included_ai": bool(ai_insights),
-        "warnings": warnings,
+        "status": "Rendering",
+        "warnings": [],
     }
 
 
+def enqueue_report_rendering(
+    report_name,
+    warnings=None,
+    send_email_after=False,
+    force_email=False,
+    generate_ai_after=False,
+):
+    frappe.enqueue(
+        "amf.amf.utils.monthly_operations_report.render_report_outputs",
+        queue="long",
+        timeout=3600,
+        enqueue_after_commit=True,
+        report_name=report_name,
+        warnings=warnings,
+        send_email_after=bool(send_email_after),
+        force_email=bool(force_email),
+        generate_ai_after=bool(generate_ai_after),
+    )
+
+
+def render_report_outputs(
+    report_name,
+    warnings=None,
+    send_email_after=False,
+    force_email=False,
+    generate_ai_after=False,
+):
+    """
+    Rendering stage: write the Markdown/PDF files of both languages, then
+    optionally email the report and queue the background AI stage.
+
+    warnings are the generation-stage warnings; when given, the report status
+    is finalised from them plus the rendering warnings (a rebuild passes none
+    and only flags new warnings).
+    """
+    render_warnings = []
+    try:
+        doc = frappe.get_doc(REPORT_DOCTYPE, report_name)
+        settings = get_settings()
+        file_updates = create_report_files(
+            doc,
+            doc.english_markdown,
+            doc.french_markdown,
+            settings,
+            render_warnings,
+        )
+        if file_updates:
+            frappe.db.set_value(
+                REPORT_DOCTYPE,
+                doc.name,
+                file_updates,
+                update_modified=False,
+            )
+
+        if send_email_after:
+            try:
+                email_report(doc.name, force=force_email)
+            except Exception:
+                render_warnings.append(
+                    "Email distribution failed: {0}".format(frappe.get_traceback())
+                )
+
+        if warnings is not None or render_warnings:
+            all_warnings = list(warnings or []) + render_warnings
+            frappe.db.set_value(
+                REPORT_DOCTYPE,
+                doc.name,
+                {
+                    "status": "Completed with Warnings" if all_warnings else "Completed",
+                    "generation_log": "\n\n".join(all_warnings),
+                },
+                update_modified=True,
+            )
+        if generate_ai_after:
+            frappe.enqueue(
+                "amf.amf.utils.monthly_operations_report.generate_report_ai_insights",
+                queue="long",
+                timeout=3600,
+                enqueue_after_commit=True,
+                report_name=doc.name,
+            )
+        frappe.db.commit()
+        return {"name": doc.name, "warnings": render_warnings}
+    except Exception:
+        error = frappe.get_traceback()
+        frappe.db.rollback()
+        if frappe.db.exists(REPORT_DOCTYPE, report_name):
+            frappe.db.set_value(
+                REPORT_DOCTYPE,
+                report_name,
+                {
+                    "status": "Failed",
+                    "generation_log": error,
+                },
+                update_modified=True,
+            )
+        frappe.log_error(error, "Operations KPI Report rendering failed")
+        raise
+
+
+def generate_report_ai_insights(report_name):
+    """
+    Background AI stage: fill in the insights of a report whose deterministic
+    files are already rendered, then rebuild the files unless the insights
+    wait for approval.
+    """
+    from amf.amf.utils.operations_ai_insights import generate_ai_insights
+
+    doc = frappe.get_doc(REPORT_DOCTYPE, report_name)
+    if not cint(doc.generate_ai_insights) or not doc.kpi_data_json:
+        return {"name": doc.name, "skipped": True}
+
+    settings = {}
+    email_sent = False
+    try:
+        settings = get_settings()
+        doc.db_set("ai_status", "Generating", update_modified=False)
+        frappe.db.commit()
+
+        ai_result = None
+        ai_error = ""
+        try:
+            ai_result = generate_ai_insights(json.loads(doc.kpi_data_json), settings)
+        except Exception:
+            ai_error = frappe.get_traceback()
+
+        doc.reload()
+        set_ai_fields(
+            doc,
+            settings,
+            ai_enabled=1,
+            ai_result=ai_result,
+            ai_error=ai_error,
+        )
+        doc.save(ignore_permissions=True)
+
+        if not ai_result:
+            if not cint(settings.get("fallback_to_rule_based_report", 1)):
+                status, warnings = "Failed", [ai_error]
+            else:
+                status = "Completed with Warnings"
+                warnings = [doc.generation_log, AI_FALLBACK_WARNING]
+                if cint(doc.send_email):
+                    try:
+                        email_report(doc.name)
+                        email_sent = True
+                    except Exception:
+                        warnings.append(
+                            "Email distribution failed: {0}".format(frappe.get_traceback())
+                        )
+            frappe.db.set_value(
+                REPORT_DOCTYPE,
+                doc.name,
+                {
+                    "status": status,
+                    "generation_log": "\n\n".join(warning for warning in warnings if warning),
+                },
+                update_modified=True,
+            )
+        elif doc.ai_status != "Approval Required":
+            rebuild_report_outputs(
+                doc.name,
+                include_ai=True,
+                send_email_after=bool(doc.send_email),
+                force_email=False,
+            )
+
+        frappe.db.commit()
+        return {"name": doc.name, "ai_status": doc.ai_status}
+    except Exception:
+        fail_report_ai_insights(report_name, settings, frappe.get_traceback(), send_email=not email_sent)
+        raise
+
+
+def fail_report_ai_insights(report_name, settings, error, send_email=True):
+    """
+    Record a failed AI stage: the report leaves "Generating", keeps its
+    deterministic files and, with the rule-based fallback, is still emailed.
+    """
+    frappe.db.rollback()
+    if not frappe.db.exists(REPORT_DOCTYPE, report_name):
+        frappe.log_error(error, "Operations KPI Report AI insights failed")
+        return
+
+    doc = frappe.get_doc(REPORT_DOCTYPE, report_name)
+    warnings = [doc.generation_log, error]
+    if cint(settings.get("fallback_to_rule_based_report", 1)):
+        status = "Completed with Warnings"
+        warnings.append(AI_FALLBACK_WARNING)
+        if send_email and cint(doc.send_email):
+            try:
+                email_report(doc.name)
+            except Exception:
+                warnings.append("Email distribution failed: {0}".format(frappe.get_traceback()))
+    else:
+        status = "Failed"
+
+    frappe.db.set_value(
+        REPORT_DOCTYPE,
+        doc.name,
+        {
+            "ai_status": "Failed",
+            "status": status,
+            "generation_log": "\n\n".join(warning for warning in warnings if warning),
+        },
+        update_modified=True,
+    )
+    frappe.db.commit()
+    frappe.log_error(error, "Operations KPI Report AI insights failed")
+
+
 def create_report_files(doc, english_markdown, french_markdown, settings, warnings):
-    updates = {
-        "english_markdown_file": None,
-        "english_pdf_file": None,
-        "french_markdown_file": None,
-        "french_pdf_file": None,
-    }
+    """
+    Write the Markdown/PDF files of each language and return the field updates.
+
+    A language whose content hash matches the one stored with its existing
+    files is skipped. The PDFs of the remaining languages are rendered
+    concurrently; each wkhtmltopdf call runs in its own process.
+    """
+    updates = {}
     period = get_report_period_label(doc).replace("-", "_")
-    base_name = "operations_report_{0}".format(period)
+    prefixes = {
+        "english": "operations_report_{0}".format(period),
+        "french": "rapport_operations_{0}_fr".format(period),
+    }
+    pdf_jobs = []
 
-    for language, content, prefix in (
-        ("english", english_markdown, base_name),
-        ("french", french_markdown, "rapport_operations_{0}_fr".format(period)),
+    for language, content in (
+        ("english", english_markdown),
+        ("french", french_markdown),
     ):
+        content_hash = get_report_output_hash(doc, settings, language, content)
+        if content and has_current_report_files(doc, settings, language, content_hash):
+            continue
+
+        remove_generated_files(doc, languages=(language,))
+        updates.update({
+            language + "_markdown_file": None,
+            language + "_pdf_file": None,
+            language + "_output_sha256": content_hash if content else None,
+        })
         if not content:
             continue
+
+        prefix = prefixes[language]
         if cint(settings.generate_markdown):
             file_doc = save_file(
                 prefix + ".md",
@@ -2378,38 +2744,78 @@ def create_report_files(doc, english_markdown, french_markdown, settings, warnin
             updates[language + "_markdown_file"] = file_doc.file_url
 
         if cint(settings.generate_pdf):
-            try:
-                html = build_pdf_html(content, language, doc.period_type)
-                pdf_content = get_pdf(
-                    html,
-                    options={
-                        "page-size": "A4",
-                        "margin-top": "15mm",
-                        "margin-right": "12mm",
-                        "margin-bottom": "15mm",
-                        "margin-left": "12mm",
-                        "encoding": "UTF-8",
-                    },
-                )
-                pdf_doc = save_file(
-                    prefix + ".pdf",
-                    pdf_content,
-                    REPORT_DOCTYPE,
-                    doc.name,
-                    is_private=1,
-                )
-                updates[language + "_pdf_file"] = pdf_doc.file_url
-            except Exception:
-                warnings.append(
-                    "{0} PDF generation failed: {1}".format(
-                        language.title(),
-                        frappe.get_traceback(),
-                    )
-                )
+            pdf_jobs.append((
+                language,
+                render_report_pdf,
+                (build_pdf_html(content, language, doc.period_type),),
+            ))
+
+    pdf_results = run_collectors(pdf_jobs, workers=len(pdf_jobs)) if pdf_jobs else {}
+    for language, _method, _args in pdf_jobs:
+        pdf_content, error = pdf_results[language]
+        if error:
+            warnings.append(
+                "{0} PDF generation failed: {1}".format(language.title(), error)
+            )
+            continue
+        pdf_doc = save_file(
+            prefixes[language] + ".pdf",
+            pdf_content,
+            REPORT_DOCTYPE,
+            doc.name,
+            is_private=1,
+        )
+        updates[language + "_pdf_file"] = pdf_doc.file_url
 
     return updates
 
 
+def render_report_pdf(html):
+    """Return (pdf_content, None) or (None, traceback); runs inside a pool thread."""
+    try:
+        return get_pdf(html, options=dict(PDF_OPTIONS)), None
+    except Exception:
+        return None, frappe.get_traceback()
+
+
+def get_report_output_hash(doc, settings, language, content):
+    return hashlib.sha256(
+        json.dumps(
+            [
+                language,
+                doc.period_type,
+                get_report_period_label(doc),
+                cint(settings.generate_markdown),
+                cint(settings.generate_pdf),
+                content or "",
+            ]
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+def has_current_report_files(doc, settings, language, content_hash):
+    if doc.get(language + "_output_sha256") != content_hash:
+        return False
+
+    expected_fields = []
+    if cint(settings.generate_markdown):
+        expected_fields.append(language + "_markdown_file")
+    if cint(settings.generate_pdf):
+        expected_fields.append(language + "_pdf_file")
+    for fieldname in expected_fields:
+        file_url = doc.get(fieldname)
+        if not file_url or not frappe.db.exists(
+            "File",
+            {
+                "file_url": file_url,
+                "attached_to_doctype": REPORT_DOCTYPE,
+                "attached_to_name": doc.name,
+            },
+        ):
+            return False
+    return True
+
+
 def build_pdf_html(markdown_content, language, period_type="Monthly"):
     semester = period_type == "Semester"
     if language == "french":
@@ -2448,12 +2854,11 @@ def build_pdf_html(markdown_content, language, period_type="Monthly"):
     """.format(title=title, body=md_to_html(markdown_content))
 
 
-def remove_generated_files(doc):
+def remove_generated_files(doc, languages=REPORT_LANGUAGES):
     file_urls = [
-        doc.english_markdown_file,
-        doc.english_pdf_file,
-        doc.french_markdown_file,
-        doc.french_pdf_file,
+        doc.get(language + suffix)
+        for language in languages
+        for suffix in ("_markdown_file", "_pdf_file")
     ]
     for file_url in [url for url in file_urls if url]:
         file_name = frappe.db.get_value(
@@ -8,6 +8,7 @@ import time
 from copy import deepcopy
 from datetime import date, datetime
 
+import frappe
 from frappe.utils import cint, flt
 
 from amf.amf.utils.openai_credentials import get_openai_api_key
@@ -17,6 +18,8 @@ DEFAULT_MODEL = "gpt-5.5"
 DEFAULT_PROMPT_VERSION = "operations-v1"
 MAX_STRING_LENGTH = 600
 MAX_LIST_ROWS = 20
+AI_CACHE_KEY_PREFIX = "amf_operations_ai_insights"
+AI_CACHE_EXPIRY_SECONDS = 90 * 24 * 60 * 60
 
 
 class AIConfigurationError(Exception):
@@ -27,46 +30,45 @@ class AIResponseValidationError(Exception):
     pass
 
 
-def generate_ai_insights(kpi_data, settings):
-    api_key = get_openai_api_key(settings)
-    if not api_key:
-        raise AIConfigurationError(
-            "No OpenAI API key is configured. Set it in Operations KPI Report "
-            "Settings or through OPENAI_API_KEY."
-        )
+def generate_ai_insights(kpi_data, settings, client=None, use_cache=True):
+    """
+    Return validated AI insights for a KPI snapshot.
+
+    Results are cached by payload hash, model, prompt version and the output
+    controls, so regenerating or rebuilding an unchanged report does not call
+    the model again. client can be any object with responses.parse (the
+    OpenAI client is built from the settings when omitted).
+    """
+    request = prepare_ai_request(kpi_data, settings)
+    if use_cache:
+        cached = get_cached_ai_result(request["cache_key"])
+        if cached:
+            return cached
+
+    if client is None:
+        api_key = get_openai_api_key(settings)
+        if not api_key:
+            raise AIConfigurationError(
+                "No OpenAI API key is configured. Set it in Operations KPI Report "
+                "Settings or through OPENAI_API_KEY."
+            )
 
     OpenAI, OperationsInsights, model_to_dict = load_ai_dependencies()
 
-    payload = build_ai_payload(
-        kpi_data,
-        anonymize_external_parties=cint(
-            settings.get("anonymize_external_parties", 1)
-        ),
-        include_issue_free_text=cint(
-            settings.get("include_issue_free_text", 0)
-        ),
-    )
-    payload_json = json.dumps(
-        payload,
-        ensure_ascii=False,
-        sort_keys=True,
-        separators=(",", ":"),
-    )
-    model = settings.get("ai_model") or DEFAULT_MODEL
-    reasoning_effort = settings.get("ai_reasoning_effort") or "medium"
-    prompt_version = settings.get("ai_prompt_version") or DEFAULT_PROMPT_VERSION
-    timeout = max(cint(settings.get("ai_timeout_seconds")) or 120, 15)
-    max_insights = min(max(cint(settings.get("ai_max_insights")) or 8, 1), 15)
-    minimum_confidence = min(
-        max(flt(settings.get("ai_minimum_confidence")) / 100.0, 0),
-        1,
-    )
-
-    client = OpenAI(
-        api_key=api_key,
-        timeout=timeout,
-        max_retries=1,
-    )
+    payload = request["payload"]
+    payload_json = request["payload_json"]
+    model = request["model"]
+    reasoning_effort = request["reasoning_effort"]
+    prompt_version = request["prompt_version"]
+    max_insights = request["max_insights"]
+    minimum_confidence = request["minimum_confidence"]
+
+    if client is None:
+        client = OpenAI(
+            api_key=api_key,
+            timeout=request["timeout"],
+            max_retries=1,
+        )
     started = time.monotonic()
     response = client.responses.parse(
         model=model,
@@ -107,7 +109,7 @@ def generate_ai_insights(kpi_data, settings):
         max_insights=max_insights,
     )
     usage = getattr(response, "usage", None)
-    return {
+    result = {
         "status": "Completed",
         "model": getattr(response, "model", None) or model,
         "response_id": getattr(response, "id", None),
@@ -116,11 +118,83 @@ def generate_ai_insights(kpi_data, settings):
         "input_tokens": _usage_value(usage, "input_tokens"),
         "output_tokens": _usage_value(usage, "output_tokens"),
         "total_tokens": _usage_value(usage, "total_tokens"),
-        "payload_sha256": hashlib.sha256(
-            payload_json.encode("utf-8")
-        ).hexdigest(),
+        "payload_sha256": request["payload_sha256"],
         "insights": insight_data,
     }
+    if use_cache:
+        store_cached_ai_result(request["cache_key"], result)
+    return result
+
+
+def prepare_ai_request(kpi_data, settings):
+    """Build the model payload and the request parameters from the settings."""
+    payload = build_ai_payload(
+        kpi_data,
+        anonymize_external_parties=cint(
+            settings.get("anonymize_external_parties", 1)
+        ),
+        include_issue_free_text=cint(
+            settings.get("include_issue_free_text", 0)
+        ),
+    )
+    payload_json = json.dumps(
+        payload,
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    request = {
+        "payload": payload,
+        "payload_json": payload_json,
+        "payload_sha256": hashlib.sha256(payload_json.encode("utf-8")).hexdigest(),
+        "model": settings.get("ai_model") or DEFAULT_MODEL,
+        "reasoning_effort": settings.get("ai_reasoning_effort") or "medium",
+        "prompt_version": settings.get("ai_prompt_version") or DEFAULT_PROMPT_VERSION,
+        "timeout": max(cint(settings.get("ai_timeout_seconds")) or 120, 15),
+        "max_insights": min(max(cint(settings.get("ai_max_insights")) or 8, 1), 15),
+        "minimum_confidence": min(
+            max(flt(settings.get("ai_minimum_confidence")) / 100.0, 0),
+            1,
+        ),
+    }
+    request["cache_key"] = "{0}:{1}".format(
+        AI_CACHE_KEY_PREFIX,
+        hashlib.sha256(
+            json.dumps(
+                [
+                    request["payload_sha256"],
+                    request["model"],
+                    request["prompt_version"],
+                    request["reasoning_effort"],
+                    request["max_insights"],
+                    request["minimum_confidence"],
+                ]
+            ).encode("utf-8")
+        ).hexdigest(),
+    )
+    return request
+
+
+def get_cached_ai_insights(kpi_data, settings):
+    """Return the cached insight result for this snapshot and settings, or None."""
+    return get_cached_ai_result(prepare_ai_request(kpi_data, settings)["cache_key"])
+
+
+def get_cached_ai_result(cache_key):
+    result = frappe.cache().get_value(cache_key)
+    if not result:
+        return None
+    result = deepcopy(result)
+    result["cache_hit"] = 1
+    return result
+
+
+def store_cached_ai_result(cache_key, result):
+    frappe.cache().set_value(
+        cache_key,
+        result,
+        expires_in_sec=AI_CACHE_EXPIRY_SECONDS,
+    )
 
 
 def load_ai_dependencies():
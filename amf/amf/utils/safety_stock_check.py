@@ -368,6 +368,13 @@ from frappe.core.doctype.communication.email import make
 from frappe.utils import cstr, get_datetime
 from amf.amf.utils.stock_entry import _get_or_create_log, update_log_entry
 from amf.amf.utils.stock_entry import now_datetime
+from amf.amf.utils.log_buffer import log_buffer
+from amf.amf.doctype.item_daily_outflow.item_daily_outflow import (
+    get_sle_daily_outflow_rows,
+    get_stored_daily_outflow_rows,
+    reconcile_item_daily_outflows,
+    store_covers,
+)
 
 # Constants
 SERVICE_LEVEL_Z = 1.64  # Z-score for 95% service level
@@ -377,13 +384,7 @@ EXCLUDED_WAREHOUSES = ["AMF_OLD", "Scrap - AMF21", "R&D - AMF21"]
 DEMAND_LOOKBACK_DAYS = 365
 DEMAND_MONTH_DAYS = 30.0
 QUERY_CHUNK_SIZE = 100
-DEMAND_VOUCHER_TYPES = ("Delivery Note", "Sales Invoice")
-DEMAND_STOCK_ENTRY_PURPOSES = (
-    "Manufacture",
-    "Material Consumption for Manufacture",
-    "Material Issue",
-    "Repack",
-)
+DEMAND_RECONCILE_DAYS = 35
 DEMAND_OUTLIER_MIN_NON_ZERO_DAYS = 8
 LEAD_TIME_FALLBACK_STD_DEV_RATIO = 0.25
 LEAD_TIME_SAMPLE_LIMIT = 50
@@ -401,135 +402,161 @@ doc = frappe._dict({
 log_id = _get_or_create_log(doc)
 
 @frappe.whitelist()
-def check_stock_levels(test_mode=0, dry_run=0, send_email=1, recompute_lead_time=0, verbose_log=0):
+def check_stock_levels(test_mode=0, dry_run=0, send_email=1, recompute_lead_time=0, verbose_log=0, bulk_update=1):
     """
     Main entry: calculate safety stocks, reorder levels and flag items for reorder.
-    """
-    test_mode = _is_truthy(test_mode)
-    dry_run = _is_truthy(dry_run)
-    send_email = _is_truthy(send_email)
-    recompute_lead_time = _is_truthy(recompute_lead_time)
-    verbose_log = _is_truthy(verbose_log)
 
-    # Update purchase status - no doc context for top-level, so omitted logging
+    With bulk_update (default) only changed items are written, in chunked
+    multi-row UPDATE statements; otherwise every item is written one by one.
+    """
+    with log_buffer():
+        test_mode = _is_truthy(test_mode)
+        dry_run = _is_truthy(dry_run)
+        bulk_update = _is_truthy(bulk_update)
+        send_email = _is_truthy(send_email)
+        recompute_lead_time = _is_truthy(recompute_lead_time)
+        verbose_log = _is_truthy(verbose_log)
+
+        # Update purchase status - no doc context for top-level, so omitted logging
     
     
-    # update_item_purchase_status(test_mode, log_id)
+        # update_item_purchase_status(test_mode, log_id)
 
-    items = _get_items(test_mode)
-    demand_profiles = _get_demand_profiles_for_items(items)
-    stock_positions = _get_stock_positions_for_items([item.name for item in items])
-    to_notify = []
-    result = {
-        "dry_run": dry_run,
-        "items_checked": len(items),
-        "items_with_demand": 0,
-        "items_to_reorder": 0,
-        "items_updated": 0,
-        "changes": [],
-    }
+        items = _get_items(test_mode)
+        lead_time_history = _get_lead_time_history_for_items(items) if recompute_lead_time else None
+        lead_times = [
+            _get_item_lead_time_stats(item, recompute_history=recompute_lead_time, history=lead_time_history)
+            for item in items
+        ]
+        demand_matrix = _get_demand_matrix_for_items(items)
+        safety_stocks, reorder_levels = _compute_safety_and_reorder_for_matrix(
+            demand_matrix.adjusted,
+            demand_matrix.history_days,
+            [lead_time.avg_days for lead_time in lead_times],
+            [lead_time.std_days for lead_time in lead_times],
+        )
+        stock_positions = _get_stock_positions_for_items([item.name for item in items])
+        to_notify = []
+        result = {
+            "dry_run": dry_run,
+            "items_checked": len(items),
+            "items_with_demand": 0,
+            "items_to_reorder": 0,
+            "items_updated": 0,
+            "rows_written": 0,
+            "changes": [],
+        }
+        pending_updates = []
 
-    for item in items:
-        # Initialize log for this Item
-        
-        _stock_check_log(verbose_log, f"[{now_datetime()}] check_stock_levels start for Item {item.name}")
+        for index, item in enumerate(items):
+            # Initialize log for this Item
 
-        lead_time = _get_item_lead_time_stats(item, recompute_history=recompute_lead_time)
-        _stock_check_log(
-            verbose_log,
-            f"[{now_datetime()}] Lead time stats: source={lead_time.source}, "
-            f"avg_lt={lead_time.avg_days}, std_lt={lead_time.std_days}"
-        )
+            _stock_check_log(verbose_log, f"[{now_datetime()}] check_stock_levels start for Item {item.name}")
 
-        # Demand data
-        demand = demand_profiles.get(item.name) or _empty_demand_profile()
-        if demand.annual_outflow:
-            result["items_with_demand"] += 1
-
-        avg_monthly = math.ceil(demand.average_monthly_outflow)
-        annual = math.ceil(demand.annual_outflow)
-        _stock_check_log(
-            verbose_log,
-            f"[{now_datetime()}] Demand: avg_monthly={avg_monthly}, annual={annual}, "
-            f"history_days={demand.history_days}, demand_days={demand.demand_days}"
-        )
+            lead_time = lead_times[index]
+            _stock_check_log(
+                verbose_log,
+                f"[{now_datetime()}] Lead time stats: source={lead_time.source}, "
+                f"avg_lt={lead_time.avg_days}, std_lt={lead_time.std_days}"
+            )
 
-        # Safety stock & reorder level
-        ss, ro = _compute_safety_and_reorder(
-            demand.daily_outflows,
-            lead_time.avg_days,
-            lead_time.std_days,
-        )
-        _stock_check_log(verbose_log, f"[{now_datetime()}] Calculated safety_stock={ss}, reorder_level={ro}")
-
-        # Stock evaluation
-        stock_position = stock_positions.get(item.name) or _empty_stock_position()
-        _stock_check_log(
-            verbose_log,
-            f"[{now_datetime()}] Stock position actual={stock_position.actual_qty}, "
-            f"projected={stock_position.projected_qty}"
-        )
-        needs_reorder = stock_position.projected_qty < ro
-        if needs_reorder:
-            result["items_to_reorder"] += 1
-
-        old_values = {
-            "average_monthly_outflow": item.average_monthly_outflow,
-            "annual_outflow": item.annual_outflow,
-            "safety_stock": item.safety_stock,
-            "reorder_level": item.reorder_level,
-            "lead_time_days": item.lead_time_days,
-            "reorder": item.reorder,
-        }
-        new_values = {
-            "average_monthly_outflow": avg_monthly,
-            "annual_outflow": annual,
-            "safety_stock": ss,
-            "reorder_level": ro,
-            "lead_time_days": int(math.ceil(lead_time.avg_days or 0)),
-            "reorder": int(needs_reorder),
-        }
+            # Demand data
+            demand = _get_demand_matrix_row(demand_matrix, index)
+            if demand.annual_outflow:
+                result["items_with_demand"] += 1
+
+            avg_monthly = math.ceil(demand.average_monthly_outflow)
+            annual = math.ceil(demand.annual_outflow)
+            _stock_check_log(
+                verbose_log,
+                f"[{now_datetime()}] Demand: avg_monthly={avg_monthly}, annual={annual}, "
+                f"history_days={demand.history_days}, demand_days={demand.demand_days}"
+            )
 
-        if _item_stock_fields_changed(old_values, new_values):
-            result["items_updated"] += 1
-            result["changes"].append({
-                "item_code": item.name,
-                "old": old_values,
-                "new": new_values,
-                "lead_time_source": lead_time.source,
-                "stock_actual_qty": stock_position.actual_qty,
-                "stock_projected_qty": stock_position.projected_qty,
-            })
+            # Safety stock & reorder level
+            ss, ro = safety_stocks[index], reorder_levels[index]
+            _stock_check_log(verbose_log, f"[{now_datetime()}] Calculated safety_stock={ss}, reorder_level={ro}")
 
-        if not dry_run:
-            _update_item(item.name, avg_monthly, annual, ss, ro, lead_time.avg_days)
-            frappe.db.set_value("Item", item.name, "reorder", int(needs_reorder))
-        _stock_check_log(verbose_log, f"[{now_datetime()}] Set reorder flag={int(needs_reorder)} for Item {item.name}")
-
-        if needs_reorder:
-            to_notify.append({
-                "code": item.name,
-                "name": item.item_name,
-                "stock": stock_position.actual_qty,
-                "avg_monthly": avg_monthly,
-                "ro": ro,
-                "ss": ss
-            })
-            _stock_check_log(verbose_log, f"[{now_datetime()}] Item {item.name} queued for notification")
+            # Stock evaluation
+            stock_position = stock_positions.get(item.name) or _empty_stock_position()
+            _stock_check_log(
+                verbose_log,
+                f"[{now_datetime()}] Stock position actual={stock_position.actual_qty}, "
+                f"projected={stock_position.projected_qty}"
+            )
+            needs_reorder = stock_position.projected_qty < ro
+            if needs_reorder:
+                result["items_to_reorder"] += 1
+
+            old_values = {
+                "average_monthly_outflow": item.average_monthly_outflow,
+                "annual_outflow": item.annual_outflow,
+                "safety_stock": item.safety_stock,
+                "reorder_level": item.reorder_level,
+                "lead_time_days": item.lead_time_days,
+                "reorder": item.reorder,
+            }
+            new_values = {
+                "average_monthly_outflow": avg_monthly,
+                "annual_outflow": annual,
+                "safety_stock": ss,
+                "reorder_level": ro,
+                "lead_time_days": int(math.ceil(lead_time.avg_days or 0)),
+                "reorder": int(needs_reorder),
+            }
+
+            item_changed = _item_stock_fields_changed(old_values, new_values)
+            if item_changed:
+                result["items_updated"] += 1
+                result["changes"].append({
+                    "item_code": item.name,
+                    "old": old_values,
+                    "new": new_values,
+                    "lead_time_source": lead_time.source,
+                    "stock_actual_qty": stock_position.actual_qty,
+                    "stock_projected_qty": stock_position.projected_qty,
+                })
+
+            if not dry_run and not bulk_update:
+                _update_item(item.name, avg_monthly, annual, ss, ro, lead_time.avg_days)
+                frappe.db.set_value("Item", item.name, "reorder", int(needs_reorder))
+                result["rows_written"] += 1
+            elif not dry_run and item_changed:
+                # Unchanged items need no write at all; changed ones are flushed in chunks below.
+                pending_updates.append((item.name, new_values))
+            _stock_check_log(verbose_log, f"[{now_datetime()}] Set reorder flag={int(needs_reorder)} for Item {item.name}")
+
+            if needs_reorder:
+                to_notify.append({
+                    "code": item.name,
+                    "name": item.item_name,
+                    "stock": stock_position.actual_qty,
+                    "avg_monthly": avg_monthly,
+                    "ro": ro,
+                    "ss": ss
+                })
+                _stock_check_log(verbose_log, f"[{now_datetime()}] Item {item.name} queued for notification")
+
+        if pending_updates:
+            result["rows_written"] += _bulk_update_items(pending_updates)
 
-    if not dry_run:
-        frappe.db.commit()
+        if not dry_run:
+            frappe.db.commit()
 
-    if to_notify and not test_mode and send_email and not dry_run:
-        _stock_check_log(verbose_log, f"[{now_datetime()}] Sending notifications to recipients")
-        _send_notifications(to_notify)
-        _stock_check_log(verbose_log, f"[{now_datetime()}] Notifications sent")
+        if to_notify and not test_mode and send_email and not dry_run:
+            _stock_check_log(verbose_log, f"[{now_datetime()}] Sending notifications to recipients")
+            _send_notifications(to_notify)
+            _stock_check_log(verbose_log, f"[{now_datetime()}] Notifications sent")
 
-    return result
+        return result
 
 
 def run_weekly_stock_level_update():
     """Scheduled weekly refresh of safety stock, reorder levels, and reorder flags."""
+    # Cheap safety net for the incremental outflow store: rebuild the recent window only.
+    reconcile_item_daily_outflows(
+        from_date=datetime.now().date() - timedelta(days=DEMAND_RECONCILE_DAYS - 1),
+    )
     return check_stock_levels(
         dry_run=0,
         send_email=0,
@@ -566,8 +593,9 @@ def update_purchase_item_lead_times(dry_run=0, item_code=None):
         "changes": [],
     }
 
+    rows_by_item = _get_purchase_item_lead_time_rows_for_items([item.name for item in items])
     for item in items:
-        update_result = _refresh_purchase_item_lead_time(item.name, dry_run=dry_run)
+        update_result = _apply_purchase_item_lead_time(item, rows_by_item.get(item.name, []), dry_run=dry_run)
         _merge_lead_time_update_result(result, update_result)
 
     if not dry_run:
@@ -609,8 +637,9 @@ def update_manufactured_item_lead_times(dry_run=0, item_code=None):
         "changes": [],
     }
 
+    rows_by_item = _get_manufactured_item_lead_time_rows_for_items([item.name for item in items])
     for item in items:
-        update_result = _refresh_manufactured_item_lead_time(item.name, dry_run=dry_run)
+        update_result = _apply_manufactured_item_lead_time(item, rows_by_item.get(item.name, []), dry_run=dry_run)
         _merge_lead_time_update_result(result, update_result)
 
     if not dry_run:
@@ -650,17 +679,29 @@ def _chunked(values, chunk_size=QUERY_CHUNK_SIZE):
         yield values[index:index + chunk_size]
 
 
-def _get_item_lead_time_stats(item, recompute_history=False):
+def _get_item_lead_time_stats(item, recompute_history=False, history=None):
+    """
+    Lead time mean/std for an item. history is the optional prefetched output of
+    _get_lead_time_history_for_items; without it each item queries its own samples.
+    """
     avg_lt = None
     std_lt = None
     source = None
 
     if recompute_history:
         if item.is_purchase_item:
-            avg_lt, std_lt = _calc_lead_time(item.name)
+            if history is not None:
+                rows = history.purchase.get(item.name, [])
+                avg_lt, std_lt = _purchase_lead_time_from_rows(rows)
+            else:
+                avg_lt, std_lt = _calc_lead_time(item.name)
             source = "purchase_history"
         else:
-            avg_lt, std_lt, _context = _calc_manufactured_lead_time(item.name)
+            if history is not None:
+                rows = history.manufactured.get(item.name, [])
+                avg_lt, std_lt, _context = _manufactured_lead_time_from_rows(rows)
+            else:
+                avg_lt, std_lt, _context = _calc_manufactured_lead_time(item.name)
             source = "manufacturing_history"
 
     if avg_lt is None:
@@ -675,6 +716,18 @@ def _get_item_lead_time_stats(item, recompute_history=False):
     })
 
 
+def _get_lead_time_history_for_items(items):
+    """Prefetch lead time samples for all items: purchase history or production history."""
+    return frappe._dict({
+        "purchase": _get_purchase_item_lead_time_rows_for_items(
+            [item.name for item in items if item.is_purchase_item]
+        ),
+        "manufactured": _get_manufactured_item_lead_time_rows_for_items(
+            [item.name for item in items if not item.is_purchase_item]
+        ),
+    })
+
+
 def _get_fallback_lead_time_std_dev(avg_lead_time):
     avg_lead_time = float(avg_lead_time or 0)
     if avg_lead_time <= 0:
@@ -760,7 +813,11 @@ def _refresh_purchase_item_lead_time(item_code, dry_run=False):
     if not item or not item.is_purchase_item or item.disabled:
         return {"status": "skipped"}
 
-    avg_lt, _std_lt = _calc_lead_time(item.name)
+    return _apply_purchase_item_lead_time(item, _get_purchase_item_lead_time_rows(item.name), dry_run=dry_run)
+
+
+def _apply_purchase_item_lead_time(item, rows, dry_run=False):
+    avg_lt, _std_lt = _purchase_lead_time_from_rows(rows)
     if avg_lt is None:
         return {"status": "without_history"}
 
@@ -782,7 +839,15 @@ def _refresh_manufactured_item_lead_time(item_code, dry_run=False):
     if not item or not item.is_stock_item or item.is_purchase_item or item.disabled:
         return {"status": "skipped"}
 
-    avg_lt, _std_lt, lead_time_context = _calc_manufactured_lead_time(item.name)
+    return _apply_manufactured_item_lead_time(
+        item,
+        _get_manufactured_item_lead_time_rows(item.name),
+        dry_run=dry_run,
+    )
+
+
+def _apply_manufactured_item_lead_time(item, rows, dry_run=False):
+    avg_lt, _std_lt, lead_time_context = _manufactured_lead_time_from_rows(rows)
     if avg_lt is None:
         return {"status": "without_history"}
 
@@ -866,7 +931,10 @@ def _calc_lead_time(item_code: str) -> tuple[Optional[float], Optional[float]]:
     Required By / schedule_date is deliberately not used here because it measures
     whether the supplier was early or late against a promise, not actual lead time.
     """
-    rows = _get_purchase_item_lead_time_rows(item_code)
+    return _purchase_lead_time_from_rows(_get_purchase_item_lead_time_rows(item_code))
+
+
+def _purchase_lead_time_from_rows(rows):
     if not rows:
         return None, None
 
@@ -880,42 +948,65 @@ def _calc_lead_time(item_code: str) -> tuple[Optional[float], Optional[float]]:
 
 
 def _get_purchase_item_lead_time_rows(item_code: str, limit: int = LEAD_TIME_SAMPLE_LIMIT):
-    return frappe.db.sql(
-        """
-        SELECT
-            DATEDIFF(pr.posting_date, po.transaction_date) AS lt,
-            COALESCE(NULLIF(pri.stock_qty, 0), pri.qty, 1) AS received_stock_qty,
-            po.name AS purchase_order,
-            pr.name AS purchase_receipt,
-            po.transaction_date AS order_date,
-            pr.posting_date AS receipt_date
-        FROM `tabPurchase Receipt Item` pri
-        INNER JOIN `tabPurchase Receipt` pr ON pr.name = pri.parent
-        INNER JOIN `tabPurchase Order Item` poi ON poi.name = pri.purchase_order_item
-        INNER JOIN `tabPurchase Order` po ON po.name = poi.parent
-        INNER JOIN `tabItem` item ON item.name = pri.item_code
-        WHERE pri.item_code = %s
-            AND poi.item_code = pri.item_code
-            AND item.is_purchase_item = 1
-            AND item.disabled = 0
-            AND pri.docstatus = 1
-            AND pr.docstatus = 1
-            AND po.docstatus = 1
-            AND IFNULL(pr.is_return, 0) = 0
-            AND COALESCE(NULLIF(pri.stock_qty, 0), pri.qty, 0) > 0
-            AND po.transaction_date IS NOT NULL
-            AND pr.posting_date IS NOT NULL
-            AND DATEDIFF(pr.posting_date, po.transaction_date) >= 0
-        ORDER BY pr.posting_date DESC, pr.posting_time DESC, pr.name DESC
-        LIMIT %s
-        """,
-        (item_code, limit),
-        as_dict=True,
-    )
+    return _get_purchase_item_lead_time_rows_for_items([item_code], limit).get(item_code, [])
+
+
+def _get_purchase_item_lead_time_rows_for_items(item_codes, limit: int = LEAD_TIME_SAMPLE_LIMIT):
+    """Last `limit` PO -> PREC samples per item, fetched with one windowed query per chunk."""
+    rows_by_item = {}
+    for item_code_chunk in _chunked(list(item_codes)):
+        item_placeholders = ",".join(["%s"] * len(item_code_chunk))
+        rows = frappe.db.sql(
+            f"""
+            SELECT *
+            FROM (
+                SELECT
+                    pri.item_code,
+                    DATEDIFF(pr.posting_date, po.transaction_date) AS lt,
+                    COALESCE(NULLIF(pri.stock_qty, 0), pri.qty, 1) AS received_stock_qty,
+                    po.name AS purchase_order,
+                    pr.name AS purchase_receipt,
+                    po.transaction_date AS order_date,
+                    pr.posting_date AS receipt_date,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY pri.item_code
+                        ORDER BY pr.posting_date DESC, pr.posting_time DESC, pr.name DESC
+                    ) AS sample_rank
+                FROM `tabPurchase Receipt Item` pri
+                INNER JOIN `tabPurchase Receipt` pr ON pr.name = pri.parent
+                INNER JOIN `tabPurchase Order Item` poi ON poi.name = pri.purchase_order_item
+                INNER JOIN `tabPurchase Order` po ON po.name = poi.parent
+                INNER JOIN `tabItem` item ON item.name = pri.item_code
+                WHERE pri.item_code IN ({item_placeholders})
+                    AND poi.item_code = pri.item_code
+                    AND item.is_purchase_item = 1
+                    AND item.disabled = 0
+                    AND pri.docstatus = 1
+                    AND pr.docstatus = 1
+                    AND po.docstatus = 1
+                    AND IFNULL(pr.is_return, 0) = 0
+                    AND COALESCE(NULLIF(pri.stock_qty, 0), pri.qty, 0) > 0
+                    AND po.transaction_date IS NOT NULL
+                    AND pr.posting_date IS NOT NULL
+                    AND DATEDIFF(pr.posting_date, po.transaction_date) >= 0
+            ) samples
+            WHERE samples.sample_rank <= %s
+            ORDER BY samples.item_code, samples.sample_rank
+            """,
+            tuple(list(item_code_chunk) + [limit]),
+            as_dict=True,
+        )
+        for row in rows:
+            rows_by_item.setdefault(row.item_code, []).append(row)
+
+    return rows_by_item
 
 
 def _calc_manufactured_lead_time(item_code: str):
-    rows = _get_manufactured_item_lead_time_rows(item_code)
+    return _manufactured_lead_time_from_rows(_get_manufactured_item_lead_time_rows(item_code))
+
+
+def _manufactured_lead_time_from_rows(rows):
     observations = []
 
     for row in rows:
@@ -963,67 +1054,90 @@ def _calc_manufactured_lead_time(item_code: str):
 
 
 def _get_manufactured_item_lead_time_rows(item_code: str, limit: int = LEAD_TIME_SAMPLE_LIMIT):
+    return _get_manufactured_item_lead_time_rows_for_items([item_code], limit).get(item_code, [])
+
+
+def _get_manufactured_item_lead_time_rows_for_items(item_codes, limit: int = LEAD_TIME_SAMPLE_LIMIT):
+    """Last `limit` Manufacture Stock Entries per produced item, one windowed query per chunk."""
+    rows_by_item = {}
+    for item_code_chunk in _chunked(list(item_codes)):
+        rows = _query_manufactured_item_lead_time_rows(item_code_chunk, limit)
+        for row in rows:
+            rows_by_item.setdefault(row.item_code, []).append(row)
+
+    return rows_by_item
+
+
+def _query_manufactured_item_lead_time_rows(item_codes, limit):
+    item_placeholders = ",".join(["%s"] * len(item_codes))
     return frappe.db.sql(
-        """
-        SELECT
-            se.name AS stock_entry,
-            se.posting_date,
-            se.posting_time,
-            se.fg_completed_qty AS completed_qty,
-            wo.name AS work_order,
-            wo.production_item AS item_code,
-            p_stock_entry.planning_start AS planning_stock_entry_start,
-            p_work_order.planning_start AS planning_work_order_start,
-            timer.timer_start AS timer_start,
-            wo.start_datetime AS work_order_start_datetime,
-            wo.start_date_time AS work_order_start_date_time,
-            wo.actual_start_date AS work_order_actual_start_date,
-            wo.planned_start_date AS work_order_planned_start_date,
-            wo.creation AS work_order_creation
-        FROM `tabStock Entry` se
-        INNER JOIN `tabWork Order` wo ON wo.name = se.work_order
-        INNER JOIN `tabItem` item ON item.name = wo.production_item
-        LEFT JOIN (
-            SELECT
-                stock_entry,
-                MIN(date_de_debut) AS planning_start
-            FROM `tabPlanning`
-            WHERE docstatus < 2
-                AND IFNULL(stock_entry, "") != ""
-            GROUP BY stock_entry
-        ) p_stock_entry ON p_stock_entry.stock_entry = se.name
-        LEFT JOIN (
+        f"""
+        SELECT *
+        FROM (
             SELECT
-                work_order,
-                MIN(date_de_debut) AS planning_start
-            FROM `tabPlanning`
-            WHERE docstatus < 2
-                AND IFNULL(work_order, "") != ""
-            GROUP BY work_order
-        ) p_work_order ON p_work_order.work_order = wo.name
-        LEFT JOIN (
-            SELECT
-                tp.work_order,
-                MIN(wott.start_time) AS timer_start
-            FROM `tabTimer Production` tp
-            INNER JOIN `tabWork Order Timer Table` wott ON wott.parent = tp.name
-            WHERE IFNULL(tp.work_order, "") != ""
-                AND wott.start_time IS NOT NULL
-            GROUP BY tp.work_order
-        ) timer ON timer.work_order = wo.name
-        WHERE wo.production_item = %s
-            AND item.is_stock_item = 1
-            AND item.is_purchase_item = 0
-            AND item.disabled = 0
-            AND se.docstatus = 1
-            AND se.purpose = "Manufacture"
-            AND IFNULL(se.work_order, "") != ""
-            AND IFNULL(se.fg_completed_qty, 0) > 0
-            AND se.posting_date IS NOT NULL
-        ORDER BY se.posting_date DESC, se.posting_time DESC, se.name DESC
-        LIMIT %s
+                se.name AS stock_entry,
+                se.posting_date,
+                se.posting_time,
+                se.fg_completed_qty AS completed_qty,
+                wo.name AS work_order,
+                wo.production_item AS item_code,
+                p_stock_entry.planning_start AS planning_stock_entry_start,
+                p_work_order.planning_start AS planning_work_order_start,
+                timer.timer_start AS timer_start,
+                wo.start_datetime AS work_order_start_datetime,
+                wo.start_date_time AS work_order_start_date_time,
+                wo.actual_start_date AS work_order_actual_start_date,
+                wo.planned_start_date AS work_order_planned_start_date,
+                wo.creation AS work_order_creation,
+                ROW_NUMBER() OVER (
+                    PARTITION BY wo.production_item
+                    ORDER BY se.posting_date DESC, se.posting_time DESC, se.name DESC
+                ) AS sample_rank
+            FROM `tabStock Entry` se
+            INNER JOIN `tabWork Order` wo ON wo.name = se.work_order
+            INNER JOIN `tabItem` item ON item.name = wo.production_item
+            LEFT JOIN (
+                SELECT
+                    stock_entry,
+                    MIN(date_de_debut) AS planning_start
+                FROM `tabPlanning`
+                WHERE docstatus < 2
+                    AND IFNULL(stock_entry, "") != ""
+                GROUP BY stock_entry
+            ) p_stock_entry ON p_stock_entry.stock_entry = se.name
+            LEFT JOIN (
+                SELECT
+                    work_order,
+                    MIN(date_de_debut) AS planning_start
+                FROM `tabPlanning`
+                WHERE docstatus < 2
+                    AND IFNULL(work_order, "") != ""
+                GROUP BY work_order
+            ) p_work_order ON p_work_order.work_order = wo.name
+            LEFT JOIN (
+                SELECT
+                    tp.work_order,
+                    MIN(wott.start_time) AS timer_start
+                FROM `tabTimer Production` tp
+                INNER JOIN `tabWork Order Timer Table` wott ON wott.parent = tp.name
+                WHERE IFNULL(tp.work_order, "") != ""
+                    AND wott.start_time IS NOT NULL
+                GROUP BY tp.work_order
+            ) timer ON timer.work_order = wo.name
+            WHERE wo.production_item IN ({item_placeholders})
+                AND item.is_stock_item = 1
+                AND item.is_purchase_item = 0
+                AND item.disabled = 0
+                AND se.docstatus = 1
+                AND se.purpose = "Manufacture"
+                AND IFNULL(se.work_order, "") != ""
+                AND IFNULL(se.fg_completed_qty, 0) > 0
+                AND se.posting_date IS NOT NULL
+        ) samples
+        WHERE samples.sample_rank <= %s
+        ORDER BY samples.item_code, samples.sample_rank
         """,
-        (item_code, limit),
+        tuple(list(item_codes) + [limit]),
         as_dict=True,
     )
 
@@ -1237,42 +1351,19 @@ def _get_daily_outflow_map(item_code: str, start_date, end_date):
 
 
 def _get_daily_outflow_rows(item_codes, start_date, end_date):
+    """
+    Daily demand outflow rows (item_code, posting_date, qty) for the given items.
+
+    Reads the pre-aggregated Item Daily Outflow store once it has been back-filled
+    for the requested window, otherwise falls back to aggregating the Stock Ledger.
+    """
     if not item_codes:
         return []
 
-    item_placeholders = ",".join(["%s"] * len(item_codes))
-    voucher_placeholders = ",".join(["%s"] * len(DEMAND_VOUCHER_TYPES))
-    stock_entry_purpose_placeholders = ",".join(["%s"] * len(DEMAND_STOCK_ENTRY_PURPOSES))
-    query = f"""
-        SELECT
-            sle.item_code,
-            sle.posting_date,
-            COALESCE(-SUM(sle.actual_qty), 0) AS qty
-        FROM `tabStock Ledger Entry` sle
-        LEFT JOIN `tabStock Entry` se
-            ON se.name = sle.voucher_no
-            AND sle.voucher_type = 'Stock Entry'
-        WHERE sle.item_code IN ({item_placeholders})
-            AND sle.actual_qty < 0
-            AND IFNULL(sle.is_cancelled, 'No') = 'No'
-            AND sle.posting_date >= %s
-            AND sle.posting_date <= %s
-            AND (
-                sle.voucher_type IN ({voucher_placeholders})
-                OR (
-                    sle.voucher_type = 'Stock Entry'
-                    AND se.purpose IN ({stock_entry_purpose_placeholders})
-                )
-            )
-        GROUP BY sle.item_code, sle.posting_date
-    """
-    args = (
-        list(item_codes)
-        + [start_date, end_date]
-        + list(DEMAND_VOUCHER_TYPES)
-        + list(DEMAND_STOCK_ENTRY_PURPOSES)
-    )
-    return frappe.db.sql(query, tuple(args), as_dict=True)
+    if store_covers(start_date):
+        return get_stored_daily_outflow_rows(item_codes, start_date, end_date)
+
+    return get_sle_daily_outflow_rows(list(item_codes), start_date, end_date)
 
 
 def _fill_daily_outflows(demand_by_day, start_date, end_date):
@@ -1300,6 +1391,142 @@ def _winsorize_daily_outflows(daily_outflows):
     ]
 
 
+# --- Batched demand engine ---
+# Array-backed equivalent of _get_demand_profiles_for_items/_build_demand_profile:
+# one row per item, one column per day, right-aligned on the common end date.
+# Days before an item's own window start are NaN so every reduction below sees
+# exactly the same values as the per-item list path.
+
+def _get_demand_matrix_for_items(items):
+    if not items:
+        return _build_outflow_matrix([], {}, [])
+
+    windows = {
+        item.name: _get_demand_window(item.creation)
+        for item in items
+    }
+    min_start_date = min(start_date for start_date, _end_date in windows.values())
+    max_end_date = max(end_date for _start_date, end_date in windows.values())
+    item_codes = [item.name for item in items]
+    rows = []
+
+    for item_code_chunk in _chunked(item_codes):
+        rows.extend(_get_daily_outflow_rows(item_code_chunk, min_start_date, max_end_date))
+
+    return _build_outflow_matrix(item_codes, windows, rows)
+
+
+def _build_outflow_matrix(item_codes, windows, rows):
+    """
+    Build the (items x days) outflow matrix and its per-item demand statistics.
+
+    Args:
+        item_codes (list): Item codes, defines the row order.
+        windows (dict): item_code -> (start_date, end_date) as from _get_demand_window.
+        rows (list): Daily outflow rows with item_code, posting_date and qty.
+
+    Returns:
+        frappe._dict: raw and winsorized matrices plus history/demand day counts,
+        annual and average monthly outflow arrays aligned with item_codes.
+    """
+    item_count = len(item_codes)
+    if not item_count:
+        empty = np.zeros(0)
+        return frappe._dict({
+            "item_codes": [],
+            "end_date": None,
+            "raw": np.zeros((0, 0)),
+            "adjusted": np.zeros((0, 0)),
+            "history_days": empty.astype(int),
+            "demand_days": empty.astype(int),
+            "annual_outflow": empty,
+            "average_monthly_outflow": empty,
+        })
+
+    end_date = max(end for _start, end in windows.values())
+    offsets = np.array([(end_date - windows[code][1]).days for code in item_codes], dtype=int)
+    history_days = np.array(
+        [(windows[code][1] - windows[code][0]).days + 1 for code in item_codes],
+        dtype=int,
+    )
+    day_count = int((history_days + offsets).max())
+    columns = np.arange(day_count)
+    first_columns = day_count - offsets - history_days
+    last_columns = day_count - offsets - 1
+    in_window = (columns >= first_columns[:, None]) & (columns <= last_columns[:, None])
+    raw = np.where(in_window, 0.0, np.nan)
+
+    row_index = {code: index for index, code in enumerate(item_codes)}
+    target_rows = []
+    target_columns = []
+    quantities = []
+    for row in rows:
+        index = row_index.get(row.item_code)
+        posting_date = _as_datetime(row.posting_date)
+        if index is None or not posting_date:
+            continue
+
+        posting_date = posting_date.date()
+        start_date, window_end = windows[row.item_code]
+        if start_date <= posting_date <= window_end:
+            target_rows.append(index)
+            target_columns.append(day_count - 1 - (end_date - posting_date).days)
+            quantities.append(float(row.qty or 0))
+
+    if quantities:
+        raw[target_rows, target_columns] = quantities
+
+    annual_outflow = np.nansum(raw, axis=1)
+    return frappe._dict({
+        "item_codes": list(item_codes),
+        "end_date": end_date,
+        "raw": raw,
+        "adjusted": _winsorize_outflow_matrix(raw),
+        "history_days": history_days,
+        "demand_days": np.count_nonzero(raw > 0, axis=1),
+        "annual_outflow": annual_outflow,
+        "average_monthly_outflow": annual_outflow / history_days * DEMAND_MONTH_DAYS,
+    })
+
+
+def _winsorize_outflow_matrix(raw):
+    """Row-wise _winsorize_daily_outflows: cap each row at Q3 + 1.5 * IQR of its non-zero days."""
+    if not raw.size:
+        return raw.copy()
+
+    non_zero_days = np.count_nonzero(raw > 0, axis=1)
+    eligible = np.flatnonzero(non_zero_days >= DEMAND_OUTLIER_MIN_NON_ZERO_DAYS)
+    if not len(eligible):
+        return raw.copy()
+
+    non_zero = np.where(raw[eligible] > 0, raw[eligible], np.nan)
+    q1, q3 = np.nanpercentile(non_zero, [25, 75], axis=1)
+    iqr = q3 - q1
+    clipped = eligible[iqr > 0]
+    if not len(clipped):
+        return raw.copy()
+
+    upper_fences = (q3 + 1.5 * iqr)[iqr > 0]
+    adjusted = raw.copy()
+    clipped_rows = raw[clipped]
+    adjusted[clipped] = np.where(
+        np.isnan(clipped_rows),
+        np.nan,
+        np.where(clipped_rows > 0, np.minimum(clipped_rows, upper_fences[:, None]), 0.0),
+    )
+    return adjusted
+
+
+def _get_demand_matrix_row(demand_matrix, index):
+    """Per-item view of a demand matrix row with the _build_demand_profile summary fields."""
+    return frappe._dict({
+        "history_days": int(demand_matrix.history_days[index]),
+        "demand_days": int(demand_matrix.demand_days[index]),
+        "annual_outflow": float(demand_matrix.annual_outflow[index]),
+        "average_monthly_outflow": float(demand_matrix.average_monthly_outflow[index]),
+    })
+
+
 def _get_monthly_outflows(item_code: str) -> list[int]:
     """Compatibility helper: return rolling 30-day demand buckets from the daily profile."""
     demand = _get_demand_profile(item_code)
@@ -1405,6 +1632,40 @@ def _compute_safety_and_reorder(daily_outflows: list[float], avg_lt: float, std_
     return math.ceil(ss), math.ceil(ro)
 
 
+def _compute_safety_and_reorder_for_matrix(daily_outflows, history_days, avg_lts, std_lts):
+    """
+    Batched _compute_safety_and_reorder over the rows of a (winsorized) outflow matrix.
+
+    Cells outside an item's demand window must be NaN. Returns two lists of ints
+    (safety stocks, reorder levels) aligned with the matrix rows.
+    """
+    item_count = len(history_days)
+    if not item_count:
+        return [], []
+
+    history_days = np.asarray(history_days, dtype=float)
+    avg_lts = np.maximum(0.0, np.nan_to_num(np.asarray(avg_lts, dtype=float)))
+    std_lts = np.maximum(0.0, np.nan_to_num(np.asarray(std_lts, dtype=float)))
+
+    totals = np.nansum(daily_outflows, axis=1)
+    daily_means = totals / history_days
+    squared_deviations = np.nansum((daily_outflows - daily_means[:, None]) ** 2, axis=1)
+    daily_stds = np.zeros(item_count)
+    has_variance = history_days > 1
+    daily_stds[has_variance] = np.sqrt(squared_deviations[has_variance] / (history_days[has_variance] - 1))
+
+    lead_time_demand = daily_means * avg_lts
+    var_term = np.maximum(0.0, (avg_lts * (daily_stds ** 2)) + ((daily_means ** 2) * (std_lts ** 2)))
+    safety_stocks = SERVICE_LEVEL_Z * np.sqrt(var_term)
+    reorder_levels = lead_time_demand + safety_stocks
+
+    has_demand = totals > 0
+    return (
+        [int(math.ceil(ss)) if demand else 0 for ss, demand in zip(safety_stocks, has_demand)],
+        [int(math.ceil(ro)) if demand else 0 for ro, demand in zip(reorder_levels, has_demand)],
+    )
+
+
 def _update_item(item_code: str, avg_month: int, annual: int, ss: int, ro: int, lt: float):
     frappe.db.set_value("Item", item_code, {
         "average_monthly_outflow": avg_month,
@@ -1414,6 +1675,47 @@ def _update_item(item_code: str, avg_month: int, annual: int, ss: int, ro: int,
         "lead_time_days": int(math.ceil(lt or 0))
     })
 
+
+def _bulk_update_items(updates, chunk_size=QUERY_CHUNK_SIZE):
+    """
+    Write (item_code, values) pairs with one multi-row UPDATE ... CASE per chunk.
+
+    All value dicts must share the same fieldnames. Returns the number of items written.
+    """
+    if not updates:
+        return 0
+
+    fieldnames = list(updates[0][1].keys())
+    timestamp = now_datetime()
+    written = 0
+
+    for chunk in _chunked(updates, chunk_size):
+        assignments = []
+        args = []
+        for fieldname in fieldnames:
+            assignments.append(
+                "`{0}` = CASE `name` {1} END".format(fieldname, " ".join(["WHEN %s THEN %s"] * len(chunk)))
+            )
+            for item_code, values in chunk:
+                args.extend([item_code, values[fieldname]])
+
+        args.extend([timestamp, frappe.session.user])
+        args.extend([item_code for item_code, _values in chunk])
+        frappe.db.sql(
+            """
+            UPDATE `tabItem`
+            SET {assignments}, `modified` = %s, `modified_by` = %s
+            WHERE `name` IN ({placeholders})
+            """.format(
+                assignments=", ".join(assignments),
+                placeholders=",".join(["%s"] * len(chunk)),
+            ),
+            tuple(args),
+        )
+        written += len(chunk)
+
+    return written
+
 # --- Purchase Item Status ---
 
 def update_item_purchase_status(test_mode: bool, log_id: str):
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, libracore AG and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+
+import json
+
+import frappe
+from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
+from frappe.utils import get_datetime, now_datetime
+
+from amf.amf.utils.sales_order_otif import SKIP_OTIF_KPI_FIELD
+
+
+SUBMITTED_AT_FIELD = "submitted_at"
+BACKFILL_CHUNK_SIZE = 500
+
+
+SALES_ORDER_SUBMIT_TIME_CUSTOM_FIELDS = {
+	"Sales Order": [
+		{
+			"fieldname": SUBMITTED_AT_FIELD,
+			"fieldtype": "Datetime",
+			"label": "Submitted At",
+			"insert_after": SKIP_OTIF_KPI_FIELD,
+			"description": "Time the Sales Order was submitted; used by the SO to DN lead time report.",
+			"read_only": 1,
+			"allow_on_submit": 1,
+			"no_copy": 1,
+			"print_hide": 1,
+			"search_index": 1,
+		},
+	]
+}
+
+
+def sync_sales_order_submit_time_custom_fields():
+	"""Install the Sales Order submit timestamp field."""
+	create_custom_fields(SALES_ORDER_SUBMIT_TIME_CUSTOM_FIELDS, update=True)
+
+
+def has_submitted_at_field():
+	return frappe.db.has_column("Sales Order", SUBMITTED_AT_FIELD)
+
+
+def set_sales_order_submitted_at(doc, method=None):
+	"""Sales Order on_submit: record the submit timestamp."""
+	if has_submitted_at_field():
+		doc.db_set(SUBMITTED_AT_FIELD, now_datetime(), update_modified=False)
+
+
+def backfill_sales_order_submitted_at():
+	"""
+	Fill submitted_at for submitted Sales Orders from their Version log.
+
+	Sales Orders without a docstatus 0 -> 1 Version row (imports, cleaned
+	history) stay empty; the report falls back to their transaction date.
+	"""
+	so_names = frappe.db.sql_list(
+		"""
+		SELECT name
+		FROM `tabSales Order`
+		WHERE docstatus = 1
+			AND {0} IS NULL
+		ORDER BY name
+		""".format(SUBMITTED_AT_FIELD)
+	)
+	updated = 0
+	for start in range(0, len(so_names), BACKFILL_CHUNK_SIZE):
+		submit_timestamps = get_submit_timestamps_from_versions(
+			so_names[start:start + BACKFILL_CHUNK_SIZE]
+		)
+		for so_name, submitted_at in submit_timestamps.items():
+			frappe.db.set_value(
+				"Sales Order",
+				so_name,
+				SUBMITTED_AT_FIELD,
+				submitted_at,
+				update_modified=False,
+			)
+		updated += len(submit_timestamps)
+		frappe.db.commit()
+	return {"sales_orders": len(so_names), "updated": updated}
+
+
+def get_submit_timestamps_from_versions(so_names):
+	"""
+	Find the submit timestamp per Sales Order by parsing Version rows where
+	docstatus transitioned to 1.
+	Version.data JSON in v12 contains a "changed" array like:
+	  [["docstatus", 0, 1], ["status", "Draft", "To Deliver"] ...]
+	Returns: dict {so_name: datetime_of_submit}
+	"""
+	if not so_names:
+		return {}
+
+	out = {}
+	version_rows = frappe.db.sql(
+		"""
+		SELECT docname, creation, data
+		FROM `tabVersion`
+		WHERE ref_doctype = 'Sales Order'
+			AND docname IN %(so_names)s
+			AND data LIKE '%%docstatus%%'
+		ORDER BY creation ASC
+		""",
+		{"so_names": tuple(so_names)},
+		as_dict=True,
+	)
+	for version in version_rows:
+		if version.docname in out:
+			continue
+		try:
+			payload = json.loads(version.data or "{}")
+		except Exception:
+			payload = {}
+
+		# changed entries are [fieldname, old_value, new_value]
+		for entry in payload.get("changed") or []:
+			if isinstance(entry, list) and len(entry) >= 3:
+				if entry[0] == "docstatus" and str(entry[2]) == "1":
+					out[version.docname] = get_datetime(version.creation)
+					break
+
+	return out
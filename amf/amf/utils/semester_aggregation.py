@@ -0,0 +1,322 @@
+"""
+Semester bucketing and pre-aggregated facts for the dashboard chart sources.
+
+The Supply Chain and Manufacturing dashboard charts are all bucketed by
+semester ("2026 S1"). The helpers below are shared by every chart source.
+
+Charts that aggregate large transaction tables read per-semester facts
+(OTIF counts, planning scrap, purchase amounts by currency, COGS by account)
+from `Semester KPI Fact` instead of the raw rows. Facts are only stored for
+closed semesters; the open semester and partially covered semesters are
+aggregated live from the same fact builder, so stored and live values always
+match.
+
+The facts of the last closed semesters are rebuilt every night. A full
+rebuild can be started with
+
+    bench --site <site> execute amf.amf.utils.semester_aggregation.refresh_semester_facts --kwargs "{'from_date': '2020-01-01'}"
+
+or from the desk through enqueue_semester_fact_refresh.
+"""
+
+from __future__ import unicode_literals
+
+import hashlib
+import json
+from collections import OrderedDict
+from functools import wraps
+
+import frappe
+from frappe import _
+from frappe.utils import cint, cstr, flt, getdate, today
+
+from amf.amf.doctype.semester_kpi_fact.semester_kpi_fact import (
+    get_stored_facts,
+    replace_semester_facts,
+)
+
+
+OTIF_FACT = "OTIF"
+PLANNING_SCRAP_FACT = "Planning Scrap"
+PURCHASE_AMOUNT_FACT = "Purchase Amount"
+COGS_FACT = "COGS"
+
+# Fact type -> builder(from_date, to_date, company) returning dicts with
+# year, semester, dimension, scope, value and total. per_company facts are
+# stored once per company, the others with an empty company.
+SEMESTER_FACT_BUILDERS = OrderedDict([
+    (OTIF_FACT, {
+        "method": "amf.amf.dashboard_chart_source.otif_by_semester.otif_by_semester.get_otif_facts",
+        "per_company": 0,
+    }),
+    (PLANNING_SCRAP_FACT, {
+        "method": "amf.amf.dashboard_chart_source.planning_scrap_rate.planning_scrap_rate.get_scrap_facts",
+        "per_company": 0,
+    }),
+    (PURCHASE_AMOUNT_FACT, {
+        "method": (
+            "amf.amf.dashboard_chart_source.purchasing_amount_by_currency."
+            "purchasing_amount_by_currency.get_purchase_amount_facts"
+        ),
+        "per_company": 1,
+    }),
+    (COGS_FACT, {
+        "method": "amf.amf.dashboard_chart_source.inventory_turnover_ratio.inventory_turnover_ratio.get_cogs_facts",
+        "per_company": 1,
+    }),
+])
+REFRESH_CLOSED_SEMESTERS = 2
+REBUILD_SEMESTER_COUNT = 8
+CHART_CACHE_KEY_PREFIX = "amf-semester-chart:"
+CHART_CACHE_EXPIRY_SECONDS = 24 * 60 * 60
+
+
+def get_semester(date):
+    date = getdate(date)
+    return date.year, 1 if date.month <= 6 else 2
+
+
+def add_semesters(year, semester, offset):
+    index = get_semester_index(year, semester) + offset
+    return index // 2, (index % 2) + 1
+
+
+def get_semester_index(year, semester):
+    return (cint(year) * 2) + (cint(semester) - 1)
+
+
+def get_semester_start(year, semester):
+    month = 1 if cint(semester) == 1 else 7
+    return getdate("{0}-{1:02d}-01".format(cint(year), month))
+
+
+def get_semester_end(year, semester):
+    month_day = "06-30" if cint(semester) == 1 else "12-31"
+    return getdate("{0}-{1}".format(cint(year), month_day))
+
+
+def get_semester_label(date):
+    return get_semester_label_from_parts(*get_semester(date))
+
+
+def get_semester_label_from_parts(year, semester):
+    return "{0} S{1}".format(cint(year), cint(semester))
+
+
+def iter_semesters(from_date, to_date):
+    year, semester = get_semester(from_date)
+    end_year, end_semester = get_semester(to_date)
+    end_index = get_semester_index(end_year, end_semester)
+
+    while get_semester_index(year, semester) <= end_index:
+        yield year, semester
+        year, semester = add_semesters(year, semester, 1)
+
+
+def get_default_from_date(to_date, semester_count):
+    """Return the start of the semester semester_count - 1 semesters before to_date."""
+    year, semester = get_semester(to_date)
+    start_year, start_semester = add_semesters(year, semester, -(cint(semester_count) - 1))
+    return get_semester_start(start_year, start_semester)
+
+
+def get_semester_buckets(from_date, to_date, get_values=None):
+    """
+    Return an OrderedDict {label: bucket} for every semester between from_date
+    and to_date. get_values(bucket) may return the chart specific fields of a
+    bucket.
+    """
+    buckets = OrderedDict()
+
+    for year, semester in iter_semesters(from_date, to_date):
+        label = get_semester_label_from_parts(year, semester)
+        bucket = {
+            "label": label,
+            "year": year,
+            "semester": semester,
+            "from_date": get_semester_start(year, semester),
+            "to_date": get_semester_end(year, semester),
+        }
+        if get_values:
+            bucket.update(get_values(bucket))
+        buckets[label] = bucket
+
+    return buckets
+
+
+def get_chart(chart_name=None, chart=None):
+    if chart_name:
+        return frappe.get_doc("Dashboard Chart", chart_name)
+
+    if hasattr(chart, "doctype"):
+        return chart
+
+    if isinstance(chart, dict):
+        return frappe._dict(chart)
+
+    return frappe._dict(frappe.parse_json(chart))
+
+
+def get_semester_facts(fact_type, from_date, to_date, company=None):
+    """
+    Return the facts of fact_type between from_date and to_date.
+
+    Closed semesters fully inside the range are read from Semester KPI Fact;
+    the open semester, partially covered semesters and semesters without
+    stored facts are built live for the covered dates only.
+    """
+    definition = get_fact_definition(fact_type)
+    company = cstr(company) if definition["per_company"] else ""
+    from_date = getdate(from_date)
+    to_date = getdate(to_date)
+    current_date = getdate(today())
+
+    stored = get_stored_facts(
+        fact_type,
+        company,
+        get_semester_index(*get_semester(from_date)),
+        get_semester_index(*get_semester(to_date)),
+    )
+    facts = []
+
+    for year, semester in iter_semesters(from_date, to_date):
+        semester_start = get_semester_start(year, semester)
+        semester_end = get_semester_end(year, semester)
+        is_covered = from_date <= semester_start and semester_end <= to_date
+        if is_covered and semester_end < current_date and (year, semester) in stored:
+            facts.extend(stored[(year, semester)])
+            continue
+
+        facts.extend(build_semester_facts(
+            fact_type,
+            max(semester_start, from_date),
+            min(semester_end, to_date),
+            company,
+        ))
+
+    return facts
+
+
+def build_semester_facts(fact_type, from_date, to_date, company=None):
+    builder = frappe.get_attr(get_fact_definition(fact_type)["method"])
+    return [
+        frappe._dict({
+            "year": cint(fact.get("year")),
+            "semester": cint(fact.get("semester")),
+            "dimension": fact.get("dimension") or "",
+            "scope": fact.get("scope") or "",
+            "value": flt(fact.get("value")),
+            "total": flt(fact.get("total")),
+        })
+        for fact in builder(from_date, to_date, company or None)
+    ]
+
+
+def get_fact_definition(fact_type):
+    definition = SEMESTER_FACT_BUILDERS.get(fact_type)
+    if not definition:
+        frappe.throw(_("Unknown semester fact type {0}").format(fact_type))
+    return definition
+
+
+def refresh_semester_facts(fact_types=None, from_date=None, to_date=None, semester_count=None):
+    """
+    Rebuild the stored facts of closed semesters.
+
+    Without from_date the last REFRESH_CLOSED_SEMESTERS closed semesters (or
+    semester_count of them) are rebuilt, which also picks up back-dated
+    documents. Runs nightly; returns the number of stored facts.
+    """
+    if isinstance(fact_types, str):
+        fact_types = frappe.parse_json(fact_types) if fact_types.startswith("[") else [fact_types]
+    fact_types = fact_types or list(SEMESTER_FACT_BUILDERS)
+
+    last_closed_year, last_closed_semester = add_semesters(*get_semester(today()), -1)
+    last_closed_end = get_semester_end(last_closed_year, last_closed_semester)
+    to_date = min(getdate(to_date), last_closed_end) if to_date else last_closed_end
+    if from_date:
+        from_date = getdate(from_date)
+    else:
+        from_date = get_default_from_date(last_closed_end, cint(semester_count) or REFRESH_CLOSED_SEMESTERS)
+
+    if from_date > to_date:
+        return 0
+
+    companies = frappe.db.sql_list("SELECT name FROM `tabCompany` ORDER BY name")
+    stored_count = 0
+
+    for fact_type in fact_types:
+        definition = get_fact_definition(fact_type)
+        for company in companies if definition["per_company"] else [""]:
+            for year, semester in iter_semesters(from_date, to_date):
+                facts = build_semester_facts(
+                    fact_type,
+                    get_semester_start(year, semester),
+                    get_semester_end(year, semester),
+                    company,
+                )
+                stored_count += replace_semester_facts(fact_type, company, year, semester, facts)
+                frappe.db.commit()
+
+    clear_semester_chart_cache()
+    return stored_count
+
+
+@frappe.whitelist()
+def enqueue_semester_fact_refresh(from_date=None, fact_types=None):
+    frappe.only_for("System Manager")
+    frappe.enqueue(
+        "amf.amf.utils.semester_aggregation.refresh_semester_facts",
+        queue="long",
+        timeout=3600,
+        fact_types=fact_types,
+        from_date=from_date,
+        semester_count=None if from_date else REBUILD_SEMESTER_COUNT,
+    )
+    return _("Semester KPI facts are being rebuilt in the background.")
+
+
+def cache_semester_chart(function):
+    """
+    Cache a chart source result per chart, filters and day.
+
+    Replaces frappe's cache_source, whose key is the chart name only: a chart
+    refreshed with other filters would otherwise return the previous result.
+    """
+    @wraps(function)
+    def wrapper(chart_name=None, chart=None, no_cache=None, refresh=None, **kwargs):
+        if no_cache:
+            return function(chart_name=chart_name, chart=chart, no_cache=no_cache)
+
+        chart = get_chart(chart_name, chart)
+        cache_key = get_chart_cache_key(chart.name, chart.get("filters_json"))
+        if not cint(refresh):
+            results = frappe.cache().get_value(cache_key)
+            if results:
+                return results
+
+        results = function(chart=chart)
+        frappe.cache().set_value(cache_key, results, expires_in_sec=CHART_CACHE_EXPIRY_SECONDS)
+        return results
+
+    return wrapper
+
+
+def get_chart_cache_key(chart_name, filters=None):
+    filters = frappe.parse_json(filters or "{}") if isinstance(filters, str) else (filters or {})
+    filters_hash = hashlib.md5(
+        json.dumps([filters, today()], sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    return "{0}{1}:{2}".format(CHART_CACHE_KEY_PREFIX, get_chart_name_hash(chart_name), filters_hash)
+
+
+def get_chart_name_hash(chart_name):
+    return hashlib.md5(cstr(chart_name).encode("utf-8")).hexdigest()
+
+
+def clear_semester_chart_cache(chart_name=None):
+    """Drop the cached results of one chart (all filters) or of all semester charts."""
+    prefix = CHART_CACHE_KEY_PREFIX
+    if chart_name:
+        prefix += get_chart_name_hash(chart_name) + ":"
+    frappe.cache().delete_keys(prefix)
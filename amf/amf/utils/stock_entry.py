@@ -5,6 +5,7 @@ import frappe
 from frappe import _, _dict
 from frappe.utils import flt, cint
 from amf.amf.utils.batch_naming import make_internal_production_batch_id
+from amf.amf.utils.log_buffer import append_log_message, buffered_log, flush_log_entries
 
 def batch_to_stock_entry(doc, method=None):
     print("Entering batch_to_stock_entry.")
@@ -204,6 +205,7 @@ COST_CENTER = "Automation - AMF21"
 
 # ——— Doc Event Hooks —————————————————
 
+@buffered_log
 def stock_entry_onload(doc, method):
     """
     Set auto-batch generation on load.
@@ -217,6 +219,7 @@ def stock_entry_onload(doc, method):
         update_log_entry(log_id, f"[{now_datetime()}] Onload: auto_batch flag set for {len(doc.items)} row(s)<br>")
 
 
+@buffered_log
 def stock_entry_validate(doc, method):
     """
     Apply defaults on Save & Submit.
@@ -233,6 +236,7 @@ def stock_entry_validate(doc, method):
         _set_warehouse_defaults(doc, log_id)
         update_log_entry(log_id, f"[{now_datetime()}] Validate: applied expense, cost center, warehouse defaults<br>")
 
+@buffered_log
 def stock_entry_before_save(doc, method):
     """
     Before Save:
@@ -255,6 +259,7 @@ def stock_entry_before_save(doc, method):
         # Retrieve log messages and display to user
         try:
             if log_id:
+                flush_log_entries(log_id)
                 log = frappe.get_doc("Log Entry", log_id)
                 # Show a popup with the log details
                 frappe.msgprint(
@@ -266,6 +271,7 @@ def stock_entry_before_save(doc, method):
             frappe.log_error(message=str(e), title="Error displaying changes popup")
     
 
+@buffered_log
 def stock_entry_before_submit(doc, method):
     """
     Main pipeline before submit:
@@ -318,6 +324,7 @@ def stock_entry_before_submit(doc, method):
         # Retrieve log messages and display to user
         try:
             if log_id:
+                flush_log_entries(log_id)
                 log = frappe.get_doc("Log Entry", log_id)
                 # Show a popup with the log details
                 frappe.msgprint(
@@ -677,15 +684,9 @@ def create_log_entry(message, category, name):
 def update_log_entry(log_id, message):
     """
     Append a message to an existing Log Entry.
+    Buffered inside hooks wrapped with buffered_log (see amf.amf.utils.log_buffer).
     """
-    if not log_id:
-        return
-    try:
-        log = frappe.get_doc("Log Entry", log_id)
-        log.message = (log.message or "") + "\n" + (message or "")
-        log.save(ignore_permissions=True)
-    except Exception:
-        frappe.log_error(frappe.get_traceback(), "Unable to update Stock Entry Log Entry")
+    append_log_message(log_id, message)
 
 
 def custom_try(func, *args, **kwargs):
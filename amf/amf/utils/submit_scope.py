@@ -0,0 +1,89 @@
+"""
+Per-voucher scopes for doc event hooks.
+
+A voucher's before_submit/before_cancel opens a scope in frappe.local that
+collects work (touched Bins, dirty batches), and its on_submit/on_cancel
+flushes it once. Stock Ledger Entries and GL Entries are submitted inside
+their voucher and never open or close a scope.
+
+A submit that raises never reaches on_submit. Each scope is therefore tied
+to its transaction through frappe.local.rollback_observers: a rollback drops
+it, and a scope that outlived a commit is stale and handed to on_stale.
+Either way a later submit in the same worker opens a fresh scope.
+"""
+
+from __future__ import unicode_literals
+
+import frappe
+
+
+LEDGER_DOCTYPES = ("Stock Ledger Entry", "GL Entry")
+
+
+class _ScopeObserver(object):
+    """Rollback observer: the voucher's changes are gone, so is its scope."""
+
+    def __init__(self, key):
+        self.key = key
+
+    def on_rollback(self):
+        scope = getattr(frappe.local, self.key, None)
+        if scope and scope.get("observer") is self:
+            setattr(frappe.local, self.key, None)
+
+
+def open_submit_scope(key, doc, on_stale=None, **values):
+    """
+    doc_events before_submit/before_cancel: open the scope `key` for doc.
+
+    Nested submits (e.g. a Work Order updated by its Stock Entry) share the
+    outer voucher's scope. Returns the open scope, or None for ledger rows.
+    """
+    if doc.doctype in LEDGER_DOCTYPES:
+        return None
+
+    scope = get_submit_scope(key, on_stale)
+    if scope:
+        return scope
+
+    observer = _ScopeObserver(key)
+    scope = dict(values, owner=(doc.doctype, doc.name), observer=observer)
+    observers = getattr(frappe.local, "rollback_observers", None)
+    if observers is not None:
+        observers.append(observer)
+    setattr(frappe.local, key, scope)
+    return scope
+
+
+def get_submit_scope(key, on_stale=None):
+    """Return the open scope `key`, dropping it (and calling on_stale) if its transaction ended."""
+    scope = getattr(frappe.local, key, None)
+    if not scope:
+        return None
+
+    observers = getattr(frappe.local, "rollback_observers", None)
+    if observers is None or any(observer is scope["observer"] for observer in observers):
+        return scope
+
+    # committed since the scope was opened: its voucher failed without a
+    # rollback, or committed halfway; hand over what is still pending
+    setattr(frappe.local, key, None)
+    if on_stale:
+        on_stale(scope)
+    return None
+
+
+def close_submit_scope(key, doc, on_stale=None):
+    """
+    doc_events on_submit/on_cancel: return the open scope for flushing.
+
+    Any voucher flushes what is pending so work never waits on a parent that
+    failed; only the voucher that opened the scope closes it.
+    """
+    if doc.doctype in LEDGER_DOCTYPES:
+        return None
+
+    scope = get_submit_scope(key, on_stale)
+    if scope and scope["owner"] == (doc.doctype, doc.name):
+        setattr(frappe.local, key, None)
+    return scope
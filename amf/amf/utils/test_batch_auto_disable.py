@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, libracore AG and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from amf.amf.utils import batch_auto_disable
+
+
+class TestBatchAutoDisable(unittest.TestCase):
+	def setUp(self):
+		frappe.local.rollback_observers = []
+
+	def tearDown(self):
+		frappe.local.amf_dirty_batch_collection = None
+		frappe.local.rollback_observers = []
+
+	def test_set_based_sync_applies_rules_to_all_batches(self):
+		batches = [
+			frappe._dict(name="B-AUTO-STOCK", disabled=1, auto_disabled=1),
+			frappe._dict(name="B-MANUAL-STOCK", disabled=1, auto_disabled=0),
+			frappe._dict(name="B-MARKED-ENABLED", disabled=0, auto_disabled=1),
+			frappe._dict(name="B-EMPTY", disabled=0, auto_disabled=0),
+			frappe._dict(name="B-EMPTY-DRAFT", disabled=0, auto_disabled=0),
+		]
+
+		with patch.object(batch_auto_disable, "_has_auto_disabled_marker", return_value=True), patch.object(
+			batch_auto_disable, "_get_batch_states", return_value=batches
+		), patch.object(
+			batch_auto_disable,
+			"_get_batches_with_positive_stock",
+			return_value={"B-AUTO-STOCK", "B-MANUAL-STOCK", "B-MARKED-ENABLED"},
+		), patch.object(
+			batch_auto_disable, "_get_pending_stock_batch_refs", return_value={"B-EMPTY-DRAFT"}
+		) as pending_refs, patch.object(batch_auto_disable, "_set_batch_states") as set_states:
+			results = batch_auto_disable._sync_batch_disabled_states()
+
+		pending_refs.assert_called_once_with(None)
+		self.assertEqual(results["enabled"], ["B-AUTO-STOCK"])
+		self.assertEqual(results["disabled"], ["B-EMPTY"])
+		self.assertEqual(results["skipped_pending"], ["B-EMPTY-DRAFT"])
+		set_states.assert_any_call(["B-MARKED-ENABLED"], disabled=None, auto_disabled=0, has_marker=True)
+
+	def test_ledger_rows_of_one_voucher_queue_a_single_job(self):
+		voucher = frappe._dict(doctype="Stock Entry", name="STE-0001")
+
+		with patch.object(batch_auto_disable, "_enqueue_dirty_batch_sync") as enqueue:
+			batch_auto_disable.begin_dirty_batch_collection(voucher)
+			for batch_no in ("B-1", "B-2", "B-1"):
+				sle = frappe._dict(doctype="Stock Ledger Entry", batch_no=batch_no)
+				batch_auto_disable.begin_dirty_batch_collection(sle)
+				batch_auto_disable.queue_batch_disabled_state_sync(sle)
+				batch_auto_disable.queue_dirty_batches(sle)
+			batch_auto_disable.queue_dirty_batches(voucher)
+
+		enqueue.assert_called_once_with(["B-1", "B-2"])
+		self.assertIsNone(frappe.local.amf_dirty_batch_collection)
+
+	def test_collection_of_a_failed_voucher_is_not_reused(self):
+		failed = frappe._dict(doctype="Stock Entry", name="STE-0001")
+
+		with patch.object(batch_auto_disable, "_enqueue_dirty_batch_sync") as enqueue:
+			batch_auto_disable.begin_dirty_batch_collection(failed)
+			batch_auto_disable.queue_batch_disabled_state_sync(frappe._dict(doctype="Stock Ledger Entry", batch_no="B-1"))
+			# committed without reaching on_submit
+			frappe.local.rollback_observers = []
+			batch_auto_disable.queue_batch_disabled_state_sync(frappe._dict(doctype="Stock Ledger Entry", batch_no="B-2"))
+
+		self.assertEqual([call.args[0] for call in enqueue.call_args_list], [["B-1"], ["B-2"]])
+		self.assertIsNone(frappe.local.amf_dirty_batch_collection)
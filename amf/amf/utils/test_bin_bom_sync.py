@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, libracore AG and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from amf.amf.utils import bin_bom_sync
+
+
+class TestBinBomSync(unittest.TestCase):
+	def setUp(self):
+		frappe.local.amf_bom_stock_qty_sync_scope = None
+		frappe.local.rollback_observers = []
+
+	def tearDown(self):
+		frappe.local.amf_bom_stock_qty_sync_scope = None
+		frappe.local.rollback_observers = []
+
+	def test_pairs_are_coalesced_until_the_owner_document_is_submitted(self):
+		owner = frappe._dict(doctype="Stock Entry", name="STE-0001")
+		nested = frappe._dict(doctype="Work Order", name="WO-0001")
+
+		with patch.object(bin_bom_sync, "sync_item_bom_stock_qty") as sync_one, patch.object(
+			bin_bom_sync, "sync_item_bom_stock_qty_for_pairs"
+		) as sync_pairs:
+			bin_bom_sync.begin_bom_stock_qty_sync_scope(owner)
+			bin_bom_sync.begin_bom_stock_qty_sync_scope(nested)
+			for _row in range(3):
+				sle = frappe._dict(doctype="Stock Ledger Entry", name="SLE-000{0}".format(_row))
+				bin_bom_sync.begin_bom_stock_qty_sync_scope(sle)
+				bin_bom_sync.flush_bom_stock_qty_sync_scope(sle)
+				bin_bom_sync.queue_item_bom_stock_qty_sync("ITEM-A", "Main Stock - AMF21")
+			bin_bom_sync.queue_item_bom_stock_qty_sync("ITEM-B", "Main Stock - AMF21")
+			bin_bom_sync.flush_bom_stock_qty_sync_scope(nested)
+			bin_bom_sync.queue_item_bom_stock_qty_sync("ITEM-C", "Main Stock - AMF21")
+			bin_bom_sync.flush_bom_stock_qty_sync_scope(owner)
+
+		sync_one.assert_not_called()
+		self.assertEqual(
+			[call.args[0] for call in sync_pairs.call_args_list],
+			[
+				{("ITEM-A", "Main Stock - AMF21"), ("ITEM-B", "Main Stock - AMF21")},
+				{("ITEM-C", "Main Stock - AMF21")},
+			],
+		)
+		self.assertIsNone(frappe.local.amf_bom_stock_qty_sync_scope)
+
+	def test_pairs_outside_a_submit_are_synced_immediately(self):
+		with patch.object(bin_bom_sync, "sync_item_bom_stock_qty") as sync_one:
+			deferred = bin_bom_sync.queue_item_bom_stock_qty_sync("ITEM-A", "Main Stock - AMF21", actual_qty=4)
+
+		self.assertFalse(deferred)
+		sync_one.assert_called_once_with("ITEM-A", "Main Stock - AMF21", actual_qty=4)
+
+	def test_failed_submit_does_not_leave_its_scope_behind(self):
+		failed = frappe._dict(doctype="Stock Entry", name="STE-0001")
+		retried = frappe._dict(doctype="Stock Entry", name="STE-0002")
+
+		with patch.object(bin_bom_sync, "sync_item_bom_stock_qty") as sync_one, patch.object(
+			bin_bom_sync, "sync_item_bom_stock_qty_for_pairs"
+		) as sync_pairs:
+			# rolled back: the scope goes with the transaction
+			bin_bom_sync.begin_bom_stock_qty_sync_scope(failed)
+			bin_bom_sync.queue_item_bom_stock_qty_sync("ITEM-A", "Main Stock - AMF21")
+			for observer in frappe.local.rollback_observers:
+				observer.on_rollback()
+			frappe.local.rollback_observers = []
+			self.assertIsNone(frappe.local.amf_bom_stock_qty_sync_scope)
+
+			# committed without reaching on_submit: pending pairs are synced and
+			# later Bin updates are no longer deferred
+			bin_bom_sync.begin_bom_stock_qty_sync_scope(failed)
+			bin_bom_sync.queue_item_bom_stock_qty_sync("ITEM-B", "Main Stock - AMF21")
+			frappe.local.rollback_observers = []
+			deferred = bin_bom_sync.queue_item_bom_stock_qty_sync("ITEM-C", "Main Stock - AMF21", actual_qty=2)
+
+			# the next submit opens its own scope
+			bin_bom_sync.begin_bom_stock_qty_sync_scope(retried)
+			self.assertEqual(frappe.local.amf_bom_stock_qty_sync_scope["owner"], ("Stock Entry", "STE-0002"))
+
+		self.assertFalse(deferred)
+		sync_pairs.assert_called_once_with({("ITEM-B", "Main Stock - AMF21")})
+		sync_one.assert_called_once_with("ITEM-C", "Main Stock - AMF21", actual_qty=2)
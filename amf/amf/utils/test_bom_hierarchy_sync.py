@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, libracore AG and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import unittest
+
+from amf.amf.utils.bom_hierarchy_sync import _plan_bom_order, _split_bom_plan_into_shards
+
+
+def _graph(item_to_bom, children):
+	return {
+		"item_to_bom": item_to_bom,
+		"bom_to_item": {bom_name: item_code for item_code, bom_name in item_to_bom.items()},
+		"children": children,
+	}
+
+
+class TestBomHierarchySync(unittest.TestCase):
+	def test_plan_visits_shared_children_once_before_their_parents(self):
+		graph = _graph(
+			{"PUMP": "BOM-PUMP", "VALVE": "BOM-VALVE", "SEAT": "BOM-SEAT", "KIT": "BOM-KIT"},
+			{
+				"BOM-PUMP": ["VALVE", "SEAT"],
+				"BOM-VALVE": ["SEAT"],
+				"BOM-KIT": ["SEAT"],
+			},
+		)
+
+		plan = _plan_bom_order(graph, ["PUMP", "KIT", "SEAT", "VALVE"])
+
+		self.assertEqual(plan["boms_bottom_up"], ["BOM-SEAT", "BOM-VALVE", "BOM-PUMP", "BOM-KIT"])
+		self.assertEqual(plan["blocked_items"], set())
+
+	def test_plan_blocks_loops_and_items_reaching_them(self):
+		graph = _graph(
+			{"TOP": "BOM-TOP", "A": "BOM-A", "B": "BOM-B", "SAFE": "BOM-SAFE"},
+			{
+				"BOM-TOP": ["A", "SAFE"],
+				"BOM-A": ["B"],
+				"BOM-B": ["A"],
+			},
+		)
+
+		plan = _plan_bom_order(graph, ["TOP", "SAFE"])
+
+		self.assertEqual(plan["boms_bottom_up"], ["BOM-SAFE"])
+		self.assertEqual(plan["blocked_items"], {"TOP", "A", "B"})
+
+	def test_shards_keep_connected_components_together_in_bottom_up_order(self):
+		graph = _graph(
+			{
+				"PUMP": "BOM-PUMP",
+				"VALVE": "BOM-VALVE",
+				"SEAT": "BOM-SEAT",
+				"KIT": "BOM-KIT",
+				"PLUG": "BOM-PLUG",
+				"CAP": "BOM-CAP",
+			},
+			{
+				"BOM-PUMP": ["VALVE"],
+				"BOM-VALVE": ["SEAT"],
+				"BOM-KIT": ["SEAT"],
+				"BOM-CAP": ["PLUG"],
+			},
+		)
+		plan = _plan_bom_order(graph, ["PUMP", "KIT", "CAP"])
+
+		shards = _split_bom_plan_into_shards(graph, plan["boms_bottom_up"], shard_size=2)
+
+		self.assertEqual(
+			shards,
+			[["BOM-SEAT", "BOM-VALVE", "BOM-PUMP", "BOM-KIT"], ["BOM-PLUG", "BOM-CAP"]],
+		)
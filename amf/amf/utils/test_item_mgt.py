@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, libracore AG and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+import frappe
+
+from amf.amf.utils import item_mgt
+
+
+class TestItemValuationRates(unittest.TestCase):
+	def test_bom_cost_wins_over_last_purchase_rate(self):
+		with patch.object(item_mgt, "_get_default_bom_costs", return_value={"ITEM-A": 12.5, "ITEM-C": 0}), patch.object(
+			item_mgt, "_get_last_purchase_rates", return_value={"ITEM-A": 9.0, "ITEM-B": 4.0, "ITEM-C": 3.0}
+		):
+			rates = item_mgt._resolve_item_valuation_rates(["ITEM-A", "ITEM-B", "ITEM-C", "ITEM-D"])
+
+		self.assertEqual(rates, {
+			"ITEM-A": (12.5, "default_bom"),
+			"ITEM-B": (4.0, "last_purchase_invoice"),
+			"ITEM-C": (3.0, "last_purchase_invoice"),
+		})
+
+	def test_changed_rates_are_written_in_bulk_unless_a_full_save_is_requested(self):
+		items = [
+			frappe._dict(name="ITEM-A", item_name="A", valuation_rate=10),
+			frappe._dict(name="ITEM-B", item_name="B", valuation_rate=4),
+			frappe._dict(name="ITEM-C", item_name="C", valuation_rate=1),
+			frappe._dict(name="ITEM-D", item_name="D", valuation_rate=0),
+		]
+		rates = {
+			"ITEM-A": (12.5, "default_bom"),
+			"ITEM-B": (4.0, "last_purchase_invoice"),
+			"ITEM-C": (3.0, "last_purchase_invoice"),
+		}
+		item_doc = MagicMock()
+
+		with patch.object(item_mgt, "_get_or_create_log", return_value="LOG-1"), patch.object(
+			item_mgt, "update_log_entry"
+		), patch.object(item_mgt.frappe, "get_all", return_value=items), patch.object(
+			item_mgt, "_resolve_item_valuation_rates", return_value=rates
+		) as resolve, patch.object(item_mgt, "_write_item_valuation_rates") as write, patch.object(
+			item_mgt.frappe, "get_doc", return_value=item_doc
+		) as get_doc, patch.object(item_mgt.frappe.db, "commit"):
+			# as /api/method does: frappe.call must only pass the function's own arguments
+			frappe.call(
+				item_mgt.update_all_item_valuation_rates,
+				cmd="amf.amf.utils.item_mgt.update_all_item_valuation_rates",
+				full_save_items="ITEM-C",
+			)
+
+		resolve.assert_called_once_with(["ITEM-A", "ITEM-B", "ITEM-C", "ITEM-D"])
+		write.assert_called_once_with([{"item": "ITEM-A", "rate": 12.5, "source": "default_bom"}])
+		get_doc.assert_called_once_with("Item", "ITEM-C")
+		self.assertEqual(item_doc.valuation_rate, 3.0)
+		item_doc.save.assert_called_once_with(ignore_permissions=True)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, libracore AG and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from amf.amf.utils import log_buffer
+
+
+class TestLogBuffer(unittest.TestCase):
+	def setUp(self):
+		frappe.local.amf_log_buffer = None
+		frappe.local.amf_log_buffer_depth = 0
+
+	def test_lines_are_written_once_when_outermost_block_exits(self):
+		with patch.object(log_buffer, "_write_lines") as write_lines:
+			with log_buffer.log_buffer():
+				log_buffer.append_log_message("LOG-1", "first")
+				with log_buffer.log_buffer():
+					log_buffer.append_log_message("LOG-1", "second")
+				write_lines.assert_not_called()
+				log_buffer.append_log_message("LOG-2", "other")
+
+		write_lines.assert_any_call("LOG-1", ["first", "second"])
+		write_lines.assert_any_call("LOG-2", ["other"])
+		self.assertEqual(write_lines.call_count, 2)
+
+	def test_buffer_flushes_every_n_lines(self):
+		with patch.object(log_buffer, "_write_lines") as write_lines:
+			with log_buffer.log_buffer(flush_lines=2):
+				for index in range(5):
+					log_buffer.append_log_message("LOG-1", str(index))
+				self.assertEqual(write_lines.call_count, 2)
+
+		self.assertEqual(
+			[call.args for call in write_lines.call_args_list],
+			[("LOG-1", ["0", "1"]), ("LOG-1", ["2", "3"]), ("LOG-1", ["4"])],
+		)
+
+	def test_unbuffered_append_writes_immediately_and_caps_line_length(self):
+		with patch.object(log_buffer, "_write_lines") as write_lines:
+			log_buffer.append_log_message("LOG-1", "x" * (log_buffer.LOG_MAX_LINE_CHARS + 10))
+			log_buffer.append_log_message(None, "ignored")
+
+		write_lines.assert_called_once()
+		line = write_lines.call_args.args[1][0]
+		self.assertEqual(len(line), log_buffer.LOG_MAX_LINE_CHARS)
+		self.assertTrue(line.endswith(log_buffer.LOG_TRUNCATED_SUFFIX))
+
+	def test_buffered_log_flushes_when_hook_raises(self):
+		@log_buffer.buffered_log
+		def failing_hook():
+			log_buffer.append_log_message("LOG-1", "before failure")
+			raise ValueError("boom")
+
+		with patch.object(log_buffer, "_write_lines") as write_lines:
+			with self.assertRaises(ValueError):
+				failing_hook()
+
+		write_lines.assert_called_once_with("LOG-1", ["before failure"])
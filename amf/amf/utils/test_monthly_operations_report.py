@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import unittest
+from datetime import date
+from unittest.mock import MagicMock, patch
+
+import frappe
+
+from amf.amf.utils import monthly_operations_report as report
+
+
+class MonthlyOperationsReportTest(unittest.TestCase):
+    def test_collectors_are_timed_and_otif_is_built_from_their_rows(self):
+        calls = []
+
+        def fake_otif_rows(from_date, to_date):
+            calls.append((from_date, to_date))
+            return []
+
+        strict = {"rate": 91.0}
+        timings = {}
+        with patch.object(report, "get_otif_rows", side_effect=fake_otif_rows), patch.object(
+            report, "get_strict_otif", return_value=strict
+        ), patch.object(report, "collect_machining", return_value={"machining": 1}), patch.object(
+            report, "collect_shipping_issues", return_value={"shipping": 1}
+        ), patch.object(
+            report, "collect_procurement_prices", return_value={"procurement": 1}
+        ), patch.object(report, "build_otif", return_value={"otif": 1}) as build_otif, patch.object(
+            report, "get_period_snapshot", return_value=None
+        ), patch.object(report, "is_closed_period", return_value=False), patch.object(
+            frappe, "db", create=True
+        ):
+            data = report.collect_report_data(
+                "AMF",
+                date(2026, 9, 1),
+                date(2026, 9, 30),
+                timings=timings,
+                workers=1,
+            )
+
+        self.assertEqual(
+            calls,
+            [
+                (date(2026, 9, 1), date(2026, 9, 30)),
+                (date(2026, 8, 1), date(2026, 8, 31)),
+                (date(2026, 7, 1), date(2026, 9, 30)),
+            ],
+        )
+        build_otif.assert_called_once_with([], [], [], strict, previous_summary=None)
+        self.assertEqual(data["procurement"], {"procurement": 1})
+        self.assertEqual(
+            set(timings),
+            {
+                "otif_current_rows",
+                "otif_previous_rows",
+                "otif_semester_rows",
+                "otif_strict",
+                "machining",
+                "shipping",
+                "procurement",
+                "total",
+            },
+        )
+
+    def test_previous_period_is_read_from_its_snapshot(self):
+        previous = {"total": 10, "on_time": 9, "rate": 90.0}
+        calls = []
+
+        def fake_otif_rows(from_date, to_date):
+            calls.append((from_date, to_date))
+            return [frappe._dict({"delay": 0, "0d": 1})]
+
+        with patch.object(report, "get_otif_rows", side_effect=fake_otif_rows), patch.object(
+            report, "get_strict_otif", return_value={"rate": 91.0}
+        ), patch.object(report, "collect_machining", return_value={}), patch.object(
+            report, "collect_shipping_issues", return_value={}
+        ), patch.object(report, "collect_procurement_prices", return_value={}), patch.object(
+            report, "get_period_snapshot", return_value={"otif": previous}
+        ) as get_snapshot, patch.object(report, "save_period_snapshot") as save_snapshot, patch.object(
+            report, "today", return_value="2026-10-18"
+        ), patch.object(frappe, "db", create=True):
+            data = report.collect_report_data("AMF", date(2026, 9, 1), date(2026, 9, 30), workers=1)
+
+        get_snapshot.assert_called_once_with("AMF", "Monthly", "2026-08", date(2026, 8, 31))
+        self.assertNotIn((date(2026, 8, 1), date(2026, 8, 31)), calls)
+        self.assertEqual(data["otif"]["previous"], previous)
+        self.assertEqual(data["otif"]["change_vs_previous_points"], 10.0)
+        save_snapshot.assert_called_once_with(
+            "AMF",
+            "Monthly",
+            "2026-09",
+            date(2026, 9, 1),
+            date(2026, 9, 30),
+            {"otif": data["otif"]["current"]},
+        )
+
+    def test_report_files_skip_languages_whose_content_is_unchanged(self):
+        settings = frappe._dict(generate_markdown=1, generate_pdf=1)
+        doc = frappe._dict(
+            name="OPR-2026-09-AMF",
+            period_type="Monthly",
+            reporting_month="2026-09-01",
+            english_markdown_file="/private/files/en.md",
+            english_pdf_file="/private/files/en.pdf",
+        )
+        doc.english_output_sha256 = report.get_report_output_hash(doc, settings, "english", "# Report")
+        saved = []
+
+        def fake_save_file(file_name, content, doctype, name, is_private=0):
+            saved.append(file_name)
+            return frappe._dict(file_url="/private/files/" + file_name)
+
+        warnings = []
+        with patch.object(report, "save_file", side_effect=fake_save_file), patch.object(
+            report, "get_pdf", return_value=b"%PDF"
+        ) as get_pdf, patch.object(report, "remove_generated_files") as remove_files, patch.object(
+            report, "md_to_html", side_effect=lambda value: value
+        ), patch.object(frappe, "db", create=True) as db:
+            db.exists.return_value = True
+            updates = report.create_report_files(doc, "# Report", "# Rapport", settings, warnings)
+
+        remove_files.assert_called_once_with(doc, languages=("french",))
+        get_pdf.assert_called_once()
+        self.assertEqual(saved, ["rapport_operations_2026_09_fr.md", "rapport_operations_2026_09_fr.pdf"])
+        self.assertEqual(updates["french_pdf_file"], "/private/files/rapport_operations_2026_09_fr.pdf")
+        self.assertNotIn("english_pdf_file", updates)
+        self.assertEqual(warnings, [])
+
+    def test_failed_ai_stage_leaves_generating_and_emails_the_report(self):
+        doc = MagicMock()
+        doc.name = "OPR-2026-09-AMF"
+        doc.generate_ai_insights = 1
+        doc.kpi_data_json = "{}"
+        doc.send_email = 1
+        doc.generation_log = "Rendered"
+        doc.save.side_effect = Exception("save failed")
+
+        with patch.object(report.frappe, "get_doc", return_value=doc), patch.object(
+            report, "get_settings", return_value=frappe._dict(fallback_to_rule_based_report=1)
+        ), patch.object(report, "set_ai_fields"), patch.object(
+            report, "email_report"
+        ) as email_report, patch.object(report.frappe, "log_error", create=True) as log_error, patch.object(
+            report.frappe, "db", create=True
+        ) as db, patch("amf.amf.utils.operations_ai_insights.generate_ai_insights", return_value=None, create=True):
+            db.exists.return_value = True
+            with self.assertRaises(Exception):
+                report.generate_report_ai_insights(doc.name)
+
+        db.rollback.assert_called_once_with()
+        values = db.set_value.call_args.args[2]
+        self.assertEqual(values["ai_status"], "Failed")
+        self.assertEqual(values["status"], "Completed with Warnings")
+        self.assertIn("save failed", values["generation_log"])
+        email_report.assert_called_once_with(doc.name)
+        log_error.assert_called_once()
@@ -247,6 +247,49 @@ class OperationsAIInsightsTest(unittest.TestCase):
         ):
             self.assertTrue(get_openai_api_key(settings).startswith("sk-proj-"))
 
+    def test_cached_insights_skip_the_model_call(self):
+        calls = []
+        structured_output = self._structured_output()
+
+        class StubResponses(object):
+            def parse(self, **kwargs):
+                calls.append(kwargs["model"])
+                return SimpleNamespace(
+                    output_parsed=structured_output,
+                    model=kwargs["model"],
+                    id="resp_stub",
+                    usage=None,
+                )
+
+        class StubCache(dict):
+            def get_value(self, key):
+                return self.get(key)
+
+            def set_value(self, key, value, expires_in_sec=None):
+                self[key] = value
+
+        client = SimpleNamespace(responses=StubResponses())
+        cache = StubCache()
+        settings = {"ai_model": "stub-model", "ai_minimum_confidence": 65}
+        with patch(
+            "amf.amf.utils.operations_ai_insights.load_ai_dependencies",
+            return_value=(None, object, dict),
+        ), patch("amf.amf.utils.operations_ai_insights.frappe.cache", return_value=cache):
+            first = generate_ai_insights(self.data, settings, client=client)
+            second = generate_ai_insights(self.data, settings, client=client)
+            other_prompt = generate_ai_insights(
+                self.data,
+                dict(settings, ai_prompt_version="operations-v2"),
+                client=client,
+            )
+
+        self.assertEqual(calls, ["stub-model", "stub-model"])
+        self.assertNotIn("cache_hit", first)
+        self.assertEqual(second["cache_hit"], 1)
+        self.assertEqual(second["insights"], first["insights"])
+        self.assertEqual(second["payload_sha256"], first["payload_sha256"])
+        self.assertEqual(other_prompt["prompt_version"], "operations-v2")
+
     def _structured_output(self):
         return {
             "executive_summary_en": "Delivery performance requires attention.",
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, libracore AG and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+import frappe
+
+from amf.amf.utils import projected_stock
+
+
+def _entry(item_code, doctype, qty, posting_date=None, warehouse="Main Stock - AMF21"):
+	return frappe._dict(
+		date=posting_date,
+		doctype=doctype,
+		docname=None if doctype == "Stock Balance" else "{0}-{1}".format(doctype, qty),
+		item_code=item_code,
+		item_name=item_code,
+		warehouse=warehouse,
+		qty=qty,
+	)
+
+
+class TestProjectedStock(unittest.TestCase):
+	def test_running_balance_is_kept_per_item_and_warehouse(self):
+		entries = [
+			_entry("ITEM-A", "Stock Balance", 10, date(2026, 10, 18)),
+			_entry("ITEM-B", "Stock Balance", 2, date(2026, 10, 18)),
+			_entry("ITEM-A", "Sales Order", -12, date(2026, 11, 1)),
+			_entry("ITEM-B", "Purchase Order", 5, date(2026, 11, 3)),
+			_entry("ITEM-A", "Work Order", 4, date(2026, 11, 10)),
+		]
+
+		with patch.object(projected_stock, "get_projected_stock_entries", return_value=entries):
+			summary = projected_stock.get_projected_stock_summary(["ITEM-A", "ITEM-B"])
+
+		item_a = summary[("ITEM-A", "Main Stock - AMF21")]
+		self.assertEqual(item_a.current_qty, 10)
+		self.assertEqual(item_a.min_balance, -2)
+		self.assertEqual(item_a.min_balance_date, date(2026, 11, 1))
+		self.assertEqual(item_a.final_balance, 2)
+		self.assertEqual(summary[("ITEM-B", "Main Stock - AMF21")].final_balance, 7)
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import random
+import unittest
+from datetime import date, timedelta
+from unittest.mock import Mock, patch
+
+import frappe
+
+from amf.amf.utils import safety_stock_check
+
+
+class SafetyStockMatrixParityTest(unittest.TestCase):
+    def setUp(self):
+        self.end_date = date(2026, 6, 30)
+        self.randomizer = random.Random(20260630)
+
+    def _window(self, history_days):
+        return self.end_date - timedelta(days=history_days - 1), self.end_date
+
+    def _random_rows(self, item_code, window, demand_ratio, spike=None):
+        start_date, end_date = window
+        rows = []
+        posting_date = start_date
+        while posting_date <= end_date:
+            if self.randomizer.random() < demand_ratio:
+                rows.append(frappe._dict({
+                    "item_code": item_code,
+                    "posting_date": posting_date,
+                    "qty": float(self.randomizer.randint(1, 40)),
+                }))
+            posting_date += timedelta(days=1)
+
+        if spike and rows:
+            rows[len(rows) // 2].qty = spike
+        return rows
+
+    def _per_item_result(self, rows, window, avg_lt, std_lt):
+        demand_by_day = {row.posting_date: float(row.qty) for row in rows}
+        profile = safety_stock_check._build_demand_profile(demand_by_day, *window)
+        ss, ro = safety_stock_check._compute_safety_and_reorder(profile.daily_outflows, avg_lt, std_lt)
+        return profile, ss, ro
+
+    def test_matrix_engine_matches_per_item_path(self):
+        cases = [
+            ("ITEM-DENSE", 365, 0.6, 2500.0, 21.0, 5.25),
+            ("ITEM-SPARSE", 365, 0.01, None, 15.0, 3.75),
+            ("ITEM-NEW", 40, 0.4, 900.0, 30.0, 7.5),
+            ("ITEM-SINGLE-DAY", 1, 1.0, None, 10.0, 2.5),
+            ("ITEM-NO-DEMAND", 200, 0.0, None, 12.0, 3.0),
+            ("ITEM-NO-LEAD-TIME", 365, 0.3, 4000.0, 0.0, 0.0),
+        ]
+        windows = {}
+        rows = []
+        expected = {}
+        for item_code, history_days, demand_ratio, spike, avg_lt, std_lt in cases:
+            windows[item_code] = self._window(history_days)
+            item_rows = self._random_rows(item_code, windows[item_code], demand_ratio, spike)
+            rows.extend(item_rows)
+            expected[item_code] = self._per_item_result(item_rows, windows[item_code], avg_lt, std_lt)
+
+        item_codes = [case[0] for case in cases]
+        matrix = safety_stock_check._build_outflow_matrix(item_codes, windows, rows)
+        safety_stocks, reorder_levels = safety_stock_check._compute_safety_and_reorder_for_matrix(
+            matrix.adjusted,
+            matrix.history_days,
+            [case[4] for case in cases],
+            [case[5] for case in cases],
+        )
+
+        for index, item_code in enumerate(item_codes):
+            profile, ss, ro = expected[item_code]
+            demand = safety_stock_check._get_demand_matrix_row(matrix, index)
+            self.assertEqual(safety_stocks[index], ss, item_code)
+            self.assertEqual(reorder_levels[index], ro, item_code)
+            self.assertEqual(demand.history_days, profile.history_days, item_code)
+            self.assertEqual(demand.demand_days, profile.demand_days, item_code)
+            self.assertAlmostEqual(demand.annual_outflow, profile.annual_outflow, places=6, msg=item_code)
+            self.assertAlmostEqual(
+                demand.average_monthly_outflow,
+                profile.average_monthly_outflow,
+                places=6,
+                msg=item_code,
+            )
+
+            history_days = profile.history_days
+            adjusted_row = matrix.adjusted[index][-history_days:]
+            self.assertEqual(list(adjusted_row), profile.daily_outflows, item_code)
+
+    def test_matrix_ignores_rows_outside_item_window(self):
+        windows = {"ITEM-A": self._window(10)}
+        rows = [
+            frappe._dict({"item_code": "ITEM-A", "posting_date": self.end_date - timedelta(days=20), "qty": 5}),
+            frappe._dict({"item_code": "ITEM-A", "posting_date": self.end_date, "qty": 3}),
+            frappe._dict({"item_code": "ITEM-B", "posting_date": self.end_date, "qty": 7}),
+        ]
+
+        matrix = safety_stock_check._build_outflow_matrix(["ITEM-A"], windows, rows)
+
+        self.assertEqual(matrix.annual_outflow[0], 3.0)
+        self.assertEqual(int(matrix.demand_days[0]), 1)
+
+    def test_empty_item_list_returns_empty_results(self):
+        matrix = safety_stock_check._build_outflow_matrix([], {}, [])
+
+        self.assertEqual(
+            safety_stock_check._compute_safety_and_reorder_for_matrix(
+                matrix.adjusted, matrix.history_days, [], []
+            ),
+            ([], []),
+        )
+
+
+class SafetyStockBulkUpdateTest(unittest.TestCase):
+    def test_bulk_update_issues_one_statement_per_chunk(self):
+        mock_frappe = Mock()
+        updates = [
+            ("ITEM-{0}".format(index), {"safety_stock": index, "reorder": index % 2})
+            for index in range(5)
+        ]
+
+        with patch("amf.amf.utils.safety_stock_check.frappe", mock_frappe):
+            written = safety_stock_check._bulk_update_items(updates, chunk_size=2)
+
+        self.assertEqual(written, 5)
+        self.assertEqual(mock_frappe.db.sql.call_count, 3)
+        query, args = mock_frappe.db.sql.call_args_list[0][0]
+        self.assertIn("`safety_stock` = CASE `name` WHEN %s THEN %s WHEN %s THEN %s END", query)
+        self.assertIn("`reorder` = CASE `name`", query)
+        self.assertEqual(args[:4], ("ITEM-0", 0, "ITEM-1", 1))
+        self.assertEqual(args[-2:], ("ITEM-0", "ITEM-1"))
+
+    def test_bulk_update_without_changes_writes_nothing(self):
+        mock_frappe = Mock()
+
+        with patch("amf.amf.utils.safety_stock_check.frappe", mock_frappe):
+            self.assertEqual(safety_stock_check._bulk_update_items([]), 0)
+
+        mock_frappe.db.sql.assert_not_called()
+
+
+class SafetyStockLeadTimeBatchTest(unittest.TestCase):
+    def test_purchase_samples_are_fetched_per_chunk_and_grouped_by_item(self):
+        mock_frappe = Mock()
+        mock_frappe.db.sql.side_effect = [
+            [
+                frappe._dict({"item_code": "ITEM-0", "lt": 10, "received_stock_qty": 5}),
+                frappe._dict({"item_code": "ITEM-0", "lt": 12, "received_stock_qty": 5}),
+                frappe._dict({"item_code": "ITEM-1", "lt": 30, "received_stock_qty": 1}),
+            ],
+            [],
+        ]
+        item_codes = ["ITEM-{0}".format(index) for index in range(safety_stock_check.QUERY_CHUNK_SIZE + 1)]
+
+        with patch("amf.amf.utils.safety_stock_check.frappe", mock_frappe):
+            rows_by_item = safety_stock_check._get_purchase_item_lead_time_rows_for_items(item_codes, limit=3)
+
+        self.assertEqual(mock_frappe.db.sql.call_count, 2)
+        query, args = mock_frappe.db.sql.call_args_list[0][0]
+        self.assertIn("ROW_NUMBER() OVER", query)
+        self.assertEqual(args[-1], 3)
+        self.assertEqual([row.lt for row in rows_by_item["ITEM-0"]], [10, 12])
+        self.assertEqual([row.lt for row in rows_by_item["ITEM-1"]], [30])
+
+    def test_prefetched_history_is_used_instead_of_per_item_queries(self):
+        item = frappe._dict({"name": "ITEM-0", "is_purchase_item": 1, "lead_time_days": 0})
+        history = frappe._dict({
+            "purchase": {"ITEM-0": [frappe._dict({"lt": 20, "received_stock_qty": 1})]},
+            "manufactured": {},
+        })
+
+        with patch.object(safety_stock_check, "_calc_lead_time") as calc_lead_time:
+            stats = safety_stock_check._get_item_lead_time_stats(item, recompute_history=True, history=history)
+
+        calc_lead_time.assert_not_called()
+        self.assertEqual(stats.avg_days, 20.0)
+        self.assertEqual(stats.source, "purchase_history")
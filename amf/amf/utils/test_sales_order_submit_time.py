@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, libracore AG and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import json
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+import frappe
+
+from amf.amf.utils import sales_order_submit_time
+
+
+def _version(docname, creation, changed):
+	return frappe._dict(docname=docname, creation=creation, data=json.dumps({"changed": changed}))
+
+
+class TestSalesOrderSubmitTime(unittest.TestCase):
+	def test_first_docstatus_transition_is_the_submit_time(self):
+		versions = [
+			_version("SO-1", "2026-09-01 08:00:00", [["customer", "A", "B"]]),
+			_version("SO-1", "2026-09-01 09:30:00", [["docstatus", 0, 1], ["status", "Draft", "To Deliver"]]),
+			_version("SO-1", "2026-09-03 10:00:00", [["docstatus", 0, 1]]),
+			_version("SO-2", "2026-09-02 11:00:00", [["docstatus", 1, 2]]),
+		]
+
+		with patch.object(frappe, "db", create=True) as db:
+			db.sql.return_value = versions
+			timestamps = sales_order_submit_time.get_submit_timestamps_from_versions(["SO-1", "SO-2"])
+
+		self.assertEqual(timestamps, {"SO-1": datetime(2026, 9, 1, 9, 30)})
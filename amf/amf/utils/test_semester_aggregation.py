@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, libracore AG and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import unittest
+from datetime import date
+from unittest.mock import MagicMock, patch
+
+import frappe
+
+from amf.amf.utils import semester_aggregation
+
+
+class TestSemesterAggregation(unittest.TestCase):
+	def test_closed_semesters_are_read_from_facts_and_the_rest_is_built_live(self):
+		stored = {
+			(2025, 1): [frappe._dict(year=2025, semester=1, dimension="", scope="", value=2, total=20)],
+		}
+		live_fact = frappe._dict(year=2026, semester=1, dimension="", scope="", value=1, total=5)
+
+		with patch.object(semester_aggregation, "get_stored_facts", return_value=stored), patch.object(
+			semester_aggregation, "build_semester_facts", return_value=[live_fact]
+		) as build, patch.object(semester_aggregation, "today", return_value="2026-05-10"):
+			facts = semester_aggregation.get_semester_facts(
+				semester_aggregation.PLANNING_SCRAP_FACT, "2025-01-01", "2026-05-10"
+			)
+
+		# 2025 S1 is stored, 2025 S2 has no facts yet and 2026 S1 is still open.
+		self.assertEqual([call.args[1:3] for call in build.call_args_list], [
+			(date(2025, 7, 1), date(2025, 12, 31)),
+			(date(2026, 1, 1), date(2026, 5, 10)),
+		])
+		self.assertEqual(facts, [stored[(2025, 1)][0], live_fact, live_fact])
+
+	def test_chart_cache_key_includes_filters(self):
+		cache = MagicMock()
+		cache.get_value.return_value = None
+		chart_source = MagicMock(return_value={"labels": []})
+		cached_get = semester_aggregation.cache_semester_chart(chart_source)
+		stock_chart = frappe._dict(name="Purchases", doctype="Dashboard Chart", filters_json='{"item_scope": "stock"}')
+		non_stock_chart = frappe._dict(name="Purchases", doctype="Dashboard Chart", filters_json='{"item_scope": "non_stock"}')
+
+		with patch.object(frappe, "cache", return_value=cache):
+			cached_get(chart=stock_chart)
+			cached_get(chart=non_stock_chart)
+
+		keys = [call.args[0] for call in cache.set_value.call_args_list]
+		self.assertEqual(len(keys), 2)
+		self.assertNotEqual(keys[0], keys[1])
+		self.assertEqual(chart_source.call_count, 2)
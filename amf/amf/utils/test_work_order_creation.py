@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, libracore AG and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from amf.amf.utils import work_order_creation
+
+
+def _bom_row(item_code, stock_qty, bom_no=None, child_bom=None):
+	return frappe._dict(item_code=item_code, stock_qty=stock_qty, qty=stock_qty, bom_no=bom_no, child_bom=child_bom)
+
+
+class TestMachiningBomExplosion(unittest.TestCase):
+	def test_explosion_is_per_unit_and_shared_by_sub_assemblies(self):
+		bom_tree = {
+			"BOM-P-001": {"quantity": 2, "rows": [
+				_bom_row("100001", 4),
+				_bom_row("SUB-A", 2, child_bom="BOM-SUB-A"),
+				_bom_row("SCREW", 8),
+			]},
+			"BOM-SUB-A": {"quantity": 1, "rows": [
+				_bom_row("200002", 3),
+				_bom_row("LOOP", 1, child_bom="BOM-P-001"),
+			]},
+		}
+		explosions = {}
+
+		result = work_order_creation._explode_machining_bom("BOM-P-001", bom_tree, explosions, set())
+
+		self.assertEqual(result, {"100001": 2.0, "200002": 3.0})
+		self.assertIn("BOM-SUB-A", explosions)
+
+	def test_sources_with_the_same_bom_are_exploded_once(self):
+		sources = [
+			frappe._dict(sales_order="SO-1", source_item_code="PUMP", source_qty=2, shipping_date="2026-11-20"),
+			frappe._dict(sales_order="SO-2", source_item_code="PUMP", source_qty=3, shipping_date="2026-11-10"),
+		]
+
+		with patch.object(
+			work_order_creation, "_get_default_boms_for_items", return_value={"PUMP": "BOM-PUMP"}
+		), patch.object(
+			work_order_creation, "get_machining_bom_explosions", return_value={"BOM-PUMP": {"100001": 1.5}}
+		) as explosions:
+			demand_map, skipped = work_order_creation._build_machining_demand_from_sources(sources)
+
+		explosions.assert_called_once_with({"BOM-PUMP"})
+		self.assertEqual(skipped, [])
+		row = demand_map[work_order_creation._get_demand_key("100001", None)]
+		self.assertEqual(row["qty"], 7.5)
+		self.assertEqual(len(row["sources"]), 2)
+
+
+class TestReorderLevelWorkOrders(unittest.TestCase):
+	def test_dry_run_returns_the_planned_changes_from_bulk_reads(self):
+		items = [
+			frappe._dict(name="310001", reorder_level=10),
+			frappe._dict(name="310002", reorder_level=5),
+			frappe._dict(name="310003", reorder_level=4),
+			frappe._dict(name="310004", reorder_level=3),
+		]
+
+		with patch.object(work_order_creation, "_get_reorder_level_items", return_value=items), patch.object(
+			work_order_creation, "_get_stock_balance_for_items", return_value={"310001": 4, "310002": 8}
+		), patch.object(
+			work_order_creation,
+			"_get_default_boms_for_items",
+			return_value={"310001": "BOM-310001-001", "310003": "BOM-310003-001", "310004": None},
+		), patch.object(
+			work_order_creation,
+			"_get_open_reorder_work_orders",
+			return_value={("310003", "BOM-310003-001"): "WO-0003"},
+		), patch.object(
+			work_order_creation, "_get_administrator_draft_work_orders_by_item", return_value={"310002": ["WO-0002"]}
+		), patch.object(
+			work_order_creation, "_get_default_drawings_by_item", return_value={"310001": "DWG-310001"}
+		), patch.object(frappe, "log_error", create=True), patch.object(
+			work_order_creation, "_create_reorder_work_order"
+		) as create_work_order:
+			result = work_order_creation.create_work_orders_based_on_reorder_levels(dry_run=1)
+
+		create_work_order.assert_not_called()
+		self.assertEqual(
+			[(row["item_code"], row["qty"], row["priority"], row["drawing"]) for row in result["created"]],
+			[("310001", 7, 8, "DWG-310001")],
+		)
+		self.assertEqual(result["deleted"], [{"item_code": "310002", "work_order": "WO-0002"}])
+		self.assertEqual([row["work_order"] for row in result["existing"]], ["WO-0003"])
+		self.assertEqual([row["item_code"] for row in result["skipped"]], ["310004"])
+
+	def test_failed_item_is_rolled_back_to_its_savepoint(self):
+		items = [
+			frappe._dict(name="310001", reorder_level=10),
+			frappe._dict(name="310002", reorder_level=5),
+		]
+
+		with patch.object(work_order_creation, "_get_reorder_level_items", return_value=items), patch.object(
+			work_order_creation, "_get_stock_balance_for_items", return_value={"310001": 12, "310002": 1}
+		), patch.object(
+			work_order_creation, "_get_default_boms_for_items", return_value={"310002": "BOM-310002-001"}
+		), patch.object(work_order_creation, "_get_open_reorder_work_orders", return_value={}), patch.object(
+			work_order_creation,
+			"_get_administrator_draft_work_orders_by_item",
+			return_value={"310001": ["WO-0001", "WO-0002"]},
+		), patch.object(work_order_creation, "_get_default_drawings_by_item", return_value={}), patch.object(
+			frappe, "log_error", create=True
+		), patch.object(
+			frappe, "delete_doc", create=True, side_effect=[None, Exception("WO-0002 is linked")]
+		), patch.object(work_order_creation, "_create_reorder_work_order") as create_work_order, patch.object(
+			frappe.db, "savepoint", create=True
+		) as savepoint, patch.object(frappe.db, "rollback", create=True) as rollback, patch.object(
+			frappe.db, "commit"
+		) as commit:
+			create_work_order.return_value.name = "WO-0003"
+			result = work_order_creation.create_work_orders_based_on_reorder_levels()
+
+		self.assertEqual(savepoint.call_count, 2)
+		rollback.assert_called_once_with(save_point=work_order_creation.REORDER_WORK_ORDER_SAVEPOINT)
+		self.assertEqual(result["deleted"], [])
+		self.assertEqual(result["skipped"], [{"item_code": "310001", "reason": "WO-0002 is linked"}])
+		self.assertEqual([row["work_order"] for row in result["created"]], ["WO-0003"])
+		commit.assert_called_once_with()
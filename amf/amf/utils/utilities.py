@@ -3,6 +3,8 @@ import datetime
 
 from frappe.utils import now_datetime
 
+from amf.amf.utils.log_buffer import append_log_message
+
 # Global Variables
 
 # Global Methods
@@ -59,13 +61,8 @@ def create_log_entry(message, category):
     return log_doc.name
 
 def update_log_entry(log_id, message):
-    """ Update an existing log entry with additional messages. """
-    log = custom_try(frappe.get_doc, "Log Entry", log_id)
-    if message:
-        log.message += "\n" + message  # Append new information
-    else:
-        log.message += "\n + no message..."
-    custom_try(log.save, ignore_permissions=True)
+    """ Update an existing log entry with additional messages (buffered inside log_buffer()). """
+    append_log_message(log_id, message or " + no message...")
     return None
 
 def update_error_log(message):
@@ -296,6 +296,10 @@ MACHINING_WIP_WAREHOUSE = "Work In Progress - AMF21"
 MACHINING_FG_WAREHOUSE = "Quality Control - AMF21"
 MACHINING_LEAD_TIME_DAYS = 7
 MACHINING_QTY_BUFFER_FACTOR = 1.2
+MACHINING_BOM_CHUNK_SIZE = 500
+MACHINING_BOM_EXPLOSION_CACHE_KEY = "amf_machining_bom_explosions"
+REORDER_WORK_ORDER_BATCH_SIZE = 50
+REORDER_WORK_ORDER_SAVEPOINT = "amf_reorder_work_order"
 AMF_DESK_BASE_URL = "https://amf.libracore.ch"
 MACHINING_PLANNING_NOTE_PREFIX = "Auto machining planning from submitted SOs:"
 
@@ -567,7 +571,12 @@ def _get_sales_order_bom_sources(company=None, from_delivery_date=None, to_deliv
 def _build_machining_demand_from_sources(sources):
     demand_map = {}
     skipped = []
-    bom_cache = {}
+    bom_by_item = _get_default_boms_for_items({
+        source.get("source_item_code")
+        for source in sources
+        if not _is_machining_item_code(source.get("source_item_code"))
+    })
+    explosions = get_machining_bom_explosions(set(bom_by_item.values()))
 
     for source in sources:
         source_item_code = source.get("source_item_code")
@@ -577,7 +586,7 @@ def _build_machining_demand_from_sources(sources):
             _add_machining_demand(demand_map, source_item_code, source_qty, source)
             continue
 
-        bom_no = _get_default_active_bom(source_item_code, bom_cache)
+        bom_no = bom_by_item.get(source_item_code)
         if not bom_no:
             skipped.append({
                 "sales_order": source.get("sales_order"),
@@ -588,11 +597,11 @@ def _build_machining_demand_from_sources(sources):
             })
             continue
 
-        components = _collect_machining_components_from_bom(
-            bom_no,
-            source_qty,
-            bom_cache=bom_cache,
-        )
+        components = {
+            item_code: qty_per_unit * source_qty
+            for item_code, qty_per_unit in (explosions.get(bom_no) or {}).items()
+            if qty_per_unit * source_qty > 0
+        }
         if not components:
             skipped.append({
                 "sales_order": source.get("sales_order"),
@@ -612,43 +621,165 @@ def _build_machining_demand_from_sources(sources):
     return demand_map, skipped
 
 
-def _collect_machining_components_from_bom(bom_no, qty, bom_cache=None, visited=None):
-    bom_cache = bom_cache if bom_cache is not None else {}
-    visited = set(visited or [])
-    components = defaultdict(float)
+def get_machining_bom_explosions(bom_nos):
+    """
+    Return {bom_no: {machining_item_code: qty per unit of the BOM item}}.
+
+    Explosions are kept in a redis hash shared by all planner runs; BOMs that
+    are not cached yet are exploded together from bulk BOM/BOM Item reads.
+    The hash is dropped by invalidate_machining_bom_explosion_cache whenever a
+    BOM is submitted, cancelled or changed after submit.
+    """
+    bom_nos = sorted(bom_no for bom_no in bom_nos if bom_no)
+    cache = frappe.cache()
+    explosions = {}
+    missing = []
+    for bom_no in bom_nos:
+        explosion = cache.hget(MACHINING_BOM_EXPLOSION_CACHE_KEY, bom_no)
+        if explosion is None:
+            missing.append(bom_no)
+        else:
+            explosions[bom_no] = explosion
+
+    if missing:
+        built = _build_machining_bom_explosions(missing)
+        for bom_no, explosion in built.items():
+            cache.hset(MACHINING_BOM_EXPLOSION_CACHE_KEY, bom_no, explosion)
+        for bom_no in missing:
+            explosions[bom_no] = built.get(bom_no) or {}
+
+    return explosions
 
-    if not bom_no or bom_no in visited:
-        return components
 
-    visited.add(bom_no)
-    bom_doc = frappe.get_cached_doc("BOM", bom_no)
-    bom_qty = flt(bom_doc.quantity) or 1
+def invalidate_machining_bom_explosion_cache(doc=None, method=None):
+    """BOM on_submit/on_cancel/on_update_after_submit: drop all cached explosions."""
+    frappe.cache().delete_key(MACHINING_BOM_EXPLOSION_CACHE_KEY)
 
-    for row in bom_doc.items:
-        item_code = row.item_code
-        row_qty = flt(row.stock_qty or row.qty) / bom_qty * flt(qty)
+
+def _build_machining_bom_explosions(bom_nos):
+    bom_tree = _get_machining_bom_tree(bom_nos)
+    explosions = {}
+    for bom_no in bom_nos:
+        _explode_machining_bom(bom_no, bom_tree, explosions, set())
+    return explosions
+
+
+def _get_machining_bom_tree(bom_nos):
+    """
+    Load every BOM reachable from bom_nos level by level.
+
+    Returns {bom_no: {"quantity": qty, "rows": [rows]}}; each row carries the
+    resolved child BOM (the row BOM if active and submitted, otherwise the
+    item's default BOM) in child_bom.
+    """
+    bom_tree = {}
+    pending = set(bom_nos)
+
+    while pending:
+        level = sorted(pending)
+        quantities = {}
+        rows_by_bom = defaultdict(list)
+        for start in range(0, len(level), MACHINING_BOM_CHUNK_SIZE):
+            chunk = level[start:start + MACHINING_BOM_CHUNK_SIZE]
+            for bom in frappe.db.sql(
+                """
+                SELECT name, quantity
+                FROM `tabBOM`
+                WHERE name IN %(boms)s
+                """,
+                {"boms": chunk},
+                as_dict=True,
+            ):
+                quantities[bom.name] = flt(bom.quantity) or 1
+
+            for row in frappe.db.sql(
+                """
+                SELECT parent, item_code, bom_no, stock_qty, qty
+                FROM `tabBOM Item`
+                WHERE parenttype = 'BOM'
+                    AND parent IN %(boms)s
+                ORDER BY parent, idx
+                """,
+                {"boms": chunk},
+                as_dict=True,
+            ):
+                rows_by_bom[row.parent].append(row)
+
+        child_rows = [
+            row
+            for rows in rows_by_bom.values()
+            for row in rows
+            if not _is_machining_item_code(row.item_code)
+        ]
+        _resolve_child_boms(child_rows)
+
+        for bom_no in level:
+            if bom_no in quantities:
+                bom_tree[bom_no] = {
+                    "quantity": quantities[bom_no],
+                    "rows": rows_by_bom.get(bom_no) or [],
+                }
+
+        pending = {
+            row.child_bom
+            for row in child_rows
+            if row.child_bom and row.child_bom not in bom_tree
+        } - set(level)
+
+    return bom_tree
+
+
+def _resolve_child_boms(rows):
+    explicit_boms = sorted({row.bom_no for row in rows if row.bom_no})
+    valid_boms = set()
+    for start in range(0, len(explicit_boms), MACHINING_BOM_CHUNK_SIZE):
+        valid_boms.update(frappe.db.sql_list(
+            """
+            SELECT name
+            FROM `tabBOM`
+            WHERE name IN %(boms)s
+                AND is_active = 1
+                AND docstatus = 1
+            """,
+            {"boms": explicit_boms[start:start + MACHINING_BOM_CHUNK_SIZE]},
+        ))
+
+    default_boms = _get_default_boms_for_items({
+        row.item_code for row in rows if row.bom_no not in valid_boms
+    })
+    for row in rows:
+        row.child_bom = row.bom_no if row.bom_no in valid_boms else default_boms.get(row.item_code)
+
+
+def _explode_machining_bom(bom_no, bom_tree, explosions, visiting):
+    if bom_no in explosions:
+        return explosions[bom_no]
+    # A BOM that is missing or already on the current path adds nothing.
+    if bom_no in visiting or bom_no not in bom_tree:
+        return {}
+
+    visiting.add(bom_no)
+    bom = bom_tree[bom_no]
+    components = defaultdict(float)
+    for row in bom["rows"]:
+        row_qty = flt(row.stock_qty or row.qty) / bom["quantity"]
         if row_qty <= 0:
             continue
 
-        if _is_machining_item_code(item_code):
-            components[item_code] += row_qty
+        if _is_machining_item_code(row.item_code):
+            components[row.item_code] += row_qty
             continue
 
-        child_bom = _get_valid_child_bom(row, bom_cache)
-        if not child_bom:
+        if not row.child_bom:
             continue
 
-        child_components = _collect_machining_components_from_bom(
-            child_bom,
-            row_qty,
-            bom_cache=bom_cache,
-            visited=visited,
-        )
+        child_components = _explode_machining_bom(row.child_bom, bom_tree, explosions, visiting)
         for child_item_code, child_qty in child_components.items():
-            components[child_item_code] += child_qty
+            components[child_item_code] += child_qty * row_qty
 
-    visited.remove(bom_no)
-    return components
+    visiting.remove(bom_no)
+    explosions[bom_no] = dict(components)
+    return explosions[bom_no]
 
 
 def _add_machining_demand(demand_map, item_code, qty, source):
@@ -838,49 +969,27 @@ def _consume_due_work_order_supply(work_orders, expected_date):
 
 
 def _get_default_boms_for_items(item_codes):
-    bom_cache = {}
-    return {
-        item_code: _get_default_active_bom(item_code, bom_cache)
-        for item_code in item_codes
-    }
-
-
-def _get_default_active_bom(item_code, bom_cache=None):
-    if not item_code:
-        return None
-
-    if bom_cache is not None and item_code in bom_cache:
-        return bom_cache[item_code]
-
-    bom_no = frappe.db.get_value(
-        "BOM",
-        {
-            "item": item_code,
-            "is_active": 1,
-            "is_default": 1,
-            "docstatus": 1,
-        },
-        "name",
-        order_by="modified desc",
-    )
-
-    if bom_cache is not None:
-        bom_cache[item_code] = bom_no
-    return bom_no
-
-
-def _get_valid_child_bom(row, bom_cache=None):
-    if row.bom_no:
-        bom_status = frappe.db.get_value(
-            "BOM",
-            row.bom_no,
-            ["is_active", "docstatus"],
+    """Return {item_code: newest active, submitted default BOM or None}."""
+    item_codes = sorted(item_code for item_code in item_codes if item_code)
+    bom_by_item = dict.fromkeys(item_codes)
+    for start in range(0, len(item_codes), MACHINING_BOM_CHUNK_SIZE):
+        rows = frappe.db.sql(
+            """
+            SELECT item, name
+            FROM `tabBOM`
+            WHERE item IN %(items)s
+                AND is_active = 1
+                AND is_default = 1
+                AND docstatus = 1
+            ORDER BY modified DESC
+            """,
+            {"items": item_codes[start:start + MACHINING_BOM_CHUNK_SIZE]},
             as_dict=True,
         )
-        if bom_status and cint(bom_status.is_active) and cint(bom_status.docstatus) == 1:
-            return row.bom_no
-
-    return _get_default_active_bom(row.item_code, bom_cache)
+        for row in rows:
+            if not bom_by_item.get(row.item):
+                bom_by_item[row.item] = row.name
+    return bom_by_item
 
 
 def _create_draft_machining_work_order(
@@ -1158,20 +1267,121 @@ def _date_to_string(value):
     return getdate(value).strftime("%Y-%m-%d") if value else None
 
 
-def create_work_orders_based_on_reorder_levels():
-    # Fetch all items with BOMs
-    items_with_bom = frappe.db.sql("""
-        SELECT name, item_name, reorder_level, default_bom, item_code
-        FROM `tabItem`
-        WHERE default_bom IS NOT NULL
-        AND default_bom != ''
-        AND include_item_in_manufacturing = 1
-        AND item_code NOT LIKE '4%'
-        AND item_code NOT LIKE '5%'
-    """, as_dict=True)
+@frappe.whitelist()
+def create_work_orders_based_on_reorder_levels(dry_run=0, commit=1):
+    """
+    Create draft Work Orders for manufactured items whose stock is below their
+    reorder level, and delete the Administrator drafts of items that are back
+    above it.
+
+    Stock, default BOMs, open Work Orders, Administrator drafts and default
+    drawings are loaded for all candidate items at once; the shortage list is
+    computed in memory and the drafts are then created/deleted, committing
+    every REORDER_WORK_ORDER_BATCH_SIZE changes. With dry_run the planned
+    changes are returned without touching any Work Order.
+    """
+    dry_run = cint(dry_run)
+    commit = cint(commit)
+    items = _get_reorder_level_items()
+    item_codes = [item.name for item in items]
+
+    stock_by_item = _get_stock_balance_for_items(item_codes)
+    bom_by_item = _get_default_boms_for_items(item_codes)
+    open_work_orders = _get_open_reorder_work_orders(item_codes)
+    drafts_by_item = _get_administrator_draft_work_orders_by_item(item_codes)
+    drawing_by_item = _get_default_drawings_by_item(item_codes)
+
+    created = []
+    deleted = []
+    existing = []
+    skipped = []
+    pending_changes = 0
+
+    for item in items:
+        item_code = item.name
+        current_stock = flt(stock_by_item.get(item_code))
+        reorder_level = flt(item.reorder_level)
+        # an item's changes are only kept (and reported) when all of them succeed
+        item_created = []
+        item_deleted = []
+        item_changes = 0
+
+        if not dry_run:
+            frappe.db.savepoint(REORDER_WORK_ORDER_SAVEPOINT)
+        try:
+            if current_stock >= reorder_level:
+                for work_order_name in drafts_by_item.get(item_code) or []:
+                    if not dry_run:
+                        frappe.delete_doc("Work Order", work_order_name, force=1)
+                        item_changes += 1
+                    item_deleted.append({"item_code": item_code, "work_order": work_order_name})
+            else:
+                required_qty = reorder_level - current_stock
+                bom_no = bom_by_item.get(item_code)
+                row = {
+                    "item_code": item_code,
+                    "current_stock": current_stock,
+                    "reorder_level": reorder_level,
+                    "required_qty": required_qty,
+                    "bom_no": bom_no,
+                }
+                if not bom_no:
+                    frappe.log_error(f"No default BOM found for item {item_code}", "Work Order Creation Error")
+                    row["reason"] = _("No active submitted default BOM found for item")
+                    skipped.append(row)
+                elif (item_code, bom_no) in open_work_orders:
+                    row["work_order"] = open_work_orders[(item_code, bom_no)]
+                    existing.append(row)
+                else:
+                    row.update({
+                        "qty": int(required_qty * 1.2),
+                        "priority": _get_reorder_priority(required_qty),
+                        "drawing": drawing_by_item.get(item_code),
+                        "work_order": None,
+                    })
+                    if not dry_run:
+                        row["work_order"] = _create_reorder_work_order(row).name
+                        item_changes += 1
+                    item_created.append(row)
+        except Exception as err:
+            if not dry_run:
+                # drop this item's partial writes so the next batch commit does not keep them
+                frappe.db.rollback(save_point=REORDER_WORK_ORDER_SAVEPOINT)
+            frappe.log_error(
+                frappe.get_traceback(),
+                _("Reorder level Work Order creation failed for {0}").format(item_code),
+            )
+            skipped.append({"item_code": item_code, "reason": str(err) or err.__class__.__name__})
+            continue
+
+        created.extend(item_created)
+        deleted.extend(item_deleted)
+        pending_changes += item_changes
+
+        if commit and pending_changes >= REORDER_WORK_ORDER_BATCH_SIZE:
+            frappe.db.commit()
+            pending_changes = 0
+
+    if commit and pending_changes:
+        frappe.db.commit()
+
+    return {
+        "dry_run": dry_run,
+        "item_count": len(items),
+        "created_count": len(created),
+        "deleted_count": len(deleted),
+        "existing_count": len(existing),
+        "skipped_count": len(skipped),
+        "created": created,
+        "deleted": deleted,
+        "existing": existing,
+        "skipped": skipped,
+    }
+
 
+def _get_reorder_level_items():
     if TEST_MODE:
-        items_with_bom = frappe.get_all(
+        return frappe.get_all(
             "Item",
             filters={
                 "default_bom": ["is", "set"],
@@ -1181,128 +1391,122 @@ def create_work_orders_based_on_reorder_levels():
             fields=["name", "item_name", "reorder_level"]
         )
 
-    for item in items_with_bom:
-        if TEST_MODE: print("item:",item)
-        current_stock = get_stock_balance(item["name"])
-        reorder_level = flt(item["reorder_level"])
-        if TEST_MODE: print("current_stock:",current_stock," / reorder_level:",reorder_level)
-        if current_stock < reorder_level:
-            required_qty = reorder_level - current_stock
-            if TEST_MODE: print("required_qty:",required_qty)
-            process_bom_and_create_work_orders(item["name"], required_qty)
-        else:
-            delete_draft_wo(item["name"])
+    return frappe.db.sql("""
+        SELECT name, item_name, reorder_level, default_bom, item_code
+        FROM `tabItem`
+        WHERE default_bom IS NOT NULL
+        AND default_bom != ''
+        AND include_item_in_manufacturing = 1
+        AND item_code NOT LIKE '4%'
+        AND item_code NOT LIKE '5%'
+    """, as_dict=True)
 
-def get_stock_balance(item_code, warehouse=("Main Stock - AMF21", "Assemblies - AMF21")):
-    """Get current stock balance for an item in a specific warehouse."""
-    stock_ledger_entry = frappe.db.sql("""
-        SELECT SUM(actual_qty) as actual_qty 
-        FROM `tabBin`
-        WHERE item_code = %s AND warehouse IN %s
-    """, (item_code, warehouse), as_dict=True)
-    return flt(stock_ledger_entry[0].get("actual_qty", 0)) if stock_ledger_entry else 0
 
-def process_bom_and_create_work_orders(item_code, required_qty, parent_work_order=None):
-    """Process BOM and create work orders for items and sub-assemblies."""
-    # Fetch the default BOM for the item
-    bom = frappe.get_value("BOM", {"item": item_code, "is_active": 1, "is_default": 1}, "name")
-    if TEST_MODE: print("bom:",bom)
-    if not bom:
-        frappe.log_error(f"No default BOM found for item {item_code}", "Work Order Creation Error")
-        return
+def _get_open_reorder_work_orders(item_codes):
+    """Return {(production_item, bom_no): name} of draft or not completed Work Orders."""
+    if not item_codes:
+        return {}
 
-    # Fetch BOM items
-    #bom_items = get_exploded_items(bom)
-    
-    # Check for existing draft or ongoing work orders
-    existing_work_order = frappe.db.exists(
-        "Work Order",
-        {
-            "production_item": item_code,
-            "bom_no": bom,
-            "docstatus": ["<", 2],  # 0 for draft, 1 for submitted but not completed/cancelled
-            "status": ["in", ["Draft", "In Process", "Not Started"]]
-        }
+    rows = frappe.db.sql(
+        """
+        SELECT name, production_item, bom_no
+        FROM `tabWork Order`
+        WHERE production_item IN %(item_codes)s
+            AND docstatus < 2
+            AND status IN ('Draft', 'In Process', 'Not Started')
+        ORDER BY creation
+        """,
+        {"item_codes": tuple(item_codes)},
+        as_dict=True,
     )
+    open_work_orders = {}
+    for row in rows:
+        open_work_orders.setdefault((row.production_item, row.bom_no), row.name)
+    return open_work_orders
 
-    if not existing_work_order:
-        #print("Creating WO for item:",item_code)
-        # Create work order for the current item
-        # Determine priority based on required_qty
-        if required_qty <= 1:
-            priority = 10
-        elif required_qty <= 5:
-            priority = 9
-        elif required_qty <= 10:
-            priority = 8
-        elif required_qty <= 20:
-            priority = 7
-        elif required_qty <= 50:
-            priority = 6
-        else:
-            priority = 5
-            
-        # Fetch the drawing value from the drawing_item child table
-        drawing = frappe.db.get_value(
-            "Drawing Item",
-            {
-                "parent": item_code,  # Link to the Item doctype
-                "is_default": 1,
-                "is_active": 1
-            },
-            "drawing"
-        )
-        
-        work_order = frappe.get_doc({
-            "doctype": "Work Order",
-            "production_item": item_code,
-            "qty": int(required_qty * 1.2),
-            "bom_no": bom,
-            "parent_work_order": parent_work_order,
-            "priority": priority,
-            "progress": "En Attente",
-            "machine": "CMZ" if item_code.startswith("20") else "CMZ" if item_code.startswith("10") else None,
-            "drawing": drawing
-        })
-        work_order.insert()
-        frappe.db.commit()  # Commit the transaction if you're running this in a script
-        # work_order.submit()
-    else:
-        print("existing_work_order found:",existing_work_order,"for item:",item_code)
 
-    # # Recursively process sub-assemblies
-    # for bom_item in bom_items:
-    #     sub_item_code = bom_item["item_code"]
-    #     sub_item_qty = flt(bom_item["qty"]) * required_qty
+def _get_administrator_draft_work_orders_by_item(item_codes):
+    if not item_codes:
+        return {}
 
-    #     # Check if sub-item has a BOM
-    #     has_bom = frappe.get_value("Item", sub_item_code, "has_bom")
-    #     if has_bom:
-    #         process_bom_and_create_work_orders(sub_item_code, sub_item_qty, work_order.name)
-    return None
+    rows = frappe.db.sql(
+        """
+        SELECT name, production_item
+        FROM `tabWork Order`
+        WHERE production_item IN %(item_codes)s
+            AND docstatus = 0
+            AND owner = 'Administrator'
+        ORDER BY creation
+        """,
+        {"item_codes": tuple(item_codes)},
+        as_dict=True,
+    )
+    drafts_by_item = defaultdict(list)
+    for row in rows:
+        drafts_by_item[row.production_item].append(row.name)
+    return drafts_by_item
 
-def delete_draft_wo(item_code):
-    """
-    Find and delete all 'Draft' Work Orders whose production_item matches the given item_code.
-    """
-    # Retrieve all draft Work Orders for the item_code
-    draft_wos = frappe.get_all(
-        "Work Order",
-        filters={
-            "production_item": item_code,
-            "docstatus": 0,  # draft,
-            "owner": "Administrator"
-        },
-        fields=["name"]
+
+def _get_default_drawings_by_item(item_codes):
+    if not item_codes:
+        return {}
+
+    rows = frappe.db.sql(
+        """
+        SELECT parent, drawing
+        FROM `tabDrawing Item`
+        WHERE parent IN %(item_codes)s
+            AND is_default = 1
+            AND is_active = 1
+        ORDER BY idx
+        """,
+        {"item_codes": tuple(item_codes)},
+        as_dict=True,
     )
+    drawing_by_item = {}
+    for row in rows:
+        drawing_by_item.setdefault(row.parent, row.drawing)
+    return drawing_by_item
+
+
+def _get_reorder_priority(required_qty):
+    if required_qty <= 1:
+        return 10
+    elif required_qty <= 5:
+        return 9
+    elif required_qty <= 10:
+        return 8
+    elif required_qty <= 20:
+        return 7
+    elif required_qty <= 50:
+        return 6
+    return 5
 
-    # Delete each draft Work Order
-    for wo in draft_wos:
-        print("deleting",wo.name,"for item",item_code)
-        frappe.delete_doc("Work Order", wo.name, force=1)
-        frappe.db.commit()  # Commit after each deletion if needed
 
-    return None
+def _create_reorder_work_order(row):
+    item_code = row["item_code"]
+    work_order = frappe.get_doc({
+        "doctype": "Work Order",
+        "production_item": item_code,
+        "qty": row["qty"],
+        "bom_no": row["bom_no"],
+        "priority": row["priority"],
+        "progress": "En Attente",
+        "machine": "CMZ" if item_code.startswith(MACHINING_ITEM_PREFIXES) else None,
+        "drawing": row["drawing"],
+    })
+    work_order.insert()
+    return work_order
+
+
+def get_stock_balance(item_code, warehouse=("Main Stock - AMF21", "Assemblies - AMF21")):
+    """Get current stock balance for an item in a specific warehouse."""
+    stock_ledger_entry = frappe.db.sql("""
+        SELECT SUM(actual_qty) as actual_qty 
+        FROM `tabBin`
+        WHERE item_code = %s AND warehouse IN %s
+    """, (item_code, warehouse), as_dict=True)
+    return flt(stock_ledger_entry[0].get("actual_qty", 0)) if stock_ledger_entry else 0
 
 def get_exploded_items(bom_name):
     """Fetch exploded items from the BOM doctype."""
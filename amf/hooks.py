@@ -70,6 +70,26 @@ doctype_list_js = {
 # ---------------
 
 doc_events = {
+    "*": {
+        # Coalesce per submitted/cancelled document: Bin -> Item.bom_table stock_qty
+        # updates and the batches to re-check for auto-disable.
+        "before_submit": [
+            "amf.amf.utils.bin_bom_sync.begin_bom_stock_qty_sync_scope",
+            "amf.amf.utils.batch_auto_disable.begin_dirty_batch_collection",
+        ],
+        "before_cancel": [
+            "amf.amf.utils.bin_bom_sync.begin_bom_stock_qty_sync_scope",
+            "amf.amf.utils.batch_auto_disable.begin_dirty_batch_collection",
+        ],
+        "on_submit": [
+            "amf.amf.utils.bin_bom_sync.flush_bom_stock_qty_sync_scope",
+            "amf.amf.utils.batch_auto_disable.queue_dirty_batches",
+        ],
+        "on_cancel": [
+            "amf.amf.utils.bin_bom_sync.flush_bom_stock_qty_sync_scope",
+            "amf.amf.utils.batch_auto_disable.queue_dirty_batches",
+        ],
+    },
     "Batch": {
         "autoname": "amf.amf.utils.batch_naming.apply_amf_batch_autoname",
         "after_insert": "amf.amf.utils.barcode.after_insert_handler",
@@ -82,9 +102,18 @@ doc_events = {
             "amf.amf.utils.bom_updating.bom_before_save",
             "amf.amf.utils.bom_child_bom_resolver.apply_item_default_boms_to_rows",
         ],
-        "on_submit": "amf.amf.utils.bom_mgt.update_item_from_default_bom",
-        "on_cancel": "amf.amf.utils.bom_mgt.update_item_from_default_bom",
-        "on_update_after_submit": "amf.amf.utils.bom_mgt.update_item_from_default_bom",
+        "on_submit": [
+            "amf.amf.utils.bom_mgt.update_item_from_default_bom",
+            "amf.amf.utils.work_order_creation.invalidate_machining_bom_explosion_cache",
+        ],
+        "on_cancel": [
+            "amf.amf.utils.bom_mgt.update_item_from_default_bom",
+            "amf.amf.utils.work_order_creation.invalidate_machining_bom_explosion_cache",
+        ],
+        "on_update_after_submit": [
+            "amf.amf.utils.bom_mgt.update_item_from_default_bom",
+            "amf.amf.utils.work_order_creation.invalidate_machining_bom_explosion_cache",
+        ],
     },
     "Contact": {
         "autoname": "amf.master_crm.naming.contact_autoname",
@@ -109,8 +138,14 @@ doc_events = {
             "amf.amf.doctype.loan_order.loan_order.update_linked_loan_order",
         ],
         "before_submit": "amf.amf.utils.delivery_note_api.check_qa_inspections_status",
-        "on_submit": "amf.amf.doctype.loan_order.loan_order.update_linked_loan_order",
-        "on_cancel": "amf.amf.doctype.loan_order.loan_order.update_linked_loan_order",
+        "on_submit": [
+            "amf.amf.doctype.loan_order.loan_order.update_linked_loan_order",
+            "amf.amf.doctype.operations_kpi_period_snapshot.operations_kpi_period_snapshot.invalidate_period_snapshots_for_delivery_note",
+        ],
+        "on_cancel": [
+            "amf.amf.doctype.loan_order.loan_order.update_linked_loan_order",
+            "amf.amf.doctype.operations_kpi_period_snapshot.operations_kpi_period_snapshot.invalidate_period_snapshots_for_delivery_note",
+        ],
     },
     "Item": {
         "onload": "amf.amf.utils.item_costing.populate_item_batch_costing_table",
@@ -143,9 +178,18 @@ doc_events = {
         ],
     },
     "Sales Order": {
-        "on_submit": "amf.master_crm.customer_marketing.sync_customer_marketing_from_sales_order",
-        "on_cancel": "amf.master_crm.customer_marketing.sync_customer_marketing_from_sales_order",
-        "on_update_after_submit": "amf.master_crm.customer_marketing.sync_customer_marketing_from_sales_order",
+        "on_submit": [
+            "amf.master_crm.customer_marketing.sync_customer_marketing_from_sales_order",
+            "amf.amf.utils.sales_order_submit_time.set_sales_order_submitted_at",
+        ],
+        "on_cancel": [
+            "amf.master_crm.customer_marketing.sync_customer_marketing_from_sales_order",
+            "amf.amf.doctype.operations_kpi_period_snapshot.operations_kpi_period_snapshot.invalidate_period_snapshots_for_sales_order",
+        ],
+        "on_update_after_submit": [
+            "amf.master_crm.customer_marketing.sync_customer_marketing_from_sales_order",
+            "amf.amf.doctype.operations_kpi_period_snapshot.operations_kpi_period_snapshot.invalidate_period_snapshots_for_sales_order",
+        ],
     },
     "Project": {
         "before_insert": "amf.amf.utils.project_id.assign_project_id",
@@ -161,7 +205,11 @@ doc_events = {
         ],
     },
     "Stock Ledger Entry": {
-        "on_submit": "amf.amf.utils.batch_auto_disable.queue_batch_disabled_state_sync",
+        "on_submit": [
+            "amf.amf.utils.batch_auto_disable.queue_batch_disabled_state_sync",
+            "amf.amf.doctype.item_daily_outflow.item_daily_outflow.update_item_daily_outflow",
+            "amf.amf.doctype.stock_balance_semester_snapshot.stock_balance_semester_snapshot.invalidate_stock_balance_snapshots",
+        ],
     },
     "Stock Entry": {
         "onload": "amf.amf.utils.stock_entry.stock_entry_onload",
@@ -223,6 +271,9 @@ scheduler_events = {
         "amf.amf.utils.item_mgt.update_all_item_valuation_rates_enq",
         "amf.amf.utils.cleaning.enqueue_log_cleanup",
     ],
+    "daily_long": [
+        "amf.amf.utils.semester_aggregation.refresh_semester_facts",
+    ],
     "monthly_long": [
         "amf.amf.utils.bom_hierarchy_sync.enqueue_sync_latest_bom_hierarchy_for_all_items",
         #"amf.amf.utils.monthly_operations_report.generate_previous_month_report",
@@ -259,5 +310,6 @@ after_migrate = [
     "amf.amf.utils.quotation_product_definition.sync_quotation_product_definition_custom_fields",
     "amf.amf.utils.work_order_scrap.sync_work_order_usage_scrap_custom_fields",
     "amf.amf.utils.sales_order_otif.sync_sales_order_otif_custom_fields",
+    "amf.amf.utils.sales_order_submit_time.sync_sales_order_submit_time_custom_fields",
     "amf.amf.utils.kpi_dashboard.sync_supply_chain_manufacturing_dashboard",
 ]
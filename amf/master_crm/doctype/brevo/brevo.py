@@ -7,12 +7,22 @@ import frappe
 from frappe.model.document import Document
 from frappe.utils.password import get_decrypted_password
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import hashlib
 import json
+import pytz
 from frappe.utils.background_jobs import enqueue
-from frappe.utils import cint
-from datetime import datetime
+from frappe.utils import cint, cstr, get_datetime, get_time_zone, now_datetime
 
 API_HOST = "https://api.brevo.com/v3/"
+CONTACT_PAGE_SIZE = 500
+# Contact fields written from Brevo attributes and compared to skip unchanged contacts
+CONTACT_SYNC_FIELDS = ("first_name", "last_name", "deliverability", "source", "event_source")
+REQUEST_TIMEOUT = 60
+REQUEST_RETRIES = 5
+REQUEST_BACKOFF_FACTOR = 1
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
 
 class Brevo(Document):
     def get_api_key(self):
@@ -28,64 +38,110 @@ class Brevo(Document):
         return
     
     def get_all_contacts(self, sync=False):
-        contacts = []
-        limit = 50
+        """
+        Page through the Brevo contacts. With sync, only contacts modified
+        since the last sync are requested and applied page by page; the
+        checkpoint only moves once all pages went through.
+        """
+        contacts = 0
+        summary = {'new': 0, 'updated': 0, 'unchanged': 0}
+        limit = CONTACT_PAGE_SIZE
         offset = 0
         modified_since = None
+        sync_started = now_datetime()
         if sync:
             modified_since = self.last_sync
-            
+            event_sources = set(frappe.db.sql_list("""SELECT `name` FROM `tabEvent Source`"""))
+
         _contact = self.get_contacts(limit, offset, modified_since)
         while _contact:
-            for c in _contact:
-                contacts.append(c)
-                if sync:
-                    self.sync_contact(c)
-                    
+            contacts += len(_contact)
+            if sync:
+                for key, count in self.sync_contact_page(_contact, event_sources).items():
+                    summary[key] += count
+                frappe.db.commit()
+
+            if len(_contact) < limit:
+                break
             offset += limit
             _contact = self.get_contacts(limit, offset, modified_since)
-        
-        self.last_sync = datetime.now()
-        self.save()
-        frappe.db.commit()
-        return "Received {0} contacts".format(len(contacts))
-        
+
+        if sync:
+            # checkpoint at the start of this run: contacts changed while
+            # syncing are picked up by the next run
+            self.last_sync = sync_started
+            self.save()
+            frappe.db.commit()
+            return "Received {0} contacts ({1} new, {2} updated, {3} unchanged)".format(
+                contacts, summary['new'], summary['updated'], summary['unchanged'])
+        return "Received {0} contacts".format(contacts)
+
+    def sync_contact_page(self, brevo_contacts, event_sources=None):
+        """Apply one page of Brevo contacts, matched to Contacts by email with one query."""
+        if event_sources is None:
+            event_sources = set(frappe.db.sql_list("""SELECT `name` FROM `tabEvent Source`"""))
+        contact_index = get_contact_index([c.get("email") for c in brevo_contacts])
+        summary = {'new': 0, 'updated': 0, 'unchanged': 0}
+
+        for brevo_contact in brevo_contacts:
+            email = cstr(brevo_contact.get("email")).strip()
+            if not email:
+                continue
+            values = get_contact_values(brevo_contact.get("attributes") or {}, event_sources)
+            existing = contact_index.get(email.lower())
+            if existing and get_values_hash(existing) == get_values_hash(values):
+                summary['unchanged'] += 1
+                continue
+
+            contact = self.apply_contact_values(email, existing.name if existing else None, values)
+            # a later duplicate of the same email on this page updates this contact
+            contact_index[email.lower()] = frappe._dict(values, name=contact.name)
+            summary['updated' if existing else 'new'] += 1
+
+        return summary
+
     def sync_contact(self, brevo_contact):
-        contact_matches = frappe.get_all("Contact", filters={'email_id': brevo_contact.get("email")}, fields=['name'])
-        attributes = brevo_contact.get("attributes")
-        if len(contact_matches) == 0:
+        self.sync_contact_page([brevo_contact])
+        frappe.db.commit()
+        return
+
+    def apply_contact_values(self, email, contact_name, values):
+        if not contact_name:
             # create new
             contact = frappe.get_doc({
                 'doctype': 'Contact',
-                'email_id': brevo_contact.get("email")
+                'email_id': email
             })
             contact.append('email_ids', {
-                'email_id': brevo_contact.get("email"),
+                'email_id': email,
                 'is_primary': 1
             })
         else:
             # update
-            contact = frappe.get_doc("Contact", contact_matches[0]['name'])
-        
-        contact.update({
-            'first_name': attributes.get("PRENOM"),
-            'last_name': attributes.get("NOM"),
-            'full_name': "{0} {1}".format(attributes.get("PRENOM") or "", attributes.get("NOM") or ""),
-            'deliverability': attributes.get("DELIVRABILITE"),
-            'source': attributes.get("FROM"),
-            'event_source': attributes.get("SOURCE") if frappe.db.exists("Event Source", attributes.get("SOURCE")) else None
-        })
-        
-        # rewrite some variable conflicts
-        if contact.deliverability == "OK - AMF":
-            contact.deliverability = "OK"
-            
+            contact = frappe.get_doc("Contact", contact_name)
+
+        contact.update(values)
+        contact.full_name = "{0} {1}".format(values.get('first_name') or "", values.get('last_name') or "")
         contact.flags.ignore_mandatory = True
         contact.flags.ignore_validate = True
         contact.save()
-        frappe.db.commit()
-        return
-            
+        return contact
+
+    def get_session(self):
+        """Pooled keep-alive session; GET requests are retried with backoff (honours Retry-After)."""
+        if not getattr(self, "_session", None):
+            retry = Retry(
+                total=REQUEST_RETRIES,
+                backoff_factor=REQUEST_BACKOFF_FACTOR,
+                status_forcelist=RETRY_STATUS_CODES,
+            )
+            session = requests.Session()
+            adapter = HTTPAdapter(max_retries=retry)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._session = session
+        return self._session
+
     def get_contacts(self, limit, offset, modified_since=None):
         parameters = {
             # 'modifiedSince': 'YYYY-MM-DDTHH:mm:ss.SSSZ',
@@ -94,14 +150,16 @@ class Brevo(Document):
             #'sort': 'desc',
         }
         if modified_since:
-            if type(modified_since) == str:
-                modified_since = datetime.strptime(modified_since[:19], "%Y-%m-%d %H:%M:%S")
-            parameters['modifiedSince'] = modified_since.strftime("%Y-%m-%dT%H:%M:%S.000Z")
-            
+            parameters['modifiedSince'] = to_utc_timestamp(modified_since)
+
         endpoint = "{0}contacts".format(API_HOST)
 
-        response = requests.get(endpoint, headers=self.get_headers(), params=parameters)
-        
+        response = self.get_session().get(endpoint, headers=self.get_headers(), params=parameters,
+            timeout=REQUEST_TIMEOUT)
+
+        if response.status_code != 200:
+            frappe.throw("Error {0}: {1}".format(response.status_code, response.text))
+
         contacts = response.json().get('contacts')      # list of contacts
         
         """ contacts structure:
@@ -154,7 +212,8 @@ class Brevo(Document):
         }
         endpoint = "{0}contacts/lists".format(API_HOST)
 
-        response = requests.get(endpoint, headers=self.get_headers(), params=parameters)
+        response = self.get_session().get(endpoint, headers=self.get_headers(), params=parameters,
+            timeout=REQUEST_TIMEOUT)
         
         lists = response.json().get('lists')      # list of contacts
         
@@ -225,7 +284,8 @@ class Brevo(Document):
         }
         endpoint = "{0}contacts/folders".format(API_HOST)
 
-        response = requests.get(endpoint, headers=self.get_headers(), params=parameters)
+        response = self.get_session().get(endpoint, headers=self.get_headers(), params=parameters,
+            timeout=REQUEST_TIMEOUT)
         
         folders = response.json().get('folders')      # list of contacts
         
@@ -336,7 +396,8 @@ class Brevo(Document):
         }
         endpoint = "{0}contacts/{1}/campaignStats".format(API_HOST, contact_email)
         
-        response = requests.get(endpoint, headers=self.get_headers(), params=parameters)
+        response = self.get_session().get(endpoint, headers=self.get_headers(), params=parameters,
+            timeout=REQUEST_TIMEOUT)
         
         campaign_stats = response.json()       # campaign stats
         
@@ -409,7 +470,8 @@ class Brevo(Document):
         }
         endpoint = "{0}emailCampaigns".format(API_HOST)
 
-        response = requests.get(endpoint, headers=self.get_headers(), params=parameters)
+        response = self.get_session().get(endpoint, headers=self.get_headers(), params=parameters,
+            timeout=REQUEST_TIMEOUT)
         
         if response.status_code != 200:
             frappe.throw("Error {0}: {1}".format(response.status_code, response.text))
@@ -499,6 +561,48 @@ def sync_contacts():
     brevo = frappe.get_doc("Brevo", "Brevo")
     brevo.get_all_contacts(sync=True)
     return
+
+def get_contact_index(emails):
+    """Return {lower-case email: Contact values} for the given emails, in one query."""
+    emails = tuple(set(cstr(email).strip() for email in emails if email))
+    if not emails:
+        return {}
+
+    index = {}
+    for contact in frappe.db.sql("""
+            SELECT `name`, `email_id`, {fields}
+            FROM `tabContact`
+            WHERE `email_id` IN %(emails)s
+            ORDER BY `modified` DESC""".format(fields=", ".join("`{0}`".format(f) for f in CONTACT_SYNC_FIELDS)),
+            {'emails': emails}, as_dict=True):
+        index.setdefault(cstr(contact.email_id).strip().lower(), contact)
+    return index
+
+def get_contact_values(attributes, event_sources):
+    """Map Brevo contact attributes to Contact fields."""
+    values = {
+        'first_name': attributes.get("PRENOM"),
+        'last_name': attributes.get("NOM"),
+        'deliverability': attributes.get("DELIVRABILITE"),
+        'source': attributes.get("FROM"),
+        'event_source': attributes.get("SOURCE") if attributes.get("SOURCE") in event_sources else None
+    }
+    # rewrite some variable conflicts
+    if values['deliverability'] == "OK - AMF":
+        values['deliverability'] = "OK"
+    return values
+
+def get_values_hash(values):
+    return hashlib.sha1(json.dumps(
+        [cstr(values.get(fieldname)) for fieldname in CONTACT_SYNC_FIELDS]
+    ).encode("utf-8")).hexdigest()
+
+def to_utc_timestamp(value):
+    """Format a system time zone datetime as the UTC timestamp Brevo expects."""
+    value = get_datetime(value)
+    if value.tzinfo is None:
+        value = pytz.timezone(get_time_zone()).localize(value)
+    return value.astimezone(pytz.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
     
 @frappe.whitelist()
 def fetch_lists(with_folders=False):
@@ -3,8 +3,124 @@
 # See license.txt
 from __future__ import unicode_literals
 
-# import frappe
+import json
+import threading
 import unittest
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import MagicMock, patch
+
+import frappe
+
+from amf.master_crm.doctype.brevo import brevo
+
+
+class _StubBrevoHandler(BaseHTTPRequestHandler):
+	protocol_version = "HTTP/1.1"
+	requests = []
+	clients = set()
+	contacts = []
+	throttle = 0
+
+	def do_GET(self):
+		self.requests.append(self.path)
+		self.clients.add(self.client_address)
+		if _StubBrevoHandler.throttle:
+			_StubBrevoHandler.throttle -= 1
+			self._send(429, {"message": "Too many requests"}, {"Retry-After": "0"})
+			return
+		query = dict(part.split("=", 1) for part in self.path.split("?", 1)[1].split("&"))
+		offset, limit = int(query["offset"]), int(query["limit"])
+		self._send(200, {"contacts": self.contacts[offset:offset + limit]})
+
+	def _send(self, status, payload, headers=None):
+		body = json.dumps(payload).encode("utf-8")
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		for key, value in (headers or {}).items():
+			self.send_header(key, value)
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, *args):
+		pass
+
+
+def _brevo_contact(email, first_name, source=None):
+	return {"email": email, "attributes": {
+		"PRENOM": first_name, "NOM": "Muster", "DELIVRABILITE": "OK - AMF", "FROM": "Web", "SOURCE": source,
+	}}
+
 
 class TestBrevo(unittest.TestCase):
-	pass
+	def test_sync_pages_with_one_connection_and_checkpoint(self):
+		server = HTTPServer(("127.0.0.1", 0), _StubBrevoHandler)
+		thread = threading.Thread(target=server.serve_forever, daemon=True)
+		thread.start()
+		_StubBrevoHandler.requests = []
+		_StubBrevoHandler.clients = set()
+		_StubBrevoHandler.throttle = 1
+		_StubBrevoHandler.contacts = [
+			_brevo_contact("new@example.com", "Anna", source="Fair"),
+			_brevo_contact("Same@Example.com", "Beat"),
+			_brevo_contact("changed@example.com", "Carla"),
+		]
+		existing = [
+			frappe._dict(name="C-1", email_id="same@example.com", first_name="Beat", last_name="Muster",
+				deliverability="OK", source="Web", event_source=None),
+			frappe._dict(name="C-2", email_id="changed@example.com", first_name="Karla", last_name="Muster",
+				deliverability="OK", source="Web", event_source=None),
+		]
+		doc = brevo.Brevo()
+		doc.last_sync = datetime(2026, 10, 1, 12, 0)
+		doc.save = MagicMock()
+		doc.apply_contact_values = MagicMock(side_effect=lambda email, name, values: frappe._dict(name=name or "C-3"))
+
+		try:
+			with patch.object(brevo, "API_HOST", "http://127.0.0.1:{0}/".format(server.server_port)), patch.object(
+				brevo, "CONTACT_PAGE_SIZE", 2
+			), patch.object(doc, "get_headers", return_value={}), patch.object(
+				brevo, "get_time_zone", return_value="Europe/Zurich"
+			), patch.object(brevo.frappe.db, "sql_list", return_value=["Fair"]), patch.object(
+				brevo.frappe.db, "sql", return_value=existing
+			) as sql, patch.object(brevo.frappe.db, "commit") as commit:
+				result = doc.get_all_contacts(sync=True)
+		finally:
+			doc.get_session().close()
+			server.shutdown()
+			server.server_close()
+
+		self.assertEqual(result, "Received 3 contacts (1 new, 1 updated, 1 unchanged)")
+		# one throttled request retried, then two pages over the same connection
+		self.assertEqual(len(_StubBrevoHandler.requests), 3)
+		self.assertEqual(len(_StubBrevoHandler.clients), 1)
+		self.assertIn("modifiedSince=2026-10-01T10%3A00%3A00.000Z", _StubBrevoHandler.requests[0])
+		self.assertEqual(sql.call_count, 2)
+		self.assertEqual(commit.call_count, 3)
+		self.assertEqual(
+			[call.args[:2] for call in doc.apply_contact_values.call_args_list],
+			[("new@example.com", None), ("changed@example.com", "C-2")],
+		)
+		self.assertEqual(doc.apply_contact_values.call_args_list[0].args[2]["event_source"], "Fair")
+		doc.save.assert_called_once_with()
+		self.assertGreater(doc.last_sync, datetime(2026, 10, 1, 12, 0))
+
+	def test_failed_page_keeps_the_checkpoint(self):
+		doc = brevo.Brevo()
+		doc.last_sync = datetime(2026, 10, 1, 12, 0)
+		doc.save = MagicMock()
+		session = MagicMock()
+		session.get.return_value.status_code = 503
+		doc._session = session
+
+		with patch.object(doc, "get_headers", return_value={}), patch.object(
+			brevo, "get_time_zone", return_value="Europe/Zurich"
+		), patch.object(brevo.frappe.db, "sql_list", return_value=[]), patch.object(
+			brevo.frappe, "throw", side_effect=Exception("Error 503")
+		):
+			with self.assertRaises(Exception):
+				doc.get_all_contacts(sync=True)
+
+		doc.save.assert_not_called()
+		self.assertEqual(doc.last_sync, datetime(2026, 10, 1, 12, 0))
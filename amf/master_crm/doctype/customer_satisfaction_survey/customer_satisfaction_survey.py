@@ -5,6 +5,7 @@
 from __future__ import unicode_literals
 import frappe
 from frappe.model.document import Document
+from amf.master_crm.organization import update_global_csat_for_contacts
 
 
 class CustomerSatisfactionSurvey(Document):
@@ -34,6 +35,8 @@ def update_contact_csat_nps(doc, method):
                             "customer_satisfaction_survey", csat_value)
         frappe.db.set_value("Contact", doc.contact_person,
                             "referral_satisfaction_survey", int(nps_value))
+        # recompute the global CSAT of the customers of this contact only
+        update_global_csat_for_contacts([doc.contact_person])
         # Optionally, if you need triggers or validations from the Contact doctype to run,
         # you could load and save:
         #
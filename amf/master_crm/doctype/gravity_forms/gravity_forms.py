@@ -9,9 +9,13 @@ import requests
 from requests.auth import HTTPBasicAuth
 from frappe.utils.password import get_decrypted_password
 import json
+from concurrent.futures import ThreadPoolExecutor
 from frappe.utils import cint
 
 API_PATH = "/wp-json/gf/v2/"
+ENTRY_PAGE_SIZE = 100
+FETCH_WORKERS = 4
+REQUEST_TIMEOUT = 60
 
 class GravityForms(Document):
     def get_forms(self):
@@ -62,19 +66,43 @@ class GravityForms(Document):
             
         return
     
-    def get_form_entries(self, form_id):
-        endpoint = "{0}{1}forms/{2}/entries?sorting[key]=id&sorting[direction]=DESC&sorting[is_numeric]=true&paging[page_size]=100".format(self.gravity_host, API_PATH, form_id)
+    def get_form_entries(self, form_id, after_entry_id=0, auth=None, session=None):
+        """
+        Return the entries of a form newer than after_entry_id, newest first.
 
-        response = requests.get(endpoint, auth=self.get_auth())
-        
+        Pages through the entries sorted by id and stops at the first entry
+        that is not newer than after_entry_id (0: all entries). Does not touch
+        the database when auth is given, so it can run in a worker thread.
+        """
+        auth = auth or self.get_auth()
+        session = session or requests.Session()
+        endpoint = "{0}{1}forms/{2}/entries".format(self.gravity_host, API_PATH, form_id)
         entries = []
-        if response.status_code == 200:
-            entries = response.json().get('entries')
-                
-        else:
-            frappe.throw("Gravity Forms: Error {0}: {1}".format(response.status_code, response.text))
-            
-        return entries
+        seen = set()
+        page = 1
+        while True:
+            response = session.get(endpoint, auth=auth, timeout=REQUEST_TIMEOUT, params={
+                'sorting[key]': 'id',
+                'sorting[direction]': 'DESC',
+                'sorting[is_numeric]': 'true',
+                'paging[page_size]': ENTRY_PAGE_SIZE,
+                'paging[current_page]': page
+            })
+            if response.status_code != 200:
+                raise Exception("Gravity Forms: Error {0}: {1}".format(response.status_code, response.text))
+
+            page_entries = response.json().get('entries') or []
+            for e in page_entries:
+                if cint(e.get('id')) <= cint(after_entry_id):
+                    return entries
+                # entries submitted while paging shift the pages: skip repeats
+                if e.get('id') not in seen:
+                    seen.add(e.get('id'))
+                    entries.append(e)
+
+            if len(page_entries) < ENTRY_PAGE_SIZE:
+                return entries
+            page += 1
 
 @frappe.whitelist()
 def fetch_forms():
@@ -104,48 +132,95 @@ def fetch_entries():
     # first, make sure all forms are available
     forms = fetch_forms()
     gravity = frappe.get_doc("Gravity Forms", "Gravity Forms")
-    if forms:
-        for f in forms:
-            if cint(frappe.get_value("Gravity Form", f.get('id'), 'disabled')) == 0:
-                entries = fetch_form_entries(f.get('id'))
-        
-    return
+    if not forms:
+        return
+
+    enabled_forms = frappe.get_all("Gravity Form",
+        filters={'disabled': 0, 'name': ['in', ["{0}".format(f.get('id')) for f in forms]]},
+        fields=['name', 'last_entry_id'])
+    watermarks = {f.name: cint(f.last_entry_id) for f in enabled_forms}
+    auth = gravity.get_auth()
+
+    def fetch(form_id):
+        # one connection per form, no database access in the worker threads
+        try:
+            with requests.Session() as session:
+                return form_id, gravity.get_form_entries(form_id, watermarks[form_id], auth, session), None
+        except Exception as err:
+            return form_id, None, err
+
+    imported = {}
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        for form_id, entries, err in executor.map(fetch, list(watermarks)):
+            if err:
+                frappe.log_error("{0}".format(err), "Gravity Forms entry import failed for form {0}".format(form_id))
+                continue
+            imported[form_id] = import_form_entries(form_id, entries)
+
+    return imported
 
 @frappe.whitelist()
 def fetch_form_entries(gravity_form):
     gravity = frappe.get_doc("Gravity Forms", "Gravity Forms")
-    entries = gravity.get_form_entries(gravity_form)
+    entries = gravity.get_form_entries(gravity_form,
+        cint(frappe.get_value("Gravity Form", gravity_form, 'last_entry_id')))
+    import_form_entries(gravity_form, entries)
+    return entries
+
+def import_form_entries(gravity_form, entries):
+    """
+    Insert the entries that are not imported yet, checking existence once per
+    page, and move the form's last_entry_id watermark. Returns the number of
+    inserted entries.
+    """
+    if not entries:
+        return 0
+
     # find import table
     form_doc = frappe.get_doc("Gravity Form", gravity_form)
     import_keys = {}
     for f in form_doc.fields:
         if cint(f.get('import')) == 1:
             import_keys[f.get('field_id')] = f.get('field_name')
-    if entries:
-        for e in entries:
-            if not frappe.db.exists("Gravity Form Entry", e.get('id')):
-                new_entry = frappe.get_doc({
-                    'doctype': 'Gravity Form Entry',
-                    'gravity_form_entry_id': e.get('id'),
-                    'content': "{0}".format(e),
-                    'gravity_form': gravity_form
+
+    inserted = 0
+    for i in range(0, len(entries), ENTRY_PAGE_SIZE):
+        page = entries[i:i + ENTRY_PAGE_SIZE]
+        existing = set(frappe.db.sql_list("""
+            SELECT `name`
+            FROM `tabGravity Form Entry`
+            WHERE `name` IN %(entry_ids)s""",
+            {'entry_ids': tuple("{0}".format(e.get('id')) for e in page)}))
+
+        for e in page:
+            if "{0}".format(e.get('id')) in existing:
+                continue
+            new_entry = frappe.get_doc({
+                'doctype': 'Gravity Form Entry',
+                'gravity_form_entry_id': e.get('id'),
+                'content': "{0}".format(e),
+                'gravity_form': gravity_form,
+                # insert keeps a given creation, so no second save is needed
+                'creation': e.get('date_created')
+            })
+            for k, v in import_keys.items():
+                new_entry.append('fields', {
+                    'field_name': v,
+                    'value': e.get(k)
                 })
-                for k, v in import_keys.items():
-                    new_entry.append('fields', {
-                        'field_name': v,
-                        'value': e.get(k)
-                    })
-                    if v == "Company":                          # 35: pull company field to entry-level
-                        new_entry.company = e.get(k)
-                new_entry.insert(ignore_permissions=True)
-                # override creation and modified
-                new_entry.creation =  e.get('date_created')
-                #new_entry.modified = e.get('date_updated')     # cannot override, this would give a more-recent version error
-                new_entry.save(ignore_permissions=True)
+                if v == "Company":                          # 35: pull company field to entry-level
+                    new_entry.company = e.get(k)
+            new_entry.insert(ignore_permissions=True)
+            inserted += 1
 
         frappe.db.commit()
-        
-    return entries
+
+    last_entry_id = max(cint(e.get('id')) for e in entries)
+    if last_entry_id > cint(form_doc.get('last_entry_id')):
+        frappe.db.set_value("Gravity Form", gravity_form, 'last_entry_id', last_entry_id)
+        frappe.db.commit()
+
+    return inserted
 
 def daily_sync():
     gravity = frappe.get_doc("Gravity Forms", "Gravity Forms")
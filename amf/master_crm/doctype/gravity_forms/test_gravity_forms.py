@@ -9,9 +9,59 @@ from __future__ import unicode_literals
 
 import frappe
 import unittest
+from unittest.mock import MagicMock, patch
+
+from amf.master_crm.doctype.gravity_forms import gravity_forms
+
+def _response(entries):
+    response = MagicMock(status_code=200)
+    response.json.return_value = {'entries': entries}
+    return response
 
 class TestGravityForms(unittest.TestCase):
-    pass
+    def test_entries_are_paged_until_the_watermark(self):
+        gravity = gravity_forms.GravityForms()
+        gravity.gravity_host = "https://example.com"
+        session = MagicMock()
+        session.get.side_effect = [
+            _response([{'id': "15"}, {'id': "14"}]),
+            # a new entry shifted the second page: 14 is returned again
+            _response([{'id': "14"}, {'id': "13"}]),
+            _response([{'id': "12"}, {'id': "11"}]),
+        ]
+
+        with patch.object(gravity_forms, "ENTRY_PAGE_SIZE", 2):
+            entries = gravity.get_form_entries(3, after_entry_id=12, auth="AUTH", session=session)
+
+        self.assertEqual([e['id'] for e in entries], ["15", "14", "13"])
+        self.assertEqual([c.kwargs['params']['paging[current_page]'] for c in session.get.call_args_list], [1, 2, 3])
+
+    def test_import_checks_existence_per_page_and_inserts_once(self):
+        form = frappe._dict(last_entry_id=12, fields=[
+            frappe._dict(field_id="2", field_name="Company", **{'import': 1}),
+        ])
+        new_entry = MagicMock()
+        entries = [
+            {'id': "15", 'date_created': "2026-10-17 08:00:00", '2': "ACME"},
+            {'id': "14", 'date_created': "2026-10-16 08:00:00", '2': "AMF"},
+            {'id': "13", 'date_created': "2026-10-15 08:00:00", '2': "AMF"},
+        ]
+
+        with patch.object(gravity_forms, "ENTRY_PAGE_SIZE", 2), patch.object(
+            gravity_forms.frappe, "get_doc", side_effect=[form, new_entry, new_entry]
+        ) as get_doc, patch.object(
+            gravity_forms.frappe.db, "sql_list", side_effect=[["14"], []]
+        ) as sql_list, patch.object(gravity_forms.frappe.db, "set_value") as set_value, patch.object(
+            gravity_forms.frappe.db, "commit"
+        ):
+            inserted = gravity_forms.import_form_entries("3", entries)
+
+        self.assertEqual(inserted, 2)
+        self.assertEqual(sql_list.call_args_list[0].args[1]['entry_ids'], ("15", "14"))
+        self.assertEqual(get_doc.call_args_list[1].args[0]['creation'], "2026-10-17 08:00:00")
+        self.assertEqual(new_entry.insert.call_count, 2)
+        new_entry.save.assert_not_called()
+        set_value.assert_called_once_with("Gravity Form", "3", 'last_entry_id', 15)
 
 def test():
     gravity = frappe.get_doc("Gravity Forms", "Gravity Forms")
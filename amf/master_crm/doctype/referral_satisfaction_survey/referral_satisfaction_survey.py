@@ -5,6 +5,7 @@
 from __future__ import unicode_literals
 import frappe
 from frappe.model.document import Document
+from amf.master_crm.organization import update_global_csat_for_contacts
 
 class ReferralSatisfactionSurvey(Document):
 	pass
@@ -24,8 +25,11 @@ def update_contact_csat_nps(doc, method):
     if doc.doctype == 'Global Satisfaction Survey':
         frappe.db.set_value("Contact", doc.contact_person, "customer_satisfaction_survey", csat_value)
         frappe.db.set_value("Contact", doc.contact_person, "customer_satisfaction_survey", int(nps_value))
+        update_global_csat_for_contacts([doc.contact_person])
     elif doc.doctype == 'Referral Satisfaction Survey':
         frappe.db.set_value("Contact", doc.referring_contact, "customer_satisfaction_survey", csat_value)
         frappe.db.set_value("Contact", doc.referring_contact, "referral_satisfaction_survey", int(nps_value))
+        # recompute the global CSAT of the customers of this contact only
+        update_global_csat_for_contacts([doc.referring_contact])
 
     return None
\ No newline at end of file
@@ -3,43 +3,70 @@ from __future__ import unicode_literals
 import frappe
 from frappe import _
 
-def update_global_csat():
+def update_global_csat(customers=None):
     """
     Nightly job that:
       1. Aggregates each Customer’s mean CSAT across its Contacts in one go.
-      2. Writes the result back to Customer.global_csat (NULL if no scores).
+      2. Writes the result back to Customer.global_csat (NULL if no scores),
+         in a single UPDATE that only touches customers whose value changed.
+
+    With customers, only those customers are recomputed and nothing is
+    committed (incremental mode, see update_global_csat_for_contacts).
     """
+    incremental = customers is not None
+    if incremental:
+        customers = tuple(set(c for c in customers if c))
+        if not customers:
+            return
+
+    customer_filter = "AND dl.link_name IN %(customers)s" if incremental else ""
 
-    # 1. Compute per-customer averages
-    rows = frappe.db.sql("""
-        SELECT
-            dl.link_name        AS customer,
-            ROUND(AVG(c.customer_satisfaction_survey), 2)/20 AS avg_csat
-        FROM `tabDynamic Link` dl
-        JOIN `tabContact` c
-          ON dl.parent = c.name
-        WHERE dl.link_doctype = %s
-          AND dl.parenttype  = %s
-          AND c.customer_satisfaction_survey IS NOT NULL
-        GROUP BY dl.link_name
-    """, ("Customer", "Contact"), as_dict=True)
+    # `<=>` is NULL-safe: customers losing or getting their first score are
+    # updated, unchanged ones are skipped
+    frappe.db.sql("""
+        UPDATE `tabCustomer` cust
+        LEFT JOIN (
+            SELECT
+                dl.link_name        AS customer,
+                ROUND(AVG(c.customer_satisfaction_survey), 2)/20 AS avg_csat
+            FROM `tabDynamic Link` dl
+            JOIN `tabContact` c
+              ON dl.parent = c.name
+            WHERE dl.link_doctype = %(link_doctype)s
+              AND dl.parenttype  = %(parenttype)s
+              AND c.customer_satisfaction_survey IS NOT NULL
+              {customer_filter}
+            GROUP BY dl.link_name
+        ) agg ON agg.customer = cust.name
+        SET cust.global_csat = agg.avg_csat
+        WHERE NOT (cust.global_csat <=> agg.avg_csat)
+          {outer_filter}
+    """.format(
+        customer_filter=customer_filter,
+        outer_filter="AND cust.name IN %(customers)s" if incremental else ""
+    ), {
+        'link_doctype': "Customer",
+        'parenttype': "Contact",
+        'customers': customers
+    })
 
-    # Build lookup: {customer_name: avg_csat}
-    avg_map = {d["customer"]: d["avg_csat"] for d in rows}
-    # 2. Fetch all customers
-    all_customers = frappe.get_all("Customer", fields=["name"])
+    if not incremental:
+        frappe.db.commit()
+        frappe.logger().info("Global CSAT scores updated")
+    return
 
-    # 3. Update each one (NULL for those not in avg_map)
-    for cust in all_customers:
-        cust_name = cust["name"]
-        frappe.db.set_value(
-            "Customer",
-            cust_name,
-            "global_csat",
-            avg_map.get(cust_name),        # None if missing → clears the field
-            update_modified=False
-        )
+def update_global_csat_for_contacts(contacts):
+    """Recompute global_csat of the customers linked to the given contacts."""
+    contacts = tuple(set(c for c in contacts if c))
+    if not contacts:
+        return
 
-    # 4. Commit & log
-    frappe.db.commit()
-    frappe.logger().info("Global CSAT scores updated for %d customers", len(all_customers))
+    customers = frappe.db.sql_list("""
+        SELECT DISTINCT `link_name`
+        FROM `tabDynamic Link`
+        WHERE `link_doctype` = "Customer"
+          AND `parenttype` = "Contact"
+          AND `parent` IN %(contacts)s
+    """, {'contacts': contacts})
+    update_global_csat(customers)
+    return
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025, libracore AG and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import unittest
+from unittest.mock import patch
+
+from amf.master_crm import organization
+
+
+class TestOrganization(unittest.TestCase):
+	def test_nightly_update_is_one_statement_for_changed_customers(self):
+		with patch.object(organization.frappe.db, "sql") as sql, patch.object(
+			organization.frappe.db, "commit"
+		) as commit, patch.object(organization.frappe, "logger"):
+			organization.update_global_csat()
+
+		sql.assert_called_once()
+		query = sql.call_args.args[0]
+		self.assertIn("UPDATE `tabCustomer`", query)
+		self.assertIn("NOT (cust.global_csat <=> agg.avg_csat)", query)
+		self.assertNotIn("%(customers)s", query)
+		commit.assert_called_once_with()
+
+	def test_survey_recomputes_only_the_contact_customers(self):
+		with patch.object(organization.frappe.db, "sql_list", return_value=["CUST-1", "CUST-2"]) as sql_list, patch.object(
+			organization.frappe.db, "sql"
+		) as sql, patch.object(organization.frappe.db, "commit") as commit:
+			organization.update_global_csat_for_contacts(["Anna Muster", None])
+
+		self.assertEqual(sql_list.call_args.args[1], {'contacts': ("Anna Muster",)})
+		query, values = sql.call_args.args
+		self.assertEqual(query.count("%(customers)s"), 2)
+		self.assertEqual(sorted(values['customers']), ["CUST-1", "CUST-2"])
+		commit.assert_not_called()
+
+	def test_contact_without_customer_writes_nothing(self):
+		with patch.object(organization.frappe.db, "sql_list", return_value=[]), patch.object(
+			organization.frappe.db, "sql"
+		) as sql:
+			organization.update_global_csat_for_contacts(["Anna Muster"])
+
+		sql.assert_not_called()
@@ -0,0 +1,10 @@
+from __future__ import unicode_literals
+
+import frappe
+
+from amf.amf.doctype.item_daily_outflow.item_daily_outflow import reconcile_item_daily_outflows
+
+
+def execute():
+	frappe.reload_doc("amf", "doctype", "item_daily_outflow")
+	reconcile_item_daily_outflows()
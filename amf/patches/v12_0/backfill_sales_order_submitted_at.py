@@ -0,0 +1,13 @@
+from __future__ import unicode_literals
+
+from amf.amf.utils.sales_order_otif import sync_sales_order_otif_custom_fields
+from amf.amf.utils.sales_order_submit_time import (
+	backfill_sales_order_submitted_at,
+	sync_sales_order_submit_time_custom_fields,
+)
+
+
+def execute():
+	sync_sales_order_otif_custom_fields()
+	sync_sales_order_submit_time_custom_fields()
+	backfill_sales_order_submitted_at()
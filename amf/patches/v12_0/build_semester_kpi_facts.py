@@ -0,0 +1,15 @@
+from __future__ import unicode_literals
+
+import frappe
+
+from amf.amf.utils.semester_aggregation import REBUILD_SEMESTER_COUNT
+
+
+def execute():
+	frappe.reload_doc("amf", "doctype", "semester_kpi_fact")
+	frappe.enqueue(
+		"amf.amf.utils.semester_aggregation.refresh_semester_facts",
+		queue="long",
+		timeout=3600,
+		semester_count=REBUILD_SEMESTER_COUNT,
+	)
@@ -1,15 +1,144 @@
-import http
+import http.client
 import json
 import re
+import threading
+import time
 #from turtle import pd      # compatibility issue with TKInter
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from amf.amf.utils.log_buffer import log_buffer
 from amf.amf.utils.utilities import create_log_entry, update_log_entry
 import frappe
-from frappe.utils import now_datetime, add_months
-import time
+from frappe.utils import cint, get_datetime, now_datetime, add_months
 
 # DHL API details
 DHL_API_URL = "https://api-eu.dhl.com/track/shipments"
+DHL_API_HOST = "api-eu.dhl.com"
+DHL_API_PATH = "/track/shipments"
+# Shipment Tracking - Unified, standard quota: one call every 5 seconds and
+# 250 calls per day. The token bucket below enforces the per-second rate for
+# all poller threads together; the daily quota caps the shipments per run.
+DHL_REQUESTS_PER_SECOND = 0.2
+DHL_REQUEST_BURST = 1
+DHL_DAILY_REQUEST_QUOTA = 250
+DHL_POLL_WORKERS = 2
+DHL_REQUEST_TIMEOUT = 30
+DHL_MAX_ATTEMPTS = 3
+DHL_DEFAULT_RETRY_AFTER = 60
+# Shipments checked less than this many hours ago are not polled again.
+DHL_RECHECK_HOURS = 20
+TERMINAL_STATUS_CODES = ("delivered",)
+DHL_TRACKING_WRITE_CHUNK_SIZE = 100
+
+
+class TokenBucket(object):
+    """Thread-safe token bucket: `rate` tokens per second, at most `capacity` stored."""
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                self._sleep((1 - self._tokens) / self.rate)
+
+    def defer(self, seconds):
+        """Hold back all callers for `seconds`, e.g. after a 429 Retry-After."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class DHLTrackingClient(object):
+    """
+    Keep-alive client for the DHL tracking API. Not thread-safe: the poller
+    uses one client (and so one connection) per thread.
+    """
+
+    def __init__(self, api_key, limiter=None, host=DHL_API_HOST, port=None, use_ssl=True,
+                 timeout=DHL_REQUEST_TIMEOUT):
+        self.api_key = api_key
+        self.limiter = limiter
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.request_count = 0
+        self._connection = None
+
+    def get_shipment(self, tracking_number):
+        """
+        Return the first shipment DHL knows for tracking_number, {} when DHL
+        does not know the number, or None when the request failed.
+        """
+        path = "{0}?{1}".format(DHL_API_PATH, urllib.parse.urlencode({"trackingNumber": tracking_number}))
+        headers = {
+            "DHL-API-Key": self.api_key,
+            "Accept": "application/json",
+        }
+
+        for _attempt in range(DHL_MAX_ATTEMPTS):
+            if self.limiter:
+                self.limiter.acquire()
+            try:
+                connection = self._get_connection()
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                # Stale keep-alive connection or network error: reconnect.
+                self.close()
+                continue
+            finally:
+                self.request_count += 1
+
+            if response.status == 200:
+                shipments = json.loads(data).get("shipments") or []
+                return shipments[0] if shipments else {}
+            if response.status == 404:
+                return {}
+            if response.status == 429:
+                retry_after = cint(response.getheader("Retry-After")) or DHL_DEFAULT_RETRY_AFTER
+                if self.limiter:
+                    self.limiter.defer(retry_after)
+                else:
+                    time.sleep(retry_after)
+                continue
+            if response.status >= 500:
+                continue
+            return None
+
+        return None
+
+    def close(self):
+        if self._connection:
+            self._connection.close()
+            self._connection = None
+
+    def _get_connection(self):
+        if not self._connection:
+            connection_class = http.client.HTTPSConnection if self.use_ssl else http.client.HTTPConnection
+            self._connection = connection_class(self.host, self.port, timeout=self.timeout)
+        return self._connection
+
 
 @frappe.whitelist()
 def fetch_and_display_tracking_info_enqueue():
@@ -28,7 +157,7 @@ def get_tracking_numbers():
         fields=['name', 'tracking_no', 'customer', 'posting_date'],
         order_by='posting_date desc'
     )
-    
+
     # Filter to include only 10-digit numeric tracking numbers
     tracking_info = [
         {'name': dn['name'], 'tracking_no': dn['tracking_no'], 'customer': dn['customer'], 'date': dn['posting_date']}
@@ -38,91 +167,238 @@ def get_tracking_numbers():
     return tracking_info
 
 def get_tracking_info(tracking_number):
-    
-    API_KEY = frappe.db.get_single_value("AMF DHL Settings", "dhl_api_key")
-
-    params = urllib.parse.urlencode({
-        'trackingNumber': tracking_number,
-    })
-    headers = {
-        "DHL-API-Key": API_KEY
-    }
-    connection = http.client.HTTPSConnection("api-eu.dhl.com")
-    connection.request("GET", "/track/shipments?" + params, "", headers)
-    response = connection.getresponse()
-    data = response.read()
-    # Assuming response.status is an integer, convert it to a string
-    status = str(response.status)
-    # Convert the data to a JSON formatted string
-    json_data = json.dumps(json.loads(data), indent=4)  # Adding indent for better readability, optional
-    # Open the file and write the data
-    with open("output.txt", "a+") as text_file:
-        text_file.write(status + "\n" + json_data + "\n")
-    #print(response.status + "\n" + json.loads(data) + "\n")
-    if response.status == 200:
-        print("Status:", response.status, "Reason:", response.reason)
-        return json.loads(data)
-    else:
-        print("Error:", response.status, "Reason:", response.reason)
+    """Fetch one tracking number; returns the API response like the DHL endpoint."""
+    client = DHLTrackingClient(frappe.db.get_single_value("AMF DHL Settings", "dhl_api_key"))
+    try:
+        shipment = client.get_shipment(tracking_number)
+    finally:
+        client.close()
+
+    if shipment is None:
         return None
+    return {"shipments": [shipment] if shipment else []}
+
+
+def get_existing_tracking_rows(tracking_numbers):
+    """Return the DHL Tracking Information rows of the given numbers, by tracking number."""
+    if not tracking_numbers:
+        return {}
+
+    rows = frappe.db.sql(
+        """
+        SELECT name, dn, tracking_number, customer, status, status_code, last_update, fetch_date, checked_on
+        FROM `tabDHL Tracking Information`
+        WHERE tracking_number IN %(tracking_numbers)s
+        ORDER BY modified DESC
+        """,
+        {"tracking_numbers": tuple(set(tracking_numbers))},
+        as_dict=True,
+    )
+    existing = {}
+    for row in rows:
+        existing.setdefault(row.tracking_number, row)
+    return existing
+
+
+def is_terminal_status(row):
+    """Delivered shipments do not change anymore."""
+    if row.get("status_code"):
+        return row.status_code in TERMINAL_STATUS_CODES
+    # Rows stored before status_code existed only have the description.
+    return (row.get("status") or "").strip().lower().startswith("delivered")
+
+
+def select_tracking_infos_to_poll(tracking_infos, existing, now=None, recheck_hours=DHL_RECHECK_HOURS):
+    """
+    Split the Delivery Note tracking infos into the ones to poll and skip counts.
+
+    Delivered shipments and shipments checked within recheck_hours are
+    skipped; a tracking number shared by several Delivery Notes is polled
+    once. Never checked numbers come first, then the least recently checked.
+    """
+    now = get_datetime(now or now_datetime())
+    recheck_before = now - timedelta(hours=recheck_hours)
+    to_poll = []
+    seen = set()
+    skipped = {"delivered": 0, "recent": 0, "duplicate": 0}
 
-@frappe.whitelist()
-def fetch_and_display_tracking_info():
-    log = create_log_entry("Starting amf.amf.www.tracking method...", "fetch_and_display_tracking_info()")
-    tracking_infos = get_tracking_numbers()  # Call the function to get tracking numbers and customers
-    tracking_data = []
-    update_log_entry(log, f"Tracking Numbers & Info Global: {tracking_infos}")
     for info in tracking_infos:
-        time.sleep(12)
-        api_info = get_tracking_info(info['tracking_no'])
-        if api_info and 'shipments' in api_info and len(api_info['shipments']) > 0:
-            shipment_info = api_info['shipments'][0]
-            tracking_info_dict = {
-                'name': info['name'],
-                'tracking_number': info['tracking_no'],
-                'customer': info['customer'],
-                'date': info['date'],
-                'status': shipment_info['status']['description'],  # Adjust based on the actual API response structure
-                'last_update': shipment_info['status']['timestamp'],  # Adjust based on the actual API response structure
-            }
-        else:
-            tracking_info_dict = {
-                'name': info['name'],
-                'tracking_number': info['tracking_no'],
-                'customer': info['customer'],
-                'date': info['date'],
-                'status': '',
-                'last_update': '',
-                'destination': ''
-            }
-        update_log_entry(log, f"Tracking No: {info['tracking_no']} for Tracking Info: {tracking_info_dict}")
+        tracking_number = info["tracking_no"]
+        if tracking_number in seen:
+            skipped["duplicate"] += 1
+            continue
+        seen.add(tracking_number)
+
+        row = existing.get(tracking_number)
+        if row and is_terminal_status(row):
+            skipped["delivered"] += 1
+            continue
+        if row and row.get("checked_on") and get_datetime(row.checked_on) > recheck_before:
+            skipped["recent"] += 1
+            continue
+        to_poll.append(info)
+
+    def last_checked(info):
+        row = existing.get(info["tracking_no"])
+        checked_on = row.get("checked_on") if row else None
+        return (checked_on is not None, get_datetime(checked_on) if checked_on else now)
+
+    to_poll.sort(key=last_checked)
+    return to_poll, skipped
+
+
+def poll_tracking_numbers(tracking_numbers, api_key, workers=DHL_POLL_WORKERS, limiter=None, client_factory=None):
+    """
+    Fetch the shipments of many tracking numbers.
+
+    Worker threads share one rate limiter and keep one keep-alive connection
+    each. Returns {tracking_number: shipment, {} or None}, see
+    DHLTrackingClient.get_shipment.
+    """
+    if not tracking_numbers:
+        return {}
+
+    limiter = limiter or TokenBucket(DHL_REQUESTS_PER_SECOND, DHL_REQUEST_BURST)
+    client_factory = client_factory or (lambda: DHLTrackingClient(api_key, limiter=limiter))
+    thread_clients = threading.local()
+    clients = []
+    clients_lock = threading.Lock()
+
+    def fetch(tracking_number):
+        client = getattr(thread_clients, "client", None)
+        if client is None:
+            client = thread_clients.client = client_factory()
+            with clients_lock:
+                clients.append(client)
         try:
+            return tracking_number, client.get_shipment(tracking_number)
+        except Exception:
+            return tracking_number, None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, cint(workers))) as executor:
+            return dict(executor.map(fetch, tracking_numbers))
+    finally:
+        for client in clients:
+            client.close()
+
+
+def build_tracking_result(info, shipment, checked_on):
+    """Map one Delivery Note tracking info and its polled shipment to DHL Tracking Information values."""
+    result = {
+        'name': info['name'],
+        'tracking_number': info['tracking_no'],
+        'customer': info['customer'],
+        'date': info['date'],
+        'checked_on': checked_on if shipment is not None else None,
+    }
+    if shipment:
+        status = shipment.get('status') or {}
+        result.update({
+            'status': status.get('description') or '',
+            'status_code': status.get('statusCode') or '',
+            'last_update': status.get('timestamp') or '',
+        })
+    return result
+
+
+def save_tracking_results(log, results, existing=None):
+    """
+    Reconcile polled results with DHL Tracking Information in bulk.
+
+    Existing rows are loaded with one query (unless given). New shipments
+    are inserted, changed statuses are updated, and unchanged shipments only
+    get their checked_on with one UPDATE per chunk. Commits once per chunk.
+    A failed request keeps the stored status. Returns the run summary.
+    """
+    if existing is None:
+        existing = get_existing_tracking_rows([data['tracking_number'] for data in results])
+    summary = {"new": 0, "updated": 0, "unchanged": 0, "failed": 0}
+
+    for index in range(0, len(results), DHL_TRACKING_WRITE_CHUNK_SIZE):
+        checked = {}
+        for data in results[index:index + DHL_TRACKING_WRITE_CHUNK_SIZE]:
+            row = existing.get(data['tracking_number'])
+            changes = get_status_changes(row, data) if row and 'status' in data else {}
+            if not row:
+                doc = frappe.get_doc({
+                    'doctype': 'DHL Tracking Information',
+                    'dn': data['name'],
+                    'tracking_number': data['tracking_number'],
+                    'customer': data['customer'],
+                    'fetch_date': data['date'],
+                    'status': data.get('status', ''),
+                    'status_code': data.get('status_code', ''),
+                    'last_update': data.get('last_update', ''),
+                    'checked_on': data['checked_on'],
+                }).insert()
+                existing[data['tracking_number']] = frappe._dict(doc.as_dict())
+                summary["new"] += 1
+            elif not data['checked_on']:
+                summary["failed"] += 1
+            elif changes:
+                changes['checked_on'] = data['checked_on']
+                frappe.db.set_value('DHL Tracking Information', row.name, changes)
+                row.update(changes)
+                summary["updated"] += 1
+            else:
+                checked.setdefault(data['checked_on'], []).append(row.name)
+                summary["unchanged"] += 1
+
+        for checked_on, names in checked.items():
+            frappe.db.sql(
+                """
+                UPDATE `tabDHL Tracking Information`
+                SET checked_on = %(checked_on)s
+                WHERE name IN %(names)s
+                """,
+                {"checked_on": checked_on, "names": tuple(names)},
+            )
+        frappe.db.commit()
+
+    if log:
+        update_log_entry(
+            log,
+            "DHL tracking run: {new} new, {updated} updated, {unchanged} unchanged, "
+            "{failed} failed shipments".format(**summary),
+        )
+    return summary
+
+
+def get_status_changes(row, data):
+    """Return the status fields of data that differ from the stored row."""
+    return {
+        fieldname: data[fieldname]
+        for fieldname in ('status', 'status_code', 'last_update')
+        if (row.get(fieldname) or '') != (data.get(fieldname) or '')
+    }
+
+
+@frappe.whitelist()
+def fetch_and_display_tracking_info():
+    with log_buffer():
+        log = create_log_entry("Starting amf.amf.www.tracking method...", "fetch_and_display_tracking_info()")
+        tracking_infos = get_tracking_numbers()  # Call the function to get tracking numbers and customers
+        existing = get_existing_tracking_rows([info['tracking_no'] for info in tracking_infos])
+        to_poll, skipped = select_tracking_infos_to_poll(tracking_infos, existing)
+        deferred = to_poll[DHL_DAILY_REQUEST_QUOTA:]
+        to_poll = to_poll[:DHL_DAILY_REQUEST_QUOTA]
+        update_log_entry(
+            log,
+            f"Tracking numbers: {len(tracking_infos)}, to poll: {len(to_poll)}, "
+            f"deferred to the next run: {len(deferred)}, skipped: {skipped}",
+        )
+
+        checked_on = now_datetime()
+        shipments = poll_tracking_numbers(
+            [info['tracking_no'] for info in to_poll],
+            frappe.db.get_single_value("AMF DHL Settings", "dhl_api_key"),
+        )
+        tracking_data = []
+        for info in to_poll:
+            tracking_info_dict = build_tracking_result(info, shipments.get(info['tracking_no']), checked_on)
+            update_log_entry(log, f"Tracking No: {info['tracking_no']} for Tracking Info: {tracking_info_dict}")
             tracking_data.append(tracking_info_dict)
-        except Exception as e:
-            print("Error in tracking_data:", {e})
-
-    # Insert tracking data into the database
-    for data in tracking_data:
-        existing_doc = frappe.get_all('DHL Tracking Information', filters={'tracking_number': data['tracking_number']}, limit=1)
-        
-        if existing_doc:
-            update_log_entry(log, f"Updating existing doc: {existing_doc[0].name}")
-            # Update the existing document
-            doc = frappe.get_doc('DHL Tracking Information', existing_doc[0].name)
-            doc.status = data['status']
-            doc.last_update = data['last_update']
-            doc.save()
-        else:
-            update_log_entry(log, f"Creating new doc...")
-            # Insert a new document
-            frappe.get_doc({
-                'doctype': 'DHL Tracking Information',
-                'dn': data['name'],
-                'tracking_number': data['tracking_number'],
-                'customer': data['customer'],
-                'fetch_date': data['date'],
-                'status': data['status'],
-                'last_update': data['last_update']
-            }).insert()
-        
-        frappe.db.commit()
\ No newline at end of file
+
+        # Reconcile tracking data with the database
+        return save_tracking_results(log, tracking_data, existing)